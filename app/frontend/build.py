@@ -0,0 +1,105 @@
+"""
+Builds the front-end into the app's static directory: the React production builds in vendor/ and the app's script are
+concatenated into one minified bundle, and its styles minified into one stylesheet. Each is written under assets/
+with the hash of its content in its name, and index.html is written pointing at them. The hashed assets never change,
+so the app serves them with a long-lived Cache-Control; index.html is revalidated with its ETag on every visit.
+
+The app is plain JavaScript on the React UMD build, so nothing is transpiled and the build needs only Python. The
+build is committed, so the app serves the front-end without building it; rebuild after changing app/frontend:
+    python app/frontend/build.py
+"""
+import argparse
+import hashlib
+import re
+import shutil
+from pathlib import Path
+import rcssmin
+import rjsmin
+
+FRONTEND_DIR = Path(__file__).resolve().parent
+STATIC_DIR = FRONTEND_DIR.parent / "src" / "static"
+ASSETS_DIR = "assets"
+HASH_LENGTH = 8
+# index.html references each bundle as {{ name }}
+ASSET_REFERENCE = re.compile(r"\{\{ (\S+) \}\}")
+# The sources of each bundle, in load order
+BUNDLES = {
+    "app.js": ["vendor/react@18.3.1.production.min.js", "vendor/react-dom@18.3.1.production.min.js", "src/app.js"],
+    "app.css": ["src/index.css"],
+}
+
+
+def minify(source: str, path: str) -> str:
+    """
+    Minifies a script or a stylesheet. The vendored builds are already minified and keep their license headers.
+    Args:
+        source (str): The source's content.
+        path (str): The source's path in app/frontend.
+    Returns:
+        str: The minified content.
+    """
+    if path.endswith(".min.js"):
+        return source.strip()
+    if path.endswith(".js"):
+        return rjsmin.jsmin(source)
+    return rcssmin.cssmin(source)
+
+
+def bundle(name: str) -> bytes:
+    """
+    Concatenates the minified sources of a bundle.
+    Args:
+        name (str): The bundle's name in `BUNDLES`.
+    Returns:
+        bytes: The bundle's content.
+    """
+    sources = [minify((FRONTEND_DIR / path).read_text(encoding="utf-8"), path) for path in BUNDLES[name]]
+    separator = ";\n" if name.endswith(".js") else "\n"
+    return (separator.join(sources) + "\n").encode("utf-8")
+
+
+def hashed_name(name: str, content: bytes) -> str:
+    """
+    Names an asset after its content, e.g. app-1a2b3c4d.js.
+    Args:
+        name (str): The asset's name.
+        content (bytes): The asset's content.
+    Returns:
+        str: The asset's hashed name.
+    """
+    stem, _, extension = name.rpartition(".")
+    return f"{stem}-{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}.{extension}"
+
+
+def build(output: Path = STATIC_DIR) -> dict:
+    """
+    Builds the front-end, replacing the assets of a previous build.
+    Args:
+        output (Path, optional): The static directory. Default is the app's.
+    Returns:
+        dict: The hashed name of each bundle index.html references, by its name.
+    """
+    template = (FRONTEND_DIR / "index.html").read_text(encoding="utf-8")
+    assets_dir = output / ASSETS_DIR
+    shutil.rmtree(assets_dir, ignore_errors=True)
+    assets_dir.mkdir(parents=True)
+    assets = {}
+    for name in ASSET_REFERENCE.findall(template):
+        content = bundle(name)
+        assets[name] = hashed_name(name, content)
+        (assets_dir / assets[name]).write_bytes(content)
+    page = ASSET_REFERENCE.sub(lambda match: f"/{ASSETS_DIR}/{assets[match.group(1)]}", template)
+    (output / "index.html").write_text(page, encoding="utf-8")
+    return assets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the front-end into the static directory")
+    parser.add_argument("--output", type=Path, default=STATIC_DIR, help="The static directory")
+    args = parser.parse_args(argv)
+    for name, hashed in build(args.output).items():
+        print(f"{name} -> {ASSETS_DIR}/{hashed}")
+
+
+if __name__ == "__main__":
+    main()
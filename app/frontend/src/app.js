@@ -0,0 +1,238 @@
+// The front-end, in plain JavaScript on the React UMD build (the React and ReactDOM globals), so it runs as it is
+// without transpiling. Built into app/src/static by build.py.
+const h = React.createElement;
+
+function useEnterPress(callback) {
+    const handleKeyPress = (e) => {
+        if (e.key === 'Enter') {
+            callback();
+        }
+    };
+    React.useEffect(() => {
+        document.addEventListener('keydown', handleKeyPress);
+        return () => {
+            document.removeEventListener('keydown', handleKeyPress);
+        };
+    });
+}
+
+function MyApp() {
+    const [query, setQuery] = React.useState('');
+    const [currentQuestion, setCurrentQuestion] = React.useState('');
+    const [loading, setLoading] = React.useState(false);
+    const [results, setResults] = React.useState(null);
+    const [showIntro, setShowIntro] = React.useState(true)
+    const [currentConfig, setCurrentConfig] = React.useState({});
+    const [tempConfig, setTempConfig] = React.useState({});
+    const [isEqualConfigs, setIsEqualConfigs] = React.useState(true);
+    const responseRef = React.useRef(null);
+    const questionSeed = [
+        "המעסיק פיטר אותי לאחר שהודעתי לו שאני בהריון. הוא טוען שזה בגלל צמצומים, מותר לו?",
+        "האם אני זכאית לדמי אבטלה אם התפטרתי? ואם כן-ממתי?",
+        "האם מותר לשלם לעובדת משק בית במזומן?",
+        "מה הזכויות בעבודה במקרה של חופשת לידה?",
+        "מהן זכויות אסירים בישראל?",
+        "האם מתנדבת בשירות לאומי חייבת להיות בשיחה של הרכזת?"
+    ]
+    const models = ["gpt-3.5-turbo-0125", "gpt-4o-mini-2024-07-18", "gpt-4o-2024-08-06"]
+    const num_of_pages_options = Array.from({ length: 5 }, (_, i) => i + 1)
+    const temperatures = Array.from({ length: 9 }, (_, i) => (i + 1) / 10);
+
+
+    React.useEffect(() => {
+        const fetchConfig = async () => {
+            const response = await fetch('/get_config');
+            const data = await response.json();
+            setCurrentConfig(data || {});
+            setTempConfig(data || {});
+        };
+        fetchConfig();
+    }, []);
+
+    const setFieldInTempConfig = (key, value) => {
+        const newConfig = { ...tempConfig, [key]: value };
+        setTempConfig(newConfig);
+        setIsEqualConfigs(deepEqual(newConfig, currentConfig))
+    }
+
+    const deepEqual = (obj1, obj2, notToEqual = []) => {
+        if (obj1 === obj2) return true;
+
+        if (
+            obj1 === null || obj2 === null ||
+            typeof obj1 !== "object" || typeof obj2 !== "object"
+        ) return false;
+
+        obj1 = JSON.parse(JSON.stringify(obj1));
+        obj2 = JSON.parse(JSON.stringify(obj2));
+
+        notToEqual.forEach(field => {
+            delete obj1[field];
+            delete obj2[field];
+        });
+
+        const keys1 = Object.keys(obj1);
+        const keys2 = Object.keys(obj2);
+        if (keys1.length !== keys2.length) return false;
+
+        for (const key of keys1) {
+            if (!keys2.includes(key)) return false;
+            if (!deepEqual(obj1[key], obj2[key], notToEqual)) return false;
+        }
+
+        return true;
+    };
+
+    const onSearch = async (question = null) => {
+        if ((!query && question === null) || loading) return;
+        setLoading(true);
+        if (question === null) question = query
+        try {
+            const asked_from = window.location.href;
+            const response = await fetch('/search', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query: question, asked_from })
+            });
+            setCurrentQuestion(question)
+            const data = await response.json();
+            setResults(data);
+            setTimeout(() => {
+                responseRef.current?.scrollIntoView({ behavior: 'smooth' });
+            }, 300);
+        } catch (error) {
+            console.error("Error during search:", error);
+        } finally {
+            setLoading(false);
+            setShowIntro(false)
+        }
+    };
+
+    const onSaveConfig = async () => {
+        try {
+            await fetch('/set_config', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(tempConfig)
+            });
+            setCurrentConfig(tempConfig);
+            setIsEqualConfigs(true);
+        } catch (error) {
+            console.error("Error saving config:", error);
+        }
+    };
+    const runQuestion = (question) => { if (!loading) { setQuery(question); onSearch(question); } }
+    useEnterPress(onSearch);
+
+
+    const queryForm = () => [
+        h('textarea', {
+            key: 'query',
+            className: 'textarea-query',
+            value: query,
+            onChange: (e) => setQuery(e.target.value),
+            placeholder: 'הקלידו שאלה לצ׳אבוט של ווביקס...'
+        }),
+        h('button', {
+            key: 'ask',
+            className: `button-query ${loading || query.trim() === '' ? "button-disable" : ""}`,
+            disabled: loading || query.trim() === '',
+            onClick: () => onSearch()
+        }, loading ? h('div', { className: 'loader' }) : 'שאל/י את הצ׳אטבוט')
+    ];
+
+    const select = (label, key, options) => h('label', null, label,
+        h('select', { value: tempConfig[key] || '', onChange: (e) => setFieldInTempConfig(key, e.target.value) },
+            options.map((option, index) => h('option', { value: option, key: index }, option))
+        )
+    );
+
+    const prompt = (label, key) => h('label', null, label,
+        h('textarea', {
+            className: 'textarea-prompt',
+            value: tempConfig[key] || '',
+            onChange: (e) => setFieldInTempConfig(key, e.target.value)
+        })
+    );
+
+    const intro = () => h(React.Fragment, null,
+        h('h1', { className: 'h1-welcome' }, 'ברוכים הבאים לצ׳אטבוט של ווביקס!'),
+        ...queryForm(),
+        h('h1', { className: 'h1-try' }, 'נסו את השאלות לדוגמה'),
+        h('div', { className: 'example-questions' },
+            questionSeed.map((question, index) => h('div', { key: index, className: 'question-box' },
+                h('p', { className: 'question-text' }, question),
+                h('hr'),
+                h('div', { className: 'question-footer', onClick: () => runQuestion(question) },
+                    h('span', null, 'הרץ שאלה לדוגמה'),
+                    h('svg', {
+                        width: '20', height: '20', viewBox: '0 0 24 24', fill: 'none', stroke: 'black',
+                        strokeWidth: '2', strokeLinecap: 'round', strokeLinejoin: 'round',
+                        xmlns: 'http://www.w3.org/2000/svg'
+                    }, h('path', { d: 'M5 12l5 5L20 5' }))
+                )
+            ))
+        )
+    );
+
+    const response = () => h('div', { className: 'response-container', ref: responseRef },
+        h('h1', { className: 'question-header' }, currentQuestion),
+        h('h3', null, 'תשובת הצ׳אטבוט'),
+        h('textarea', { className: 'textarea-answer', readOnly: true, value: results.llm_result || '' }),
+        h('div', { className: 'response-grid' },
+            h('div', null,
+                h('h3', null, 'תשובות מודל האחזור (דפים שאוחזרו)'),
+                h('div', { className: 'links-div' },
+                    results["metadata"] && results["docs"].map(({ id, title, link }, index) => h('p', { key: id },
+                        `${index + 1}. `,
+                        h('a', { href: link, target: '_blank', rel: 'noopener noreferrer' }, title)
+                    ))
+                )
+            ),
+            h('div', null,
+                h('h3', null, 'מהירות תשובה מודל האחזור'),
+                h('div', { className: 'text-div-big answer-div' },
+                    results.metadata?.retrieval_time?.toFixed(2) + "s" || '')
+            ),
+            h('div', null,
+                h('h3', null, 'מהירות תשובה מודל השפה'),
+                h('div', { className: 'text-div-big answer-div' }, results.metadata?.llm_time?.toFixed(2) + "s" || '')
+            )
+        ),
+        h('h1', { className: 'query-header' }, 'רוצה לשאול עוד שאלה?'),
+        ...queryForm()
+    );
+
+    return h('div', { id: 'wrapper' },
+        h('aside', null,
+            h('img', {
+                className: `webiks-logo ${!showIntro ? "hoverable" : ""}`,
+                src: 'webiks_logo.svg',
+                alt: 'Webiks Logo',
+                onClick: () => setShowIntro(true)
+            }),
+            h('div', { className: 'settings-header' },
+                h('h2', null, 'הגדרות'),
+                h('a', {
+                    href: '#',
+                    className: 'clear-form',
+                    onClick: () => { setTempConfig(currentConfig); setIsEqualConfigs(true) }
+                }, 'ניקוי')
+            ),
+            select('בחירת מודל שפה', 'model', models),
+            select('בחירת מס׳ דפים מאוחזרים עבור מודל השפה', 'num_of_pages', num_of_pages_options),
+            select('טמפרטורה - מודל שפה', 'temperature', temperatures),
+            prompt('System Prompt', 'system_prompt'),
+            prompt('User Prompt', 'user_prompt'),
+            h('button', {
+                className: `button-save ${isEqualConfigs ? "button-disable" : ""}`,
+                disabled: isEqualConfigs,
+                onClick: onSaveConfig
+            }, 'שמירה')
+        ),
+        h('div', { className: 'main-content' }, !results || showIntro ? intro() : response())
+    );
+}
+
+const root = ReactDOM.createRoot(document.getElementById('root'));
+root.render(h(MyApp));
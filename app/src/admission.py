@@ -0,0 +1,155 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+import metrics
+from config import ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_PER_CLIENT, \
+    ADMISSION_QUEUE_TIMEOUT_SECS
+
+# Weight of the latest request in the moving average time a request holds a slot
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is not admitted.
+    Attributes:
+        status_code (HTTPStatus): 429 if the client has too many requests waiting, 503 if the service is saturated.
+        reason (str): Why the request was rejected.
+        retry_after (int): Seconds after which a retry is likely to be admitted.
+    """
+    def __init__(self, status_code: HTTPStatus, reason: str, retry_after: int):
+        super().__init__(f"Request rejected ({reason}), retry after {retry_after}s")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+       Bounds the requests running a stage at once, with a bounded wait queue in front of it.
+       Waiting requests are queued per client and admitted round robin across the clients, so a client sending a
+       burst waits behind its own requests rather than delaying everyone else's. A request is rejected with 429 when
+       its client already has `max_queue_per_client` requests waiting, and with 503 when the queue is full or it
+       waited `queue_timeout` seconds, each with a Retry-After estimated from the queue length and the recent time
+       requests hold a slot.
+       Runs on the event loop, so it needs no locking.
+       Attributes:
+           endpoint (str): Labels the metrics.
+           max_concurrent (int): The requests admitted at once, 0 admits every request.
+           max_queue (int): The requests waiting, across the clients.
+           max_queue_per_client (int): The requests waiting per client.
+           queue_timeout (float): The longest wait, in seconds.
+           active (int): The admitted requests.
+           queues (OrderedDict): Maps a client to the futures of its waiting requests, in round robin order.
+           queued (int): The waiting requests.
+           service_time (float): The moving average time a request holds a slot, in seconds.
+       Methods:
+           slot(client): An async context manager holding a slot for the client's request.
+       """
+    def __init__(self, endpoint: str, max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_queue_per_client: int = ADMISSION_MAX_QUEUE_PER_CLIENT,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECS):
+        self.endpoint = endpoint
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queues = OrderedDict()
+        self.queued = 0
+        self.service_time = 1.0
+
+
+    @asynccontextmanager
+    async def slot(self, client: str):
+        """
+        Waits for a slot for the client's request and holds it for the block.
+        Args:
+            client (str): Identifies the client whose requests are queued together, e.g. `asked_from`.
+        Raises:
+            AdmissionRejected: If the request is not admitted.
+        """
+        if not self.max_concurrent:
+            yield
+            return
+        await self.acquire(client)
+        before_request = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service_time += SERVICE_TIME_SMOOTHING * (time.perf_counter() - before_request - self.service_time)
+            self.release()
+
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.queued + 1) / self.max_concurrent * self.service_time))
+
+
+    def reject(self, status_code: HTTPStatus, reason: str):
+        metrics.ADMISSION_REJECTIONS.labels(self.endpoint, reason).inc()
+        raise AdmissionRejected(status_code, reason, self.retry_after())
+
+
+    async def acquire(self, client: str):
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            metrics.ADMISSION_WAIT.labels(self.endpoint).observe(0)
+            return
+        if self.queued >= self.max_queue:
+            self.reject(HTTPStatus.SERVICE_UNAVAILABLE, "queue_full")
+        queue = self.queues.get(client)
+        if queue is not None and len(queue) >= self.max_queue_per_client:
+            self.reject(HTTPStatus.TOO_MANY_REQUESTS, "client_queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(client, deque()).append(waiter)
+        self.queued += 1
+        metrics.ADMISSION_QUEUE_DEPTH.labels(self.endpoint).inc()
+        before_wait = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.forget(client, waiter)
+            self.reject(HTTPStatus.SERVICE_UNAVAILABLE, "queue_timeout")
+        except asyncio.CancelledError:
+            self.forget(client, waiter)
+            raise
+        finally:
+            metrics.ADMISSION_WAIT.labels(self.endpoint).observe(time.perf_counter() - before_wait)
+
+
+    def forget(self, client: str, waiter: asyncio.Future):
+        """
+        Removes a request that stopped waiting, or hands on its slot if it was admitted as it stopped.
+        """
+        queue = self.queues.get(client)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.queued -= 1
+            metrics.ADMISSION_QUEUE_DEPTH.labels(self.endpoint).dec()
+            if not queue:
+                del self.queues[client]
+        elif waiter.done() and not waiter.cancelled():
+            self.release()
+
+
+    def release(self):
+        """
+        Hands the slot to the next waiting request, taking the clients in turn, or frees it.
+        """
+        while self.queues:
+            client, queue = next(iter(self.queues.items()))
+            waiter = queue.popleft()
+            self.queued -= 1
+            metrics.ADMISSION_QUEUE_DEPTH.labels(self.endpoint).dec()
+            if queue:
+                self.queues.move_to_end(client)
+            else:
+                del self.queues[client]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import metrics
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT_SECS
+
+DEPENDENCIES = ("es_search", "es_write", "llm")
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# The values of the state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+       Fails calls to a dependency fast while it is failing, instead of letting every request wait on it.
+       The circuit opens after `failure_threshold` consecutive failures, and calls fail with CircuitOpenError without
+       reaching the dependency. After `reset_timeout` seconds it is half open: a single probe call goes through, and
+       closes the circuit if it succeeds or opens it again if it fails; other calls fail fast while the probe runs.
+       Attributes:
+           name (str): The dependency, labels the metrics.
+           failure_threshold (int): The consecutive failures that open the circuit.
+           reset_timeout (float): Seconds the circuit stays open before a probe.
+           state (str): closed, open or half_open.
+           failures (int): The consecutive failures.
+           opened_at (float): The monotonic time the circuit last opened.
+           probing (bool): Whether the half open probe is running.
+           lock (threading.Lock): Guards the state.
+       Methods:
+           call(function, *args, **kwargs): Calls the function through the breaker.
+           current_state(): Returns the state, moving from open to half open once the reset timeout passed.
+       """
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT_SECS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+        metrics.CIRCUIT_STATE.labels(name).set(STATE_VALUES[CLOSED])
+
+
+    def transition(self, state: str):
+        if state == self.state:
+            return
+        logging.warning(f"Circuit of {self.name} is {state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        metrics.CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+        metrics.CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+
+    def current_state(self) -> str:
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.transition(HALF_OPEN)
+            return self.state
+
+
+    def before_call(self) -> bool:
+        """
+        Returns whether the call is the half open probe.
+        Raises:
+            CircuitOpenError: If the call must fail fast.
+        """
+        state = self.current_state()
+        with self.lock:
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+        metrics.CIRCUIT_REJECTIONS.labels(self.name).inc()
+        raise CircuitOpenError(f"The circuit of {self.name} is {state}")
+
+
+    def call(self, function, *args, **kwargs):
+        """
+        Calls the function unless the circuit is open, and records its outcome.
+        Args:
+            function (callable): Calls the dependency.
+            *args: The function's arguments.
+            **kwargs: The function's keyword arguments.
+        Returns:
+            The function's result.
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with a probe running.
+        """
+        probe = self.before_call()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            with self.lock:
+                if probe:
+                    self.probing = False
+                self.failures += 1
+                if probe or self.failures >= self.failure_threshold:
+                    self.transition(OPEN)
+            raise
+        with self.lock:
+            if probe:
+                self.probing = False
+            self.failures = 0
+            self.transition(CLOSED)
+        return result
+
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def factory(name: str) -> CircuitBreaker:
+    """
+    Factory function to create and return the singleton circuit breaker of a dependency.
+    Args:
+        name (str): The dependency: es_search, es_write or llm.
+    Returns:
+        CircuitBreaker: The dependency's circuit breaker.
+    """
+    with breakers_lock:
+        if name not in breakers:
+            breakers[name] = CircuitBreaker(name)
+        return breakers[name]
+
+
+def states() -> dict:
+    """
+    Returns:
+        dict: The state of every dependency's circuit.
+    """
+    return {name: factory(name).current_state() for name in DEPENDENCIES}
@@ -5,8 +5,63 @@ load_dotenv()
 HOST = os.getenv("HOST")
 PORT = os.getenv("PORT")
 CONVERSATIONS_INDEX = os.getenv("CONVERSATIONS_INDEX", "conversations")
+CONVERSATIONS_RETENTION_WEEKS = int(os.getenv("CONVERSATIONS_RETENTION_WEEKS", "0"))
+CONVERSATIONS_MAINTENANCE_INTERVAL_SECS = int(os.getenv("CONVERSATIONS_MAINTENANCE_INTERVAL_SECS", "3600"))
 STATIC_DIR = os.getenv("STATIC_DIR")
+STATIC_ASSETS_MAX_AGE = int(os.getenv("STATIC_ASSETS_MAX_AGE", "31536000"))
 SAVED_CONFIGURATIONS = os.getenv("CONFIG_INDEX", "saved_configurations")
 CONFIG_CACHE_PERIOD_SECS = int(os.getenv("CONFIG_CACHE_PERIOD_SECS", '600'))
 PATH_TO_ES_INITIAL_VALUES=os.getenv("PATH_TO_ES_INITIAL_VALUES", "../../Webiks_Hebrew_RAGbot_KolZchut_Paragraphs_Corpus_v1.0.json")
 CODE_VERSION = os.getenv("CODE_VERSION")
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECS = int(os.getenv("RETRIEVAL_CACHE_TTL_SECS", "3600"))
+RETRIEVAL_CACHE_INDEX = os.getenv("RETRIEVAL_CACHE_INDEX", "retrieval_cache")
+RETRIEVAL_CACHE_SYNC_SECS = float(os.getenv("RETRIEVAL_CACHE_SYNC_SECS", "5"))
+ES_STARTUP_TIMEOUT_SECS = int(os.getenv("ES_STARTUP_TIMEOUT_SECS", "60"))
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "ragbot")
+MOCK_LLM_LATENCY_SECS = float(os.getenv("MOCK_LLM_LATENCY_SECS", "0"))
+MOCK_LLM_TOKENS = int(os.getenv("MOCK_LLM_TOKENS", "0"))
+MOCK_LLM_TOKENS_PER_SEC = float(os.getenv("MOCK_LLM_TOKENS_PER_SEC", "0"))
+LLM_TOKENIZER_MODEL = os.getenv("LLM_TOKENIZER_MODEL", "gpt-4o")
+# The default thread pool that runs the search pipeline bounds the concurrent LLM calls of a worker
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE") or min(32, (os.cpu_count() or 1) + 4))
+LLM_KEEPALIVE_SECS = float(os.getenv("LLM_KEEPALIVE_SECS", "60"))
+LLM_CONNECT_TIMEOUT_SECS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECS", "5"))
+LLM_DEADLINE_SECS = float(os.getenv("LLM_DEADLINE_SECS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SECS = float(os.getenv("LLM_RETRY_BACKOFF_SECS", "0.5"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+# Comma separated LLM backends to route between: openai[:model], google:model, mock. Empty uses the configured model
+LLM_BACKENDS = [backend.strip() for backend in os.getenv("LLM_BACKENDS", "").split(",") if backend.strip()]
+LLM_ROUTER_DEADLINE_SECS = float(os.getenv("LLM_ROUTER_DEADLINE_SECS", str(LLM_DEADLINE_SECS)))
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "20"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+LLM_ROUTER_COOLDOWN_SECS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECS", "30"))
+LLM_ROUTER_EXPLORE_RATE = float(os.getenv("LLM_ROUTER_EXPLORE_RATE", "0.05"))
+# Admission control of /search: requests running the pipeline at once (0 disables), and the bounded wait queue
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT") or LLM_POOL_SIZE)
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE") or ADMISSION_MAX_CONCURRENT * 4)
+ADMISSION_MAX_QUEUE_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT") or max(1, ADMISSION_MAX_QUEUE // 2))
+ADMISSION_QUEUE_TIMEOUT_SECS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECS", "10"))
+# Circuit breakers of Elasticsearch searches, Elasticsearch writes and the LLM
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT_SECS = float(os.getenv("CIRCUIT_RESET_TIMEOUT_SECS", "30"))
+# The most queries a /retrieve/batch request may carry
+RETRIEVE_MAX_BATCH = int(os.getenv("RETRIEVE_MAX_BATCH", "256"))
+# Questions of a /search/batch answered at once: half the LLM pool by default, leaving the rest to interactive searches
+BATCH_SEARCH_CONCURRENCY = int(os.getenv("BATCH_SEARCH_CONCURRENCY") or max(1, LLM_POOL_SIZE // 2))
+BATCH_SEARCH_MAX_CONCURRENCY = int(os.getenv("BATCH_SEARCH_MAX_CONCURRENCY") or LLM_POOL_SIZE)
+# Cross-encoder reranking between retrieval and the LLM, disabled unless RERANKER_MODEL is set
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+RERANKER_CANDIDATES = int(os.getenv("RERANKER_CANDIDATES", "12"))
+RERANKER_BUDGET_SECS = float(os.getenv("RERANKER_BUDGET_SECS", "0.3"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "4"))
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+# Responses of at least this many bytes are compressed, with brotli when brotli-asgi is installed or gzip
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
@@ -0,0 +1,80 @@
+import functools
+import os
+from webiks_hebrew_ragbot.llm_client import LLMClient
+from gpt_client import GPTClient
+from llm_transport import LLMTransport
+from saved_config import Configs, seed_config
+
+
+@functools.lru_cache(maxsize=16)
+def generative_model(model, system_instruction):
+    """
+    Creates a Gemini model with the system instruction, once per model and system prompt.
+    """
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(model, system_instruction=system_instruction)
+
+
+def retryable_errors():
+    from google.api_core import exceptions
+
+    return (exceptions.ServiceUnavailable, exceptions.ResourceExhausted, exceptions.InternalServerError,
+            exceptions.DeadlineExceeded)
+
+
+class GeminiClient(GPTClient):
+    """
+       A client for the Google Gemini models, answering from the same packed prompt as GPTClient.
+       google-generativeai is imported when the client is created, so it's only needed when a Google backend is
+       configured.
+       Attributes:
+           transport (LLMTransport): Sends the requests with a deadline, retries and hedging.
+       Methods:
+           generate(timeout, model, system_instruction, contents, generation_config): Sends one request.
+           complete(current_config, body, deadline=None): Sends the request for the prompt.
+       """
+    def __init__(self, config_class: Configs):
+        """
+        Initializes the GeminiClient instance, with the API key in `GOOGLE_API_KEY`.
+        Args:
+            config_class (Configs): The configuration class instance.
+        """
+        LLMClient.__init__(self)
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        self.is_mock_client = False
+        self.oai_client = None
+        self.configs_class = config_class
+        self.transport = LLMTransport(self.generate, retryable_errors=retryable_errors())
+
+
+    def generate(self, timeout, model, system_instruction, contents, generation_config):
+        return generative_model(model, system_instruction).generate_content(
+            contents, generation_config=generation_config, request_options={"timeout": timeout})
+
+
+    def complete(self, current_config, body, deadline=None):
+        """
+         Sends the request: the system prompt as the system instruction, then the user prompt and the body.
+         Args:
+             current_config (dict): The current configuration.
+             body (str): The request body.
+             deadline (float, optional): A deadline for the call, in seconds.
+         Returns:
+             tuple: The answer, the completion tokens, the prompt tokens and the cached prompt tokens.
+         """
+        response = self.transport.complete(
+            deadline=deadline,
+            model=current_config["model"],
+            system_instruction=current_config["system_prompt"],
+            contents=current_config["user_prompt"] + "\n" + body,
+            generation_config={
+                "temperature": float(current_config["temperature"]),
+                "max_output_tokens": int(current_config.get("max_tokens", seed_config["max_tokens"])),
+            },
+        )
+        usage = response.usage_metadata
+        return response.text, usage.candidates_token_count, usage.prompt_token_count, \
+            getattr(usage, "cached_content_token_count", 0) or 0
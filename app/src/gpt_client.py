@@ -1,10 +1,74 @@
+import functools
 import os
+import sys
 import time
 import re
 from bs4 import BeautifulSoup
+from webiks_hebrew_ragbot.document import document_definition_factory
 from webiks_hebrew_ragbot.llm_client import LLMClient
 from openai import OpenAI
-from saved_config import Configs
+from llm_transport import DeadlineExceeded, LLMTransport, create_http_client
+from config import MOCK_LLM_LATENCY_SECS, MOCK_LLM_TOKENS, MOCK_LLM_TOKENS_PER_SEC
+from saved_config import Configs, seed_config
+from tokenizer import count_tokens, encoding_name, truncate_to_tokens
+from tracing import tracer
+
+definitions = document_definition_factory()
+LLM_READY_SUFFIX = "_llm_ready"
+LLM_TOKENS_SUFFIX = "_llm_tokens"
+LLM_TOKENS_ENCODING_SUFFIX = "_llm_tokens_encoding"
+QUESTION_LABEL = "שאלה"
+DOCUMENT_LABEL = "מסמך"
+# Chat formatting tokens the API adds around each message and to prime the reply
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+# A document that would be trimmed to fewer tokens than this is dropped instead
+MIN_TRIMMED_DOC_TOKENS = 50
+# Near-duplicate paragraphs are compared by their word shingles of this length
+SHINGLE_WORDS = 3
+
+
+DISALLOWED_CHARACTERS = re.compile(r'[^\u0590-\u05FFa-zA-Z0-9\s.,!?"\'():;״׳;@:\-()_=+%/\n]+')
+
+
+NON_HEBREW_OR_ASCII_CHARACTER = re.compile(r'[^\x00-\x7F\u0590-\u05FF]')
+
+
+def removable_whitespace_pattern(letter):
+    """
+    Compiles the single pass of `parse_hebrew_text`: it removes whitespace other than spaces, and runs of spaces that
+    are not between two letters.
+    Args:
+        letter (str): A regex character class matching the characters for which `str.isalpha()` holds.
+    Returns:
+        re.Pattern: The compiled pattern.
+    """
+    return re.compile(rf' (?<!  )(?:(?<!{letter} ) *| *(?! )(?!{letter}))|[^\S ]+')
+
+
+# In Hebrew and ASCII text, `[^\W\d_]` matches exactly the letters.
+HEBREW_REMOVABLE_WHITESPACE = removable_whitespace_pattern(r'[^\W\d_]')
+
+
+@functools.cache
+def unicode_removable_whitespace_pattern():
+    """
+    Compiles the pass of `parse_hebrew_text` for text beyond Hebrew and ASCII, where `[^\W\d_]` also matches the
+    numeric characters that are not decimal digits, such as "½". Their ranges are collected from the Unicode table
+    on the first call.
+    Returns:
+        re.Pattern: The compiled pattern.
+    """
+    ranges = []
+    for code_point in range(sys.maxunicode + 1):
+        char = chr(code_point)
+        if char.isnumeric() and not char.isdecimal() and not char.isalpha():
+            if ranges and ranges[-1][1] == code_point - 1:
+                ranges[-1][1] = code_point
+            else:
+                ranges.append([code_point, code_point])
+    numeric_non_letters = ''.join(f'{re.escape(chr(first))}-{re.escape(chr(last))}' for first, last in ranges)
+    return removable_whitespace_pattern(rf'[^\W\d_{numeric_non_letters}]')
 
 
 def parse_hebrew_text(characters):
@@ -15,51 +79,138 @@ def parse_hebrew_text(characters):
       Returns:
           list: A list of parsed words and punctuation.
       """
-    parsed_text = []
-    temp_word = []
-
-    for char in characters:
-        if char.isalpha() or char == ' ':
-            temp_word.append(char)
-        else:
-            if temp_word:
-                # Join the collected characters to form a word
-                parsed_text.append(''.join(temp_word).strip())
-                temp_word = []
-            # Add the punctuation or special character separately
-            if char.strip():
-                parsed_text.append(char)
-
-    # Add any remaining word
-    if temp_word:
-        parsed_text.append(''.join(temp_word).strip())
-
-    # Join the parsed text into a single string and split by specific punctuation or spaces
-    result = ''.join(parsed_text).split(', ')
-
-    return result
+    if NON_HEBREW_OR_ASCII_CHARACTER.search(characters) is None:
+        pattern = HEBREW_REMOVABLE_WHITESPACE
+    else:
+        pattern = unicode_removable_whitespace_pattern()
+    return pattern.sub('', characters).split(', ')
+
 
 def clean_text(input_text):
     """
    Cleans the input text to include only Hebrew characters, numbers, and specified punctuation.
+   Plain text, without tags or character references, skips the HTML parser.
    Args:
        input_text (str): The input text to clean.
    Returns:
        str: The cleaned text.
    """
-    """Clean the text to include only Hebrew characters, numbers, and specified punctuation."""
-    soup = BeautifulSoup(input_text, 'html.parser')
-    text = soup.get_text(separator='\n')
+    if '<' in input_text or '&' in input_text:
+        input_text = BeautifulSoup(input_text, 'html.parser').get_text(separator='\n')
+    return ' '.join(DISALLOWED_CHARACTERS.sub('', input_text).split())
+
+
+def clean_texts(input_texts):
+    """
+   Cleans a batch of texts, such as the paragraphs of a document, with `clean_text`.
+   Args:
+       input_texts (Iterable[str]): The input texts to clean.
+   Returns:
+       list[str]: The cleaned texts, in order.
+   """
+    return [clean_text(input_text) for input_text in input_texts]
+
 
-    cleaned_text = re.sub(
-        r'[^\u0590-\u05FFa-zA-Z0-9\s.,!?"\'():;״׳;@:\-()_=+%/\n]+',
-        '',
-        ' '.join(text.split())
-    )
+def prepare_paragraphs_for_llm(paragraphs):
+    """
+    Ingest stage: stores next to the `field_for_llm` of each paragraph the token count of its text, as it goes into
+    the prompt, so prompts are packed per question without counting the paragraphs again. The prompt gets the
+    `field_for_llm` text as it is - cleaning it would drop the currency signs, dashes, brackets and line breaks the
+    answers rely on - so only the count is stored, named `<field_for_llm>_llm_tokens`, with the name of the encoding
+    it was counted with, `<field_for_llm>_llm_tokens_encoding`.
+    Args:
+        paragraphs (list[dict]): The paragraphs to ingest, updated in place.
+    Returns:
+        list[dict]: The paragraphs.
+    """
+    field = definitions.field_for_llm
+    if field is None:
+        return paragraphs
+    encoding = encoding_name()
+    for paragraph in paragraphs:
+        if isinstance(paragraph.get(field), str):
+            paragraph[field + LLM_TOKENS_SUFFIX] = count_tokens(paragraph[field])
+            paragraph[field + LLM_TOKENS_ENCODING_SUFFIX] = encoding
+    return paragraphs
+
+
+def shingles(text):
+    """
+    Returns the word shingles of a text, or its words if it's shorter than a shingle.
+    """
+    words = text.split()
+    if len(words) < SHINGLE_WORDS:
+        return set(words)
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def overlap(first, second):
+    """
+    Returns the share of the smaller shingle set found in the other, so a paragraph repeated inside a longer one is
+    a duplicate too.
+    """
+    if not first or not second:
+        return 0.0
+    return len(first & second) / min(len(first), len(second))
+
+
+@functools.lru_cache(maxsize=32)
+def static_prompt_tokens(system_prompt, user_prompt, model):
+    """
+    Counts the tokens of the parts of the prompt that only change with the configuration.
+    Args:
+        system_prompt (str): The system prompt.
+        user_prompt (str): The user prompt.
+        model (str): The model name.
+    Returns:
+        int: The number of tokens, including the chat formatting of the two messages.
+    """
+    return (count_tokens(system_prompt, model) + count_tokens(user_prompt + "\n", model)
+            + 2 * TOKENS_PER_MESSAGE + REPLY_PRIMING_TOKENS)
+
+
+@functools.lru_cache(maxsize=32)
+def static_prompt_messages(system_prompt, user_prompt):
+    """
+    Builds the parts of the messages that only change with the configuration, once per configuration. They open every
+    request byte-identically, so the provider's prompt prefix cache can reuse them across questions.
+    Args:
+        system_prompt (str): The system prompt.
+        user_prompt (str): The user prompt.
+    Returns:
+        tuple: The system message and the first content part of the user message.
+    """
+    system_message = {"role": "system", "content": [{"type": "text", "text": system_prompt}]}
+    user_prompt_part = {"type": "text", "text": user_prompt + "\n"}
+    return system_message, user_prompt_part
+
+
+def build_messages(current_config, body):
+    """
+    Builds the messages of a request: the static prefix of the configuration followed by the question and documents.
+    Args:
+        current_config (dict): The current configuration.
+        body (str): The request body, from `create_body`.
+    Returns:
+        list[dict]: The messages.
+    """
+    system_message, user_prompt_part = static_prompt_messages(current_config["system_prompt"],
+                                                              current_config["user_prompt"])
+    return [system_message, {"role": "user", "content": [user_prompt_part, {"type": "text", "text": body}]}]
 
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
 
-    return cleaned_text
+def cached_prompt_tokens(usage):
+    """
+    Returns the number of prompt tokens the provider served from its prompt cache.
+    Args:
+        usage (CompletionUsage): The usage of a response.
+    Returns:
+        int: The number of cached tokens, 0 if not reported.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
 
 
 class GPTClient(LLMClient):
@@ -67,25 +218,38 @@ class GPTClient(LLMClient):
    A client for interacting with the OpenAI GPT model.
    Attributes:
        oai_client (OpenAI): The OpenAI client instance.
+       transport (LLMTransport): Sends the chat completions with a deadline, retries and hedging.
        configs_class (Configs): The configuration class instance.
        answer (function): The function to get the GPT answer.
        is_mock_client (bool): Flag indicating if the client is a mock client.
    Methods:
        create_body(query, top_k_docs): Creates the request body for the GPT model.
+       llm_text(doc): Returns the text of a document for the prompt, prepared at ingest when available.
+       text_tokens(doc, text, model): Returns the token count of a document's text, stored at ingest when available.
+       consolidate_context(top_k_docs, current_config): Drops near-duplicate documents and merges the paragraphs of a
+           document.
+       pack_context(query, top_k_docs, current_config): Fits the documents into the prompt token budget.
+       answer_with_usage(query, top_k_docs, model=None, deadline=None): Gets the GPT answer with the token usage.
+       complete(current_config, body, deadline=None): Sends the chat completion request.
        filter_docs(html_string): Strips headers from the HTML string based on banned headers and returns the filtered HTML.
        get_gpt_answer(query, top_k_docs): Gets the GPT answer for the given query and documents.
        get_mock_answer(query, top_k_docs): Gets a mock answer for the given query and documents.
    """
-    def __init__(self, config_class: Configs):
+    def __init__(self, config_class: Configs, is_mock_client: bool = None):
         """
        Initializes the GPTClient instance.
        Args:
            config_class (Configs): The configuration class instance.
+           is_mock_client (bool, optional): Whether to answer with the mock. Default is `IS_MOCK_GPT_CLIENT`.
        """
         super().__init__()
-        self.oai_client = OpenAI(api_key=os.getenv('OAI_API_KEY'))
+        self.is_mock_client = os.getenv('IS_MOCK_GPT_CLIENT', "false").lower() == "true" \
+            if is_mock_client is None else is_mock_client
+        # Retries are left to the transport, which bounds them by the call's deadline
+        self.oai_client = None if self.is_mock_client else OpenAI(api_key=os.getenv('OAI_API_KEY'),
+                                                                  http_client=create_http_client(), max_retries=0)
+        self.transport = None if self.is_mock_client else LLMTransport(self.oai_client.chat.completions.create)
         self.configs_class = config_class
-        self.is_mock_client = os.getenv('IS_MOCK_GPT_CLIENT', "false").lower() == "true"
 
 
     def create_body(self, query, top_k_docs):
@@ -97,10 +261,111 @@ class GPTClient(LLMClient):
          Returns:
              str: The request body.
          """
-        identifier = "מסמך"
-        body = {'שאלה': query} | {f'{identifier} {i + 1}': top_k_docs[i][self.field_for_answer] for i in range(len(top_k_docs))}
-        body = '\n'.join([f'{k}: {d}' for k, d in body.items()])
-        return body
+        lines = [f'{QUESTION_LABEL}: {query}'] + [
+            f'{DOCUMENT_LABEL} {i}: {self.llm_text(doc)}' for i, doc in enumerate(top_k_docs, 1)
+        ]
+        return '\n'.join(lines)
+
+
+    def llm_text(self, doc):
+        """
+         Returns the text of a document for the prompt: the `field_for_answer`, unless the document was trimmed or
+         merged for the prompt, in which case its `<field_for_answer>_llm_ready` text.
+         Args:
+             doc (dict): The document.
+         Returns:
+             str: The text.
+         """
+        llm_text = doc.get(self.field_for_answer + LLM_READY_SUFFIX)
+        return llm_text if llm_text is not None else doc[self.field_for_answer]
+
+
+    def text_tokens(self, doc, text, model):
+        """
+         Returns the token count of a document's text: the count stored at ingest when the text is the field as
+         ingested and it was counted with the model's encoding, otherwise counted with the model's tokenizer.
+         """
+        field = self.field_for_answer
+        if field + LLM_READY_SUFFIX not in doc and doc.get(field + LLM_TOKENS_ENCODING_SUFFIX) == encoding_name(model):
+            text_tokens = doc.get(field + LLM_TOKENS_SUFFIX)
+            if text_tokens is not None:
+                return text_tokens
+        return count_tokens(text, model)
+
+
+    def consolidate_context(self, top_k_docs, current_config):
+        """
+         Consolidates the documents before they are packed into the prompt. A document whose text overlaps a
+         higher-ranked one's by at least the configuration's `context_duplicate_threshold` (0 disables it) is dropped,
+         and the paragraphs of the same document are merged into one entry at the rank of its first paragraph, so
+         repeated text and per-document labels don't take up the prompt.
+         Args:
+             top_k_docs (list): The list of top documents, by rank.
+             current_config (dict): The current configuration.
+         Returns:
+             tuple: The consolidated documents, and the prompt tokens they save.
+         """
+        model = current_config["model"]
+        threshold = float(current_config.get("context_duplicate_threshold", seed_config["context_duplicate_threshold"]))
+        ready_field = self.field_for_answer + LLM_READY_SUFFIX
+        tokens_field = self.field_for_answer + LLM_TOKENS_SUFFIX
+        kept_shingles = []
+        merged = {}
+        saved_tokens = 0
+        for doc in top_k_docs:
+            text = self.llm_text(doc)
+            doc_shingles = shingles(text)
+            label_tokens = count_tokens(f'\n{DOCUMENT_LABEL} {len(merged) + 1}: ', model)
+            if threshold and any(overlap(doc_shingles, kept) >= threshold for kept in kept_shingles):
+                saved_tokens += label_tokens + self.text_tokens(doc, text, model)
+                continue
+            kept_shingles.append(doc_shingles)
+            doc_id = doc.get(definitions.identifier, ("unidentified", len(merged)))
+            if doc_id not in merged:
+                merged[doc_id] = doc
+                continue
+            first = merged[doc_id]
+            merged[doc_id] = {**first, ready_field: self.llm_text(first) + '\n' + text}
+            merged[doc_id].pop(tokens_field, None)
+            merged[doc_id].pop(self.field_for_answer + LLM_TOKENS_ENCODING_SUFFIX, None)
+            saved_tokens += label_tokens
+        return list(merged.values()), saved_tokens
+
+
+    def pack_context(self, query, top_k_docs, current_config):
+        """
+         Fits the documents, in rank order, into the prompt budget - `max_prompt_tokens` of the configuration - counted
+         with the tokenizer of the configuration's model. The first document that doesn't fit is trimmed to the
+         remaining budget, or dropped if too little of it would remain, and the lower-ranked documents are dropped.
+         Documents use the token count stored at ingest when it was counted with the model's encoding.
+         Args:
+             query (str): The query string.
+             top_k_docs (list): The list of top documents, by rank.
+             current_config (dict): The current configuration.
+         Returns:
+             tuple: The documents that fit, the last possibly trimmed, and the prompt's token count.
+         """
+        model = current_config["model"]
+        budget = int(current_config.get("max_prompt_tokens", seed_config["max_prompt_tokens"]))
+        prompt_tokens = (static_prompt_tokens(current_config["system_prompt"], current_config["user_prompt"], model)
+                         + count_tokens(f'{QUESTION_LABEL}: {query}', model))
+        ready_field = self.field_for_answer + LLM_READY_SUFFIX
+        packed_docs = []
+        for i, doc in enumerate(top_k_docs, 1):
+            text = self.llm_text(doc)
+            prefix_tokens = count_tokens(f'\n{DOCUMENT_LABEL} {i}: ', model)
+            text_tokens = self.text_tokens(doc, text, model)
+            remaining = budget - prompt_tokens - prefix_tokens
+            if text_tokens <= remaining:
+                packed_docs.append(doc)
+                prompt_tokens += prefix_tokens + text_tokens
+                continue
+            if remaining >= MIN_TRIMMED_DOC_TOKENS:
+                trimmed = truncate_to_tokens(text, remaining, model)
+                packed_docs.append({**doc, ready_field: trimmed})
+                prompt_tokens += prefix_tokens + count_tokens(trimmed, model)
+            break
+        return packed_docs, prompt_tokens
 
 
     def answer(self, query, top_k_docs):
@@ -112,56 +377,104 @@ class GPTClient(LLMClient):
          Returns:
              tuple: The GPT answer, elapsed time, and token usage.
          """
-        if self.is_mock_client:
-            return get_mock_answer(top_k_docs)
+        answer, elapsed, usage = self.answer_with_usage(query, top_k_docs)
+        return answer, elapsed, usage["tokens"]
+
+
+    def answer_with_usage(self, query, top_k_docs, model=None, deadline=None):
+        """
+         Gets the GPT answer for the given query and documents, consolidated and packed into the prompt token budget.
+         Args:
+             query (str): The query string.
+             top_k_docs (list): The list of top documents.
+             model (str, optional): The model to answer with. Default is the configuration's model.
+             deadline (float, optional): A deadline for the LLM call, in seconds, shorter than `LLM_DEADLINE_SECS`.
+         Returns:
+             tuple: The GPT answer, elapsed time, and the token usage: a dict of the `model` that answered, the
+             completion `tokens`, the `prompt_tokens`, the `cached_tokens` of the prompt served from the provider's
+             prompt cache, the number of documents in the prompt, `context_docs`, and the prompt tokens saved by
+             consolidating the documents, `context_tokens_saved`.
+         """
         before_gpt = time.perf_counter()
         current_config = self.configs_class.get_config()
-        response = self.oai_client.chat.completions.create(
+        if model and model != current_config["model"]:
+            current_config = {**current_config, "model": model}
+        with tracer.start_as_current_span("llm.consolidate_context") as span:
+            top_k_docs, saved_tokens = self.consolidate_context(top_k_docs, current_config)
+            span.set_attribute("llm.context_tokens_saved", saved_tokens)
+        with tracer.start_as_current_span("llm.pack_context") as span:
+            packed_docs, prompt_tokens = self.pack_context(query, top_k_docs, current_config)
+            span.set_attribute("llm.prompt_tokens", prompt_tokens)
+            span.set_attribute("llm.context_docs", len(packed_docs))
+        if self.is_mock_client:
+            answer, elapsed, tokens = get_mock_answer(packed_docs, deadline)
+            return answer, elapsed, {"model": current_config["model"], "tokens": tokens,
+                                     "prompt_tokens": prompt_tokens, "cached_tokens": 0,
+                                     "context_docs": len(packed_docs), "context_tokens_saved": saved_tokens}
+        with tracer.start_as_current_span("llm.create_body"):
+            body = self.create_body(query, packed_docs)
+        with tracer.start_as_current_span("llm.chat_completion") as span:
+            span.set_attribute("llm.model", current_config["model"])
+            answer, tokens, reported_prompt_tokens, cached_tokens = self.complete(current_config, body, deadline)
+            if reported_prompt_tokens:
+                prompt_tokens = reported_prompt_tokens
+            span.set_attribute("llm.completion_tokens", tokens)
+            span.set_attribute("llm.prompt_tokens", prompt_tokens)
+            span.set_attribute("llm.cached_tokens", cached_tokens)
+        after_gpt = time.perf_counter()
+        elapsed = round(after_gpt - before_gpt, 4)
+        return answer, elapsed, {"model": current_config["model"], "tokens": tokens, "prompt_tokens": prompt_tokens,
+                                 "cached_tokens": cached_tokens, "context_docs": len(packed_docs),
+                                 "context_tokens_saved": saved_tokens}
+
+
+    def complete(self, current_config, body, deadline=None):
+        """
+         Sends the chat completion request.
+         Args:
+             current_config (dict): The current configuration.
+             body (str): The request body.
+             deadline (float, optional): A deadline for the call, in seconds.
+         Returns:
+             tuple: The answer, the completion tokens, the prompt tokens and the cached prompt tokens.
+         """
+        response = self.transport.complete(
+            deadline=deadline,
             model=current_config["model"],
-            messages=[
-                {
-                    "role": "system",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": current_config["system_prompt"]
-                        }
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": current_config['user_prompt'] + "\n" + self.create_body(query, top_k_docs)
-                        }
-                    ]
-                }
-            ],
+            messages=build_messages(current_config, body),
             temperature=float(current_config["temperature"]),
-            max_tokens=512,
+            max_tokens=int(current_config.get("max_tokens", seed_config["max_tokens"])),
             top_p=1,
             frequency_penalty=0,
             presence_penalty=0
         )
         usage = response.usage
-        tokens = usage.completion_tokens
-        answer = response.choices[0].message.content
-        after_gpt = time.perf_counter()
-        elapsed = round(after_gpt - before_gpt, 4)
-        return answer, elapsed, tokens
+        return response.choices[0].message.content, usage.completion_tokens, usage.prompt_tokens, \
+            cached_prompt_tokens(usage)
 
 
-def get_mock_answer(top_k_docs):
+def get_mock_answer(top_k_docs, deadline=None):
     """
            Gets a mock answer for the given query and documents.
+           The mock simulates the LLM's latency - a fixed `MOCK_LLM_LATENCY_SECS` plus generating `MOCK_LLM_TOKENS`
+           tokens at `MOCK_LLM_TOKENS_PER_SEC` - so it can stand in for the LLM in load tests.
            Args:
-               query (str): The query string.
                top_k_docs (list): The list of top documents.
+               deadline (float, optional): Seconds after which the mock gives up, like the real client.
            Returns:
                tuple: The mock answer, elapsed time, and token usage.
+           Raises:
+               DeadlineExceeded: If the simulated latency exceeds the deadline.
            """
-    return f"Mock answer with docs___{top_k_docs}", 0.0, 0
+    elapsed = MOCK_LLM_LATENCY_SECS
+    if MOCK_LLM_TOKENS and MOCK_LLM_TOKENS_PER_SEC:
+        elapsed += MOCK_LLM_TOKENS / MOCK_LLM_TOKENS_PER_SEC
+    if deadline and elapsed > deadline:
+        time.sleep(deadline)
+        raise DeadlineExceeded(f"The mock LLM didn't complete within {deadline}s")
+    if elapsed > 0:
+        time.sleep(elapsed)
+    return f"Mock answer with docs___{top_k_docs}", round(elapsed, 4), MOCK_LLM_TOKENS
 
 
 llms_client = None
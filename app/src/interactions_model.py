@@ -1,41 +1,98 @@
 import logging
+import re
 import threading
 import time
-from datetime import datetime, timezone
-from config import CONVERSATIONS_INDEX
+from datetime import datetime, timedelta, timezone
+from config import CONVERSATIONS_INDEX, CONVERSATIONS_MAINTENANCE_INTERVAL_SECS, CONVERSATIONS_RETENTION_WEEKS
+import circuit_breaker
+import metrics
+from tracing import tracer
 
+# Attempts to save an interaction before it's dropped, not counting the time its circuit is open
+INTERACTION_SAVE_ATTEMPTS = 5
+# Every weekly index, and the indices named by the week number only, before the year was added
+INDEX_PATTERN = f"{CONVERSATIONS_INDEX}_*"
+WEEKLY_INDEX = re.compile(rf"^{re.escape(CONVERSATIONS_INDEX)}_(\d{{4}})_(\d{{2}})$")
 
-def get_current_index_name():
+
+def get_current_index_name(now: datetime = None):
     """
-      Returns the current index name based on the week number.
+      Returns the current index name based on the ISO year and week number, e.g. conversations_2024_07.
+      Args:
+          now (datetime, optional): The time to name the index of. Default is now.
       Returns:
           str: The current index name.
       """
-    week_num = datetime.now(timezone.utc).isocalendar()[1]
-    return f"{CONVERSATIONS_INDEX}_{week_num}"
+    year, week, _ = (now or datetime.now(timezone.utc)).isocalendar()
+    return f"{CONVERSATIONS_INDEX}_{year}_{week:02d}"
+
+
+def recent_index_names(now: datetime = None) -> str:
+    """
+      Returns the indices of the current and the previous week, where a rated conversation is looked up.
+      Args:
+          now (datetime, optional): The current time. Default is now.
+      Returns:
+          str: The index names, comma separated.
+      """
+    now = now or datetime.now(timezone.utc)
+    return f"{get_current_index_name(now)},{get_current_index_name(now - timedelta(weeks=1))}"
+
+
+def index_week_start(index_name: str):
+    """
+      Returns the start of the week of a weekly index.
+      Args:
+          index_name (str): The index name.
+      Returns:
+          datetime: The Monday the week starts, or None if the index isn't a weekly index.
+      """
+    match = WEEKLY_INDEX.match(index_name)
+    if match is None:
+        return None
+    return datetime.fromisocalendar(int(match.group(1)), int(match.group(2)), 1).replace(tzinfo=timezone.utc)
 
 
 class InteractionsModel:
     """
        A class to manage interactions and save them to Elasticsearch.
-       Every interaction (question or rating) is saved to an index named after the current week number.
+       Every interaction (question or rating) is saved to an index named after the current year and week number. The
+       weekly indices are created from an index template, which maps them and adds them to the `CONVERSATIONS_INDEX`
+       alias. The current index is remembered, so saving makes no metadata calls except once a week, when it rolls over.
+       An interaction that fails to save stays queued and is retried, up to `INTERACTION_SAVE_ATTEMPTS` times, or for
+       as long as the Elasticsearch writes circuit is open.
+       Every `CONVERSATIONS_MAINTENANCE_INTERVAL_SECS` the polling thread also maintains the weekly indices: the weeks
+       that ended are made read only and force merged into a single segment, and those older than
+       `CONVERSATIONS_RETENTION_WEEKS` are deleted.
        The class uses a queue ("poll queue") to store interactions.
        Attributes:
            queue (list): A list to store interactions.
+           queued_endpoints (dict): The endpoint each queued interaction came from, by the interaction's id, so the
+               queue depth is measured per endpoint.
            t (threading.Thread): A thread for polling the queue.
            poll_queue (bool): A flag to control the polling of the queue.
            es_client (Elasticsearch): An Elasticsearch client instance.
+           current_index (str): The index known to exist that interactions are saved to.
+           next_maintenance (float): When the weekly indices are maintained next, in seconds since the epoch.
        Methods:
            __init__(es_client): Initializes the InteractionsModel instance.
            start_poll(): Starts the polling thread.
            handle_queue(): Handles the interactions queue.
+           put_index_template(): Creates or updates the index template of the weekly indices.
            create_index(): Creates an Elasticsearch index if it does not exist.
+           maintain_indices(now): Compacts the weekly indices that ended and deletes the expired ones.
+           maintain_index(index_name, index, now): Compacts or deletes one weekly index.
            do_save_interaction(interaction): Saves an interaction to Elasticsearch.
-           save_interaction(interaction): Adds an interaction to the queue and starts polling if not already started.
+           save_interaction(interaction, endpoint): Adds an interaction to the queue and starts polling if not already
+               started.
+           dequeue(): Removes the first interaction from the queue.
        """
     queue = []
+    queued_endpoints = {}
     t = None
     poll_queue = False
+    current_index = None
+    next_maintenance = 0
 
 
     def __init__(self, es_client):
@@ -45,6 +102,7 @@ class InteractionsModel:
             es_client (Elasticsearch): An Elasticsearch client instance.
         """
         self.es_client = es_client
+        self.put_index_template()
         self.create_index()
         self.start_poll()
 
@@ -63,18 +121,54 @@ class InteractionsModel:
        Handles the interactions queue.
        """
         logging.info("Handling queue")
+        failed_attempts = 0
         while True and self.poll_queue:
+            if time.time() >= self.next_maintenance:
+                self.next_maintenance = time.time() + CONVERSATIONS_MAINTENANCE_INTERVAL_SECS
+                try:
+                    self.maintain_indices()
+                except Exception as e:
+                    logging.error(f"Maintaining the conversation indices failed: {e}")
             if len(self.queue) == 0:
                 time.sleep(1)
                 continue
-            interaction = self.queue.pop(0)
-            if interaction['interaction_type'] == 'rating':
-                exists = self.es_client.count(index=get_current_index_name(),
-                                              body={"query": {"match": {"conversation_id":
-                                                                            interaction['conversation_id']}}})
-                if exists['count'] == 0:
+            interaction = self.queue[0]
+            try:
+                if interaction['interaction_type'] == 'rating':
+                    exists = circuit_breaker.factory("es_search").call(
+                        self.es_client.count, index=recent_index_names(), ignore_unavailable=True,
+                        body={"query": {"match": {"conversation_id": interaction['conversation_id']}}})
+                    if exists['count'] == 0:
+                        failed_attempts = 0
+                        self.dequeue()
+                        continue
+                circuit_breaker.factory("es_write").call(self.do_save_interaction, interaction)
+            except circuit_breaker.CircuitOpenError:
+                # Keep the interaction queued until Elasticsearch recovers
+                time.sleep(1)
+                continue
+            except Exception as e:
+                failed_attempts += 1
+                if failed_attempts < INTERACTION_SAVE_ATTEMPTS:
+                    logging.warning(f"Saving the interaction failed, retrying: {e}")
+                    time.sleep(1)
                     continue
-            self.do_save_interaction(interaction)
+                logging.error(f"Dropping the interaction after {failed_attempts} failed attempts: {e}")
+            failed_attempts = 0
+            self.dequeue()
+
+
+    def put_index_template(self):
+        """
+          Creates or updates the index template of the weekly indices.
+          """
+        self.es_client.indices.put_index_template(
+            name=CONVERSATIONS_INDEX,
+            index_patterns=[INDEX_PATTERN],
+            template={
+                "mappings": {"properties": {"timestamp": {"type": "date"}, "conversation_id": {"type": "keyword"}}},
+                "aliases": {CONVERSATIONS_INDEX: {}},
+            })
 
 
     def create_index(self):
@@ -84,9 +178,53 @@ class InteractionsModel:
         index_name = get_current_index_name()
         if not self.es_client.indices.exists(index=index_name):
             self.es_client.indices.create(index=index_name)
-            logging.debug("Index created ${index_name}")
+            logging.debug(f"Index created {index_name}")
         else:
             logging.debug("Index exists")
+        self.current_index = index_name
+
+
+    def maintain_indices(self, now: datetime = None):
+        """
+          Makes the weekly indices of the weeks that ended read only and force merges them into a single segment, once,
+          and deletes those that ended more than `CONVERSATIONS_RETENTION_WEEKS` weeks ago, if it is set. The merges
+          run in the background of Elasticsearch. Indices named by the week number only are left as they are.
+          Args:
+              now (datetime, optional): The current time. Default is now.
+          """
+        now = now or datetime.now(timezone.utc)
+        current_index = get_current_index_name(now)
+        indices = self.es_client.indices.get(index=INDEX_PATTERN)
+        for index_name, index in indices.items():
+            if index_name == current_index:
+                continue
+            try:
+                self.maintain_index(index_name, index, now)
+            except Exception as e:
+                # e.g. another worker deleted it first, the others are still maintained
+                logging.error(f"Maintaining the index {index_name} failed: {e}")
+
+
+    def maintain_index(self, index_name: str, index: dict, now: datetime):
+        """
+          Compacts or deletes one weekly index of a week that ended, see `maintain_indices`.
+          Args:
+              index_name (str): The index name.
+              index (dict): The index, with its settings.
+              now (datetime): The current time.
+          """
+        week_start = index_week_start(index_name)
+        if week_start is None or week_start > now:
+            return
+        if CONVERSATIONS_RETENTION_WEEKS and week_start + timedelta(weeks=CONVERSATIONS_RETENTION_WEEKS + 1) <= now:
+            self.es_client.indices.delete(index=index_name)
+            metrics.INTERACTION_INDEX_MAINTENANCE.labels("delete").inc()
+            logging.info(f"Deleted the expired index {index_name}")
+        elif index.get("settings", {}).get("index", {}).get("blocks", {}).get("write") != "true":
+            self.es_client.indices.put_settings(index=index_name, settings={"index.blocks.write": True})
+            self.es_client.indices.forcemerge(index=index_name, max_num_segments=1, wait_for_completion=False)
+            metrics.INTERACTION_INDEX_MAINTENANCE.labels("forcemerge").inc()
+            logging.info(f"Force merging the index {index_name} of a week that ended")
 
 
     def do_save_interaction(self, interaction):
@@ -99,22 +237,36 @@ class InteractionsModel:
 
         interaction['timestamp'] = datetime.now(timezone.utc).isoformat()
 
-        if not self.es_client.indices.exists(index=get_current_index_name()):
+        if self.current_index != get_current_index_name():
             self.create_index()
         logging.debug("Saving interaction", interaction)
-        self.es_client.index(index=get_current_index_name(), body=interaction)
+        with tracer.start_as_current_span("interactions.save") as span, \
+                metrics.INTERACTION_FLUSH_LATENCY.labels(interaction.get('interaction_type', 'unknown')).time():
+            span.set_attribute("ragbot.request_trace_id", interaction.get('metadata', {}).get('trace_id', ''))
+            self.es_client.index(index=self.current_index, body=interaction)
 
 
-    def save_interaction(self, interaction):
+    def save_interaction(self, interaction, endpoint: str = "unknown"):
         """
           Adds an interaction to the queue and starts polling if not already started.
           Args:
               interaction (dict): The interaction to save.
+              endpoint (str, optional): The endpoint the interaction came from, labelling the queue depth.
           """
         logging.debug("saving interaction in type", interaction['interaction_type'])
         if not self.poll_queue:
             self.start_poll()
+        self.queued_endpoints[id(interaction)] = endpoint
         self.queue.append(interaction)
+        metrics.INTERACTION_QUEUE_DEPTH.labels(endpoint).inc()
+
+
+    def dequeue(self):
+        """
+          Removes the first interaction from the queue, once it's saved or dropped.
+          """
+        interaction = self.queue.pop(0)
+        metrics.INTERACTION_QUEUE_DEPTH.labels(self.queued_endpoints.pop(id(interaction), "unknown")).dec()
 
 
 singleton = None
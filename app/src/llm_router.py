@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from webiks_hebrew_ragbot.llm_client import LLMClient
+import metrics
+from config import LLM_BACKENDS, LLM_ROUTER_COOLDOWN_SECS, LLM_ROUTER_DEADLINE_SECS, LLM_ROUTER_EXPLORE_RATE, \
+    LLM_ROUTER_MAX_ERROR_RATE, LLM_ROUTER_WINDOW
+from gpt_client import GPTClient, llms_client_factory
+from llm_transport import DeadlineExceeded
+from saved_config import Configs
+
+# An error rate over fewer calls than this doesn't mark a backend unhealthy
+MIN_CALLS_FOR_ERROR_RATE = 3
+# Weight of the latest call in a backend's moving average latency
+LATENCY_SMOOTHING = 0.3
+
+
+class LLMBackend:
+    """
+       An LLM client and the model it answers with, and the backend's recent latency and errors.
+       Attributes:
+           name (str): The backend's spec, e.g. "openai:gpt-4o-mini".
+           client (GPTClient): The client.
+           model (str): The model, None for the configuration's model.
+           fallback (bool): Whether the backend is only used when no other backend is healthy.
+           outcomes (deque): Whether each of the most recent calls succeeded.
+           latency (float): The moving average latency of successful calls, None before the first.
+           last_failure (float): The monotonic time of the last failed call, None if none failed.
+       Methods:
+           record(succeeded, latency): Records the outcome of a call.
+           error_rate(): Returns the error rate of the recent calls.
+           is_healthy(now, max_error_rate, cooldown): Returns whether the backend should be preferred.
+       """
+    def __init__(self, name: str, client: GPTClient, model: str = None, fallback: bool = False,
+                 window: int = LLM_ROUTER_WINDOW):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.fallback = fallback
+        self.outcomes = deque(maxlen=window)
+        self.latency = None
+        self.last_failure = None
+
+
+    def record(self, succeeded: bool, latency: float):
+        self.outcomes.append(succeeded)
+        if not succeeded:
+            self.last_failure = time.monotonic()
+        elif self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+    def is_healthy(self, now: float, max_error_rate: float, cooldown: float) -> bool:
+        """
+        A backend is unhealthy while its recent error rate is at least `max_error_rate`, until `cooldown` seconds
+        passed since its last failure, when it's tried again.
+        """
+        if len(self.outcomes) < MIN_CALLS_FOR_ERROR_RATE or self.error_rate() < max_error_rate:
+            return True
+        return now - self.last_failure >= cooldown
+
+
+class LLMRouter(LLMClient):
+    """
+       Routes each question to the fastest healthy LLM backend, falling back to the next one when it fails.
+       Healthy backends are ranked by their moving average latency, backends not called yet first and those called
+       but without a successful call yet last; a small share of the calls goes to a random healthy backend instead, so
+       a backend that recovered from a latency spike is measured again. Fallback backends (the mock) come next, then
+       the unhealthy backends. All attempts share one deadline.
+       Attributes:
+           backends (list[LLMBackend]): The backends, in the configured order.
+           deadline (float): The deadline of a question, all attempts included, in seconds.
+           max_error_rate (float): The recent error rate from which a backend is unhealthy.
+           cooldown (float): Seconds after its last failure that an unhealthy backend is tried again.
+           explore_rate (float): The share of calls routed to a random healthy backend.
+           lock (threading.Lock): Guards the backends' statistics.
+       Methods:
+           ranked(): Returns the backends in the order to try them.
+           answer(query, top_k_docs): Gets the answer for the given query and documents.
+           answer_with_usage(query, top_k_docs, deadline=None): Gets the answer with the token usage and the model
+               that answered.
+       """
+    def __init__(self, backends: list, deadline: float = LLM_ROUTER_DEADLINE_SECS,
+                 max_error_rate: float = LLM_ROUTER_MAX_ERROR_RATE, cooldown: float = LLM_ROUTER_COOLDOWN_SECS,
+                 explore_rate: float = LLM_ROUTER_EXPLORE_RATE):
+        super().__init__()
+        self.backends = backends
+        self.deadline = deadline
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.explore_rate = explore_rate
+        self.lock = threading.Lock()
+
+
+    def ranked(self) -> list:
+        now = time.monotonic()
+        with self.lock:
+            healthy = [backend for backend in self.backends if not backend.fallback
+                       and backend.is_healthy(now, self.max_error_rate, self.cooldown)]
+            # Backends not called yet are measured first, and those whose every call failed go after the measured ones
+            healthy.sort(key=lambda backend: (backend.latency is None and False in backend.outcomes,
+                                              backend.latency or 0.0))
+            unhealthy = [backend for backend in self.backends if not backend.fallback and backend not in healthy]
+            unhealthy.sort(key=lambda backend: backend.last_failure)
+        if len(healthy) > 1 and random.random() < self.explore_rate:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return healthy + [backend for backend in self.backends if backend.fallback] + unhealthy
+
+
+    def answer(self, query, top_k_docs):
+        """
+         Gets the answer for the given query and documents.
+         Args:
+             query (str): The query string.
+             top_k_docs (list): The list of top documents.
+         Returns:
+             tuple: The answer, elapsed time, and token usage.
+         """
+        answer, elapsed, usage = self.answer_with_usage(query, top_k_docs)
+        return answer, elapsed, usage["tokens"]
+
+
+    def answer_with_usage(self, query, top_k_docs, deadline=None):
+        """
+         Gets the answer from the first backend, in rank order, that answers before the deadline.
+         Args:
+             query (str): The query string.
+             top_k_docs (list): The list of top documents.
+             deadline (float, optional): A shorter deadline for this question, in seconds.
+         Returns:
+             tuple: The answer, elapsed time, failed attempts included, and the token usage, whose `model` is the
+             model that answered.
+         Raises:
+             Exception: The last backend's failure, or DeadlineExceeded if the deadline passed first.
+         """
+        before_route = time.perf_counter()
+        deadline = min(deadline, self.deadline) if deadline else self.deadline
+        deadline_at = time.monotonic() + deadline
+        error = None
+        for backend in self.ranked():
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            before_call = time.perf_counter()
+            try:
+                answer, _, usage = backend.client.answer_with_usage(query, top_k_docs, model=backend.model,
+                                                                    deadline=remaining)
+            except Exception as e:
+                logging.warning(f"LLM backend {backend.name} failed: {e}")
+                with self.lock:
+                    backend.record(False, time.perf_counter() - before_call)
+                metrics.LLM_ROUTED.labels(backend.name, "error").inc()
+                error = e
+                continue
+            with self.lock:
+                backend.record(True, time.perf_counter() - before_call)
+            metrics.LLM_ROUTED.labels(backend.name, "success").inc()
+            return answer, round(time.perf_counter() - before_route, 4), usage
+        raise error or DeadlineExceeded(f"No LLM backend answered within {deadline}s")
+
+
+def create_backends(configs_class: Configs, specs: list) -> list:
+    """
+    Creates the backends of the specs: "openai" (the configuration's model) or "openai:<model>",
+    "google:<model>" and "mock", the fallback. Backends of a provider share one client. A Google backend is skipped,
+    with an error logged, if google-generativeai isn't installed. The mock answers with a dump of the documents, which
+    the router would report as a successful answer, so it's only allowed when `IS_MOCK_GPT_CLIENT` is set.
+    Args:
+        configs_class (Configs): The configuration class instance.
+        specs (list[str]): The backend specs.
+    Returns:
+        list[LLMBackend]: The backends.
+    """
+    clients = {}
+    backends = []
+    for spec in specs:
+        provider, _, model = spec.partition(":")
+        if provider not in clients:
+            if provider == "openai":
+                clients[provider] = GPTClient(configs_class, is_mock_client=False)
+            elif provider == "mock":
+                if os.getenv('IS_MOCK_GPT_CLIENT', "false").lower() != "true":
+                    raise ValueError("The mock LLM backend is for tests and load tests, set IS_MOCK_GPT_CLIENT=true "
+                                     "to use it")
+                clients[provider] = GPTClient(configs_class, is_mock_client=True)
+            elif provider == "google":
+                try:
+                    from gemini_client import GeminiClient
+                    clients[provider] = GeminiClient(configs_class)
+                except ImportError as e:
+                    logging.error(f"Skipping LLM backend {spec}, google-generativeai is not available: {e}")
+                    continue
+            else:
+                raise ValueError(f"Unknown LLM backend: {spec}")
+        if provider == "google" and not model:
+            raise ValueError(f"The Google LLM backend needs a model, e.g. google:gemini-1.5-flash, got: {spec}")
+        backends.append(LLMBackend(spec, clients[provider], model or ("mock" if provider == "mock" else None),
+                                   fallback=provider == "mock"))
+    return backends
+
+
+llm_router = None
+
+
+def factory(configs_class: Configs):
+    """
+    Factory function to create and return a singleton LLM client: an LLMRouter over `LLM_BACKENDS`, or the GPTClient
+    of the configured model if no backends are set.
+    Args:
+        configs_class (Configs): The configuration class instance.
+    Returns:
+        LLMClient: The singleton LLM client.
+    """
+    global llm_router
+    if not LLM_BACKENDS:
+        return llms_client_factory(configs_class)
+    if llm_router is None:
+        backends = create_backends(configs_class, LLM_BACKENDS)
+        if not backends:
+            raise ValueError(f"None of the LLM backends is available: {LLM_BACKENDS}")
+        llm_router = LLMRouter(backends)
+    return llm_router
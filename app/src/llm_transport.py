@@ -0,0 +1,181 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx
+import openai
+import metrics
+from config import LLM_CONNECT_TIMEOUT_SECS, LLM_DEADLINE_SECS, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_PERCENTILE, \
+    LLM_HEDGE_WINDOW, LLM_KEEPALIVE_SECS, LLM_MAX_RETRIES, LLM_POOL_SIZE, LLM_RETRY_BACKOFF_SECS
+
+# Transient failures worth another attempt: timeouts, connection errors, rate limits and server errors
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when an LLM call, retries included, doesn't complete within its deadline.
+    """
+
+
+def create_http_client(pool_size: int = LLM_POOL_SIZE, hedging: bool = LLM_HEDGE_PERCENTILE > 0) -> httpx.Client:
+    """
+    Creates the HTTP client of the OpenAI client: a keep-alive connection pool sized to the worker's concurrent LLM
+    calls, doubled when hedging since a hedged call holds two connections.
+    Args:
+        pool_size (int, optional): The concurrent LLM calls of the worker. Default is `LLM_POOL_SIZE`.
+        hedging (bool, optional): Whether calls may be hedged. Default is whether `LLM_HEDGE_PERCENTILE` is set.
+    Returns:
+        httpx.Client: The HTTP client.
+    """
+    max_connections = pool_size * 2 if hedging else pool_size
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                            keepalive_expiry=LLM_KEEPALIVE_SECS),
+        timeout=httpx.Timeout(LLM_DEADLINE_SECS, connect=LLM_CONNECT_TIMEOUT_SECS),
+    )
+
+
+class LatencyWindow:
+    """
+       The latencies of the most recent successful LLM calls, from which the hedging delay is taken.
+       Attributes:
+           latencies (deque): The recent latencies, in seconds.
+           lock (threading.Lock): Guards the latencies.
+       Methods:
+           add(latency): Records a latency.
+           percentile(p, min_samples): Returns the p-th percentile, or None with too few samples.
+       """
+    def __init__(self, size: int = LLM_HEDGE_WINDOW):
+        self.latencies = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+
+    def add(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+
+
+    def percentile(self, p: float, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if not ordered or len(ordered) < min_samples:
+            return None
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class LLMTransport:
+    """
+       Calls the LLM with a deadline, bounded retries and optional hedging.
+       Every call has a deadline that covers all its attempts; each attempt's timeout is the time left. Transient
+       failures are retried up to `max_retries` times after a backoff with full jitter, honouring a server's
+       Retry-After, as long as the deadline allows. With hedging enabled, an attempt that is still running after the
+       `hedge_percentile` latency of recent calls is raced against a second, identical request, and the first
+       successful response wins; the slower request runs to completion in the background.
+       Attributes:
+           create (callable): Sends one request, e.g. `OpenAI().chat.completions.create`, with a `timeout` argument.
+           retryable_errors (tuple): The exception types of transient failures.
+           deadline (float): The deadline of a call, in seconds.
+           max_retries (int): The retries of a call.
+           backoff (float): The base of the exponential backoff, in seconds.
+           hedge_percentile (float): The latency percentile after which a request is hedged, 0 disables hedging.
+           latencies (LatencyWindow): The latencies of recent successful requests.
+           hedge_executor (ThreadPoolExecutor): Runs the requests of hedged attempts.
+       Methods:
+           complete(deadline=None, **kwargs): Sends the request and returns the response.
+       """
+    def __init__(self, create, deadline: float = LLM_DEADLINE_SECS, max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_RETRY_BACKOFF_SECS, hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 pool_size: int = LLM_POOL_SIZE, retryable_errors: tuple = RETRYABLE_ERRORS):
+        self.create = create
+        self.retryable_errors = retryable_errors
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.latencies = LatencyWindow()
+        self.hedge_executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="llm-hedge") \
+            if hedge_percentile > 0 else None
+
+
+    def complete(self, deadline: float = None, **kwargs):
+        """
+        Sends the request, retrying transient failures, within the deadline.
+        Args:
+            deadline (float, optional): A shorter deadline for this call, in seconds.
+            **kwargs: The request's arguments; `model` labels the metrics.
+        Returns:
+            The response.
+        Raises:
+            DeadlineExceeded: If the deadline passed before a response.
+            openai.OpenAIError: The last failure, if it isn't retryable or the retries ran out.
+        """
+        model = kwargs.get("model", "")
+        deadline = min(deadline, self.deadline) if deadline else self.deadline
+        deadline_at = time.monotonic() + deadline
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"The LLM call didn't complete within {deadline}s")
+            try:
+                return self.attempt(model, remaining, kwargs)
+            except self.retryable_errors as e:
+                delay = self.backoff_delay(attempt, e)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline_at:
+                    if isinstance(e, (TimeoutError, openai.APITimeoutError)):
+                        raise DeadlineExceeded(f"The LLM call didn't complete within {deadline}s") from e
+                    raise
+                logging.warning(f"LLM request failed, retrying in {delay:.2f}s: {e}")
+                metrics.LLM_RETRIES.labels(model, type(e).__name__).inc()
+                time.sleep(delay)
+
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Returns the delay before the next attempt: full jitter over an exponential backoff, or the server's
+        Retry-After if longer.
+        """
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        retry_after = headers.get("retry-after") if headers is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+
+    def send(self, remaining: float, kwargs: dict):
+        before_request = time.perf_counter()
+        response = self.create(timeout=remaining, **kwargs)
+        self.latencies.add(time.perf_counter() - before_request)
+        return response
+
+
+    def attempt(self, model: str, remaining: float, kwargs: dict):
+        """
+        Sends one attempt, hedged after the latency percentile of recent requests when hedging is enabled.
+        """
+        hedge_delay = self.latencies.percentile(self.hedge_percentile) if self.hedge_executor else None
+        if hedge_delay is None or hedge_delay >= remaining:
+            return self.send(remaining, kwargs)
+
+        started_at = time.monotonic()
+        primary = self.hedge_executor.submit(self.send, remaining, kwargs)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        hedge = self.hedge_executor.submit(self.send, remaining - (time.monotonic() - started_at), kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    metrics.LLM_HEDGES.labels(model, "hedge" if future is hedge else "primary").inc()
+                    return future.result()
+                error = future.exception()
+        metrics.LLM_HEDGES.labels(model, "none").inc()
+        raise error
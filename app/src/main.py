@@ -1,30 +1,94 @@
 import config  # keep it first
-from typing import List
+from typing import List, Literal, Optional
+import asyncio
+import json
 import logging
+import orjson
+import time
 import uuid
 import uvicorn
+from contextlib import asynccontextmanager
 from http import HTTPStatus
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles
 from utils import convert_kolzchut_paragraphs_corpus_to_json, create_or_update_doc
-from pydantic import BaseModel
-from webiks_hebrew_ragbot.engine import engine_factory
+from pydantic import BaseModel, Field
 import get_es_client
-import interactions_model
+import metrics
+import retrieval_cache
 import saved_config
-from gpt_client import llms_client_factory
+import circuit_breaker
+import retrieval
+import reranker
+from responses import DOC_FIELDS, add_compression, select_fields, serialize
+from static_files import CachedStaticFiles
+from retrieval_cache import normalize_query
+from single_flight import SingleFlight
+from admission import AdmissionController, AdmissionRejected
+import llm_router
+from interactions_model import factory as interactions_model_factory
 from logger import setup_logging
+from tracing import current_trace_id, instrument_engine, setup_tracing, traced, tracer
+from startup import create_engine, load_retrieval_model, startup_timings, timed_phase, wait_for_es, warm_up
 from updater_service import updater_factory
 
 setup_logging()
-es_client = get_es_client.factory()
-app = FastAPI()
-configs = saved_config.factory(es_client)
-gpt_client = llms_client_factory(configs)
-engine = engine_factory(gpt_client, es_client)
-updater_service = updater_factory(es_client, engine)
-interactions_model = interactions_model.factory(es_client)
+setup_tracing()
+# Created on startup, see lifespan
+es_client = None
+configs = None
+gpt_client = None
+engine = None
+updater_service = None
+interactions_model = None
+document_reranker = None
+retrieval_cache = retrieval_cache.factory()
+search_flights = SingleFlight()
+search_admission = AdmissionController("search")
+
+
+def init_es_dependencies(es_client):
+    """
+    Waits for Elasticsearch and creates the dependencies that need it.
+    Args:
+        es_client (Elasticsearch): The Elasticsearch client instance.
+    Returns:
+        tuple: The configs, the LLM client and the interactions model.
+    """
+    timed_phase("wait_for_es", wait_for_es, es_client)
+    configs = timed_phase("configs", saved_config.factory, es_client)
+    timed_phase("retrieval_cache", retrieval_cache.connect, es_client)
+    gpt_client = timed_phase("llm_client", llm_router.factory, configs)
+    interactions_model = timed_phase("interactions_model", interactions_model_factory, es_client)
+    return configs, gpt_client, interactions_model
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Creates the app's dependencies on startup.
+    The Elasticsearch bound dependencies and the retrieval model load run concurrently, and the engine is warmed up
+    in the background once the app starts serving.
+    """
+    global es_client, configs, gpt_client, engine, updater_service, interactions_model, document_reranker
+    before_startup = time.perf_counter()
+    es_client = get_es_client.factory()
+    (configs, gpt_client, interactions_model), retrieval_model, document_reranker = await asyncio.gather(
+        asyncio.to_thread(init_es_dependencies, es_client),
+        asyncio.to_thread(timed_phase, "retrieval_model", load_retrieval_model),
+        asyncio.to_thread(timed_phase, "reranker", reranker.factory),
+    )
+    engine = timed_phase("engine", create_engine, gpt_client, es_client, retrieval_model)
+    instrument_engine(engine)
+    updater_service = await asyncio.to_thread(timed_phase, "updater_service", updater_factory, es_client, engine)
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up, engine))
+    logging.info(f"Startup took {round(time.perf_counter() - before_startup, 4)}s, phases: {startup_timings}")
+    yield
+    await warm_up_task
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 origins = ['http://localhost:5000']
 
@@ -37,11 +101,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+add_compression(app)
+
+
+DocField = Literal[DOC_FIELDS]
 
 
 class SearchQuery(BaseModel):
     query: str
     asked_from: str
+    fields: Optional[List[DocField]] = None
+
+
+class RetrieveQuery(BaseModel):
+    """
+    Attributes:
+        query (str): The query.
+        top_k (int, optional): The number of documents to retrieve, the configuration's `num_of_pages` if not set.
+        fields (List[str], optional): The fields of the returned documents, all of them if not set.
+    """
+    query: str
+    top_k: Optional[int] = Field(None, ge=1)
+    fields: Optional[List[DocField]] = None
+
+
+class RetrieveBatchQuery(BaseModel):
+    """
+    Attributes:
+        queries (List[str]): The queries, up to `RETRIEVE_MAX_BATCH`.
+        top_k (int, optional): The number of documents to retrieve per query, the configuration's `num_of_pages` if
+            not set.
+        fields (List[str], optional): The fields of the returned documents, all of them if not set.
+    """
+    queries: List[str] = Field(min_length=1, max_length=config.RETRIEVE_MAX_BATCH)
+    top_k: Optional[int] = Field(None, ge=1)
+    fields: Optional[List[DocField]] = None
 
 
 class Document(BaseModel):
@@ -75,12 +169,13 @@ class DocumentRequest(BaseModel):
 async def health():
     """
     Health check endpoint.
-    Logs access to the health check endpoint and returns a status code of 200.
+    Logs access to the health check endpoint and returns a status code of 200, with the state of the circuits of
+    the dependencies.
     Returns:
-        int: HTTP status code 200.
+        dict: The status code 200 and the circuits' states.
     """
     logging.info("Health check endpoint accessed")
-    return HTTPStatus.OK
+    return {"status": HTTPStatus.OK, "circuits": circuit_breaker.states()}
 
 
 @app.get("/get_config")
@@ -90,7 +185,19 @@ async def get_conf():
     Returns:
         dict: Current configuration settings.
     """
-    return configs.get_config()
+    with metrics.CONFIG_FETCH_LATENCY.labels("get_config").time():
+        return configs.get_config()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Expose the service metrics in the Prometheus text format.
+    Returns:
+        Response: The metrics payload.
+    """
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
 
 
 @app.post("/set_config")
@@ -108,12 +215,211 @@ async def set_conf(params: dict):
         "temperature": params.get("temperature"),
         "user_prompt": params.get("user_prompt"),
         "system_prompt": params.get("system_prompt"),
+        "max_prompt_tokens": params.get("max_prompt_tokens"),
+        "max_tokens": params.get("max_tokens"),
+        "llm_deadline_secs": params.get("llm_deadline_secs"),
+        "adaptive_pages": params.get("adaptive_pages"),
+        "min_pages": params.get("min_pages"),
+        "max_pages": params.get("max_pages"),
+        "adaptive_pages_margin": params.get("adaptive_pages_margin"),
+        "context_duplicate_threshold": params.get("context_duplicate_threshold"),
     }.items() if v is not None}
     configs.set_config(data)
     return HTTPStatus.OK
 
 
+def search_documents(query: str, top_k: int):
+    """
+    Searches the engine through the Elasticsearch searches circuit; the retrieval cache serves cached results while
+    it's open.
+    """
+    return circuit_breaker.factory("es_search").call(engine.search_documents, query, top_k)
+
+
+def scored_search_documents(query: str, top_k: int):
+    """
+    Searches for the documents with their scores; the search runs through the Elasticsearch searches circuit.
+    """
+    return retrieval.search_documents(engine, query, top_k)
+
+
+def retrieve_documents(query: str, top_k: int, scored: bool = False):
+    """
+    Retrieve the top k documents for a query, served from the retrieval cache when possible.
+    Args:
+        query (str): The query string.
+        top_k (int): The number of documents to retrieve.
+        scored (bool, optional): Whether the documents need their retrieval `score`.
+    Returns:
+        tuple: The top k documents and the retrieval time.
+    """
+    before_retrieval = time.perf_counter()
+    with tracer.start_as_current_span("retrieval"):
+        if scored:
+            top_k_documents = retrieval_cache.search_documents(query, top_k, scored_search_documents, "scored")
+        else:
+            top_k_documents = retrieval_cache.search_documents(query, top_k, search_documents)
+    retrieval_time = round(time.perf_counter() - before_retrieval, 4)
+    logging.info(f"retrieval time: {retrieval_time}")
+    return top_k_documents, retrieval_time
+
+
+def config_value(current_config: dict, key: str):
+    return current_config.get(key, saved_config.seed_config[key])
+
+
+def rerank_documents(query: str, top_k_documents: list, top_k: int):
+    """
+    Reranks the retrieved candidates with the cross-encoder, if one is configured, and keeps the top k.
+    Args:
+        query (str): The query string.
+        top_k_documents (list): The retrieved candidates.
+        top_k (int): The number of documents for the LLM.
+    Returns:
+        tuple: The top k documents and the reranking metadata: `rerank_time` and whether they were `reranked`,
+        empty without a reranker.
+    """
+    if document_reranker is None:
+        return top_k_documents[:top_k], {}
+    with tracer.start_as_current_span("rerank"):
+        top_k_documents, rerank_time, reranked = document_reranker.rerank(query, top_k_documents, top_k)
+    logging.info(f"rerank time: {rerank_time}")
+    return top_k_documents, {"rerank_time": rerank_time, "reranked": reranked}
+
+
+def answer_query(query: str, current_config: dict):
+    """
+    Runs the search pipeline for a query: retrieval, reranking if configured, and the LLM answer. Blocking, so it
+    runs in a worker thread.
+    With the configuration's `adaptive_pages`, the number of documents is chosen per query from the retrieval scores,
+    between `min_pages` and `max_pages`, instead of `num_of_pages`.
+    If the LLM fails, doesn't answer within the configuration's `llm_deadline_secs` or its circuit is open, the
+    retrieved documents are returned without an answer.
+    Args:
+        query (str): The query string.
+        current_config (dict): The current configuration.
+    Returns:
+        tuple: The top k documents, the retrieval time, the LLM answer, the LLM time, the token usage, why the
+        response was degraded to the documents only, None if it wasn't, and the metadata of the optional stages.
+    """
+    adaptive = str(config_value(current_config, "adaptive_pages")).lower() == "true"
+    top_k = int(config_value(current_config, "max_pages")) if adaptive else int(current_config["num_of_pages"])
+    # The reranker picks the top k out of a larger candidate set
+    candidates = max(top_k, document_reranker.candidates) if document_reranker is not None else top_k
+    top_k_documents, retrieval_time = retrieve_documents(query, candidates, scored=adaptive)
+    metrics.RETRIEVAL_LATENCY.labels("search").observe(retrieval_time)
+    stage_metadata = {}
+    if adaptive:
+        top_k = retrieval.adaptive_top_k(top_k_documents, int(config_value(current_config, "min_pages")), top_k,
+                                         float(config_value(current_config, "adaptive_pages_margin")))
+        metrics.ADAPTIVE_PAGES.observe(top_k)
+        stage_metadata["num_of_pages"] = top_k
+    top_k_documents, rerank_metadata = rerank_documents(query, top_k_documents, top_k)
+    stage_metadata.update(rerank_metadata)
+    deadline = float(config_value(current_config, "llm_deadline_secs"))
+    before_llm = time.perf_counter()
+    try:
+        llm_ans, llm_time, usage = circuit_breaker.factory("llm").call(
+            gpt_client.answer_with_usage, query, top_k_documents, deadline=deadline)
+    except Exception as e:
+        if isinstance(e, circuit_breaker.CircuitOpenError):
+            degraded_reason = "llm_circuit_open"
+        else:
+            degraded_reason = "llm_deadline" if isinstance(e, TimeoutError) else "llm_error"
+        logging.error(f"No LLM answer ({degraded_reason}), returning the retrieved documents only: {e}")
+        metrics.DEGRADED_RESPONSES.labels("search", degraded_reason).inc()
+        usage = {"model": current_config["model"], "tokens": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                 "context_docs": 0, "context_tokens_saved": 0}
+        return top_k_documents, retrieval_time, None, round(time.perf_counter() - before_llm, 4), usage, \
+            degraded_reason, stage_metadata
+    model, config_version = usage["model"], current_config["version"]
+    metrics.LLM_LATENCY.labels("search", model).observe(llm_time)
+    metrics.TOKENS.labels("search", model, config_version).inc(usage["tokens"])
+    metrics.PROMPT_TOKENS.labels("search", model, config_version).inc(usage["prompt_tokens"])
+    metrics.CACHED_PROMPT_TOKENS.labels("search", model, config_version).inc(usage["cached_tokens"])
+    metrics.CONTEXT_TOKENS_SAVED.labels("search", model, config_version).inc(usage.get("context_tokens_saved", 0))
+    return top_k_documents, retrieval_time, llm_ans, llm_time, usage, None, stage_metadata
+
+
+async def admitted_answer_query(query: str, current_config: dict, asked_from: str):
+    """
+    Runs the search pipeline in a worker thread once admission control admits it.
+    Args:
+        query (str): The query string.
+        current_config (dict): The current configuration.
+        asked_from (str): The client, whose requests are queued together.
+    Returns:
+        tuple: The result of `answer_query`.
+    Raises:
+        AdmissionRejected: If the request is not admitted.
+    """
+    async with search_admission.slot(asked_from):
+        return await asyncio.to_thread(answer_query, query, current_config)
+
+
+async def search_pipeline(query: str, asked_from: str, current_config: dict, endpoint: str) -> dict:
+    """
+    Runs the search pipeline for a question, coalesced with identical questions in flight, and builds its result.
+    Args:
+        query (str): The query string.
+        asked_from (str): The client.
+        current_config (dict): The current configuration.
+        endpoint (str): Labels the metrics.
+    Returns:
+        dict: The result, as returned by /search and saved as the interaction.
+    Raises:
+        AdmissionRejected: If the request is not admitted.
+    """
+    conversation_id = str(uuid.uuid4())
+    config_version = current_config["version"]
+    # Concurrent identical questions under the same configuration share one pipeline execution, and only
+    # that execution is subject to admission control
+    flight_key = (normalize_query(query), config_version)
+    (top_k_documents, retrieval_time, llm_ans, llm_time, usage, degraded_reason, stage_metadata), coalesced = \
+        await search_flights.run(flight_key, admitted_answer_query, query, current_config, asked_from)
+    if coalesced:
+        metrics.COALESCED_REQUESTS.labels(endpoint).inc()
+    docs = [
+        {
+            "id": item["doc_id"],
+            "title": item["title"],
+            "link": item["link"],
+            "content": item["content"],
+        } for item in top_k_documents
+    ]
+    result = {
+        "conversation_id": conversation_id,
+        "interaction_type": "search",
+        "llm_result": llm_ans,
+        "degraded": degraded_reason is not None,
+        "docs": docs,
+        "config_version": config_version,
+        "code_version": code_version,
+        "question": query,
+        "asked_from": asked_from,
+        "metadata": {
+            "llm_model": usage["model"],
+            "llm_time": llm_time,
+            "retrieval_time": retrieval_time,
+            "tokens": usage["tokens"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "cached_tokens": usage["cached_tokens"],
+            "context_docs": usage["context_docs"],
+            "context_tokens_saved": usage.get("context_tokens_saved", 0),
+            "coalesced": coalesced,
+            **stage_metadata
+        }
+    }
+    if degraded_reason is not None:
+        result["metadata"]["degraded_reason"] = degraded_reason
+    trace_id = current_trace_id()
+    if trace_id is not None:
+        result["metadata"]["trace_id"] = trace_id
+    return result
+
+
 @app.post("/search")
+@traced("search")
 async def search(params: SearchQuery):
     """
     Perform a search query.
@@ -122,44 +428,209 @@ async def search(params: SearchQuery):
     Returns:
         dict: Result of the search operation.
     """
+    before_request = time.perf_counter()
+    current_config = {}
     try:
-        conversation_id = str(uuid.uuid4())
-        current_config = configs.get_config()
-        answer = (engine.answer_query(params.query, int(current_config["num_of_pages"]), current_config["model"]))
-        llm_ans = answer[1]
-        config_version = current_config["version"]
-        docs = [
-            {
-                "id": item["doc_id"],
-                "title": item["title"],
-                "link": item["link"],
-                "content": item["content"],
-            } for item in answer[0]
-        ]
-        result = {
-            "conversation_id": conversation_id,
-            "interaction_type": "search",
-            "llm_result": llm_ans,
-            "docs": docs,
-            "config_version": config_version,
-            "code_version": code_version,
-            "question": params.query,
-            "asked_from": params.asked_from,
-            "metadata": {
-                "llm_model": answer[2]["llm_model"],
-                "llm_time": answer[2]["llm_time"],
-                "retrieval_time": answer[2]["retrieval_time"],
-                "tokens": answer[2]["tokens"]
-            }
-        }
-        interactions_model.save_interaction(result)
+        with tracer.start_as_current_span("get_config"), metrics.CONFIG_FETCH_LATENCY.labels("search").time():
+            current_config = await asyncio.to_thread(configs.get_config)
+        result = await search_pipeline(params.query, params.asked_from, current_config, "search")
+        with tracer.start_as_current_span("save_interaction"):
+            interactions_model.save_interaction(result, "search")
 
         logging.debug(f"Search performed with query: {params.query}")
-        logging.debug(f"Generated conversation_id: {conversation_id}")
-
-        return result
+        logging.debug(f"Generated conversation_id: {result['conversation_id']}")
+
+        with tracer.start_as_current_span("serialize_response"):
+            return serialize("search", {**result, "docs": select_fields(result["docs"], params.fields)})
+    except AdmissionRejected as e:
+        logging.warning(f"Search rejected: {e}")
+        return ORJSONResponse(status_code=e.status_code, content={"detail": str(e)},
+                              headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logging.error(f"Error during search: {e}")
+        metrics.ERRORS.labels("search", current_config.get("model", "unknown"),
+                              current_config.get("version", "unknown")).inc()
+    finally:
+        metrics.REQUEST_LATENCY.labels("search").observe(time.perf_counter() - before_request)
+
+
+async def search_batch_line(line_number: int, line: str, current_config: dict, save_interactions: bool) -> dict:
+    """
+    Answers one question of a batch. A question that isn't admitted waits for the Retry-After and is resubmitted,
+    so a batch yields to interactive searches instead of failing.
+    Args:
+        line_number (int): The question's line in the batch, from 1.
+        line (str): The question: a JSON object with `query`, and optionally `asked_from` and an `id` that is
+            returned with its result.
+        current_config (dict): The configuration of the batch.
+        save_interactions (bool): Whether to save the interaction.
+    Returns:
+        dict: The search result with the `line` and `id`, or the `line` and the `error`.
+    """
+    try:
+        question = json.loads(line)
+        query, asked_from = question["query"], question.get("asked_from", "batch")
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return {"line": line_number, "error": f"Invalid question: {e!r}"}
+    echo = {"line": line_number, "id": question["id"]} if "id" in question else {"line": line_number}
+    try:
+        while True:
+            try:
+                result = await search_pipeline(query, asked_from, current_config, "search_batch")
+                break
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after)
+        if save_interactions:
+            interactions_model.save_interaction(result, "search_batch")
+        return {**echo, **result}
+    except Exception as e:
+        logging.error(f"Error during batch search of line {line_number}: {e}")
+        metrics.ERRORS.labels("search_batch", current_config.get("model", "unknown"),
+                              current_config.get("version", "unknown")).inc()
+        return {**echo, "question": query, "error": str(e)}
+
+
+async def stream_search_batch(lines: list[str], current_config: dict, concurrency: int, save_interactions: bool,
+                              fields: list = None):
+    """
+    Answers the questions with `concurrency` workers and yields each result as an NDJSON line as soon as it's ready,
+    so results come in completion order, not input order. The returned documents keep only the requested fields.
+    """
+    results = asyncio.Queue()
+    numbered_lines = iter(enumerate(lines, start=1))
+
+    async def worker():
+        # The workers share the iterator, each taking the next question when it's done with its last one
+        for line_number, line in numbered_lines:
+            if line.strip():
+                await results.put(await search_batch_line(line_number, line, current_config, save_interactions))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    asyncio.gather(*workers).add_done_callback(lambda _: results.put_nowait(None))
+    try:
+        while (result := await results.get()) is not None:
+            if "docs" in result:
+                result["docs"] = select_fields(result["docs"], fields)
+            yield orjson.dumps(result) + b"\n"
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+@app.post("/search/batch")
+@traced("search_batch")
+async def search_batch(request: Request,
+                       concurrency: int = Query(config.BATCH_SEARCH_CONCURRENCY, ge=1,
+                                                le=config.BATCH_SEARCH_MAX_CONCURRENCY),
+                       save_interactions: bool = True, fields: Optional[List[DocField]] = Query(None)):
+    """
+    Runs a set of questions through the search pipeline, for offline question sets.
+    The body is JSONL, a question per line: `{"query": "...", "asked_from": "...", "id": ...}`, only `query`
+    required. All questions are answered under the configuration current when the batch starts.
+    Args:
+        request (Request): The request, whose body has the questions.
+        concurrency (int): The questions answered at once.
+        save_interactions (bool): Whether to save an interaction per question.
+        fields (List[str]): The fields of the returned documents, all of them if not set.
+    Returns:
+        StreamingResponse: An NDJSON line per question, in completion order, each with its input `line`.
+    """
+    lines = (await request.body()).decode("utf-8").splitlines()
+    current_config = await asyncio.to_thread(configs.get_config)
+    logging.info(f"Batch search of {len(lines)} lines, concurrency {concurrency}")
+    return StreamingResponse(stream_search_batch(lines, current_config, concurrency, save_interactions, fields),
+                             media_type="application/x-ndjson")
+
+
+def retrieved_docs(documents: list[dict]) -> list[dict]:
+    return [
+        {
+            "id": item["doc_id"],
+            "title": item["title"],
+            "link": item["link"],
+            "content": item["content"],
+            "score": item["score"],
+        } for item in documents
+    ]
+
+
+async def retrieve_only(endpoint: str, queries: list[str], top_k: Optional[int]):
+    """
+    Runs only the retrieval stage for the queries, without the LLM and without saving an interaction.
+    Args:
+        endpoint (str): Labels the metrics.
+        queries (list[str]): The queries.
+        top_k (int, optional): The number of documents per query, the configuration's `num_of_pages` if None.
+    Returns:
+        tuple: The result of each query, with its question and scored docs, and the response metadata.
+    """
+    if top_k is None:
+        current_config = await asyncio.to_thread(configs.get_config)
+        top_k = int(current_config["num_of_pages"])
+    before_retrieval = time.perf_counter()
+    with tracer.start_as_current_span("retrieval"):
+        results, timings = await asyncio.to_thread(retrieval.retrieve, engine, queries, top_k)
+    retrieval_time = round(time.perf_counter() - before_retrieval, 4)
+    metrics.RETRIEVAL_LATENCY.labels(endpoint).observe(retrieval_time)
+    results = [dict(result, question=query, docs=retrieved_docs(result["docs"]))
+               for query, result in zip(queries, results)]
+    return results, {"top_k": top_k, "retrieval_time": retrieval_time, **timings}
+
+
+def retrieve_failed(endpoint: str, error: Exception) -> ORJSONResponse:
+    logging.error(f"Error during {endpoint}: {error}")
+    metrics.ERRORS.labels(endpoint, "none", "unknown").inc()
+    status_code = HTTPStatus.SERVICE_UNAVAILABLE if isinstance(error, circuit_breaker.CircuitOpenError) \
+        else getattr(error, "status_code", HTTPStatus.INTERNAL_SERVER_ERROR)
+    return ORJSONResponse(status_code=status_code, content={"detail": str(error)})
+
+
+@app.post("/retrieve")
+@traced("retrieve")
+async def retrieve(params: RetrieveQuery):
+    """
+    Retrieve the top documents for a query with their scores, without asking the LLM or saving an interaction.
+    Args:
+        params (RetrieveQuery): The query and the number of documents.
+    Returns:
+        dict: The question, the scored docs and the retrieval timings.
+    """
+    before_request = time.perf_counter()
+    try:
+        (result,), metadata = await retrieve_only("retrieve", [params.query], params.top_k)
+        if "error" in result:
+            return ORJSONResponse(status_code=HTTPStatus.BAD_GATEWAY, content={"detail": result["error"]})
+        return serialize("retrieve", {"question": params.query, "docs": select_fields(result["docs"], params.fields),
+                                      "metadata": metadata})
+    except Exception as e:
+        return retrieve_failed("retrieve", e)
+    finally:
+        metrics.REQUEST_LATENCY.labels("retrieve").observe(time.perf_counter() - before_request)
+
+
+@app.post("/retrieve/batch")
+@traced("retrieve_batch")
+async def retrieve_batch(params: RetrieveBatchQuery):
+    """
+    Retrieve the top documents of many queries at once: the queries are embedded in one batch and searched in one
+    Elasticsearch msearch.
+    Args:
+        params (RetrieveBatchQuery): The queries and the number of documents per query.
+    Returns:
+        dict: A result per query, in order, with its question, its scored docs and, if its search failed, its error,
+        and the retrieval timings of the batch.
+    """
+    before_request = time.perf_counter()
+    try:
+        results, metadata = await retrieve_only("retrieve_batch", params.queries, params.top_k)
+        for result in results:
+            result["docs"] = select_fields(result["docs"], params.fields)
+        return serialize("retrieve_batch", {"results": results, "metadata": metadata})
+    except Exception as e:
+        return retrieve_failed("retrieve_batch", e)
+    finally:
+        metrics.REQUEST_LATENCY.labels("retrieve_batch").observe(time.perf_counter() - before_request)
+
 
 @app.get("/initialize_elastic_from_json")
 async def initialize_elastic_from_json():
@@ -172,6 +643,7 @@ async def initialize_elastic_from_json():
     try:
         documents = convert_kolzchut_paragraphs_corpus_to_json(config.PATH_TO_ES_INITIAL_VALUES)
         updater_service.copy_to_indices(documents)
+        retrieval_cache.invalidate_all()
         return Response(status_code=HTTPStatus.CREATED)
 
     except Exception as e:
@@ -213,7 +685,9 @@ async def operate_docs(request: DocumentRequest):
         return Response(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, content="All documents must have the same doc_id")
 
     delete_existing = operation == "update"
-    return Response(status_code=create_or_update_doc(request.documents, delete_existing, engine.update_docs))
+    status_code = create_or_update_doc(request.documents, delete_existing, engine.update_docs)
+    retrieval_cache.invalidate_docs(doc_ids)
+    return Response(status_code=status_code)
 
 
 @app.delete("/delete_doc")
@@ -236,6 +710,7 @@ async def delete_doc(doc_id: str, obj_id: str):
 
         is_deleted = updater_service.remove_nth_doc(doc_id, n)
         if is_deleted:
+            retrieval_cache.invalidate_docs([doc_id])
             return Response(status_code=HTTPStatus.OK)
         else:
             return Response(status_code=HTTPStatus.NOT_FOUND)
@@ -262,7 +737,7 @@ async def get_doc(doc_id: str):
         return Response(status_code=status_code)
 
 
-app.mount("/", StaticFiles(directory=config.STATIC_DIR, html=True), name="static")
+app.mount("/", CachedStaticFiles(directory=config.STATIC_DIR, html=True), name="static")
 
 if __name__ == "__main__":
     uvicorn.run(app, host=config.HOST, port=int(config.PORT))
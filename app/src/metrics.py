@@ -0,0 +1,85 @@
+import os
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, \
+    generate_latest, multiprocess
+
+# When running several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all of them.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram("ragbot_request_seconds", "Total request latency",
+                            ["endpoint"], buckets=LLM_BUCKETS)
+RETRIEVAL_LATENCY = Histogram("ragbot_retrieval_seconds", "Retrieval stage latency",
+                              ["endpoint"], buckets=FAST_BUCKETS)
+RERANK_LATENCY = Histogram("ragbot_rerank_seconds", "Reranking stage latency",
+                           ["endpoint"], buckets=FAST_BUCKETS)
+RERANK_FALLBACKS = Counter("ragbot_rerank_fallbacks", "Questions kept in retrieval order instead of reranked",
+                           ["reason"])
+ADAPTIVE_PAGES = Histogram("ragbot_adaptive_pages", "Documents per question chosen by the adaptive top k",
+                           buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20))
+LLM_LATENCY = Histogram("ragbot_llm_seconds", "LLM stage latency",
+                        ["endpoint", "model"], buckets=LLM_BUCKETS)
+CONFIG_FETCH_LATENCY = Histogram("ragbot_config_fetch_seconds", "Latency of fetching the saved configuration",
+                                 ["endpoint"], buckets=FAST_BUCKETS)
+INTERACTION_FLUSH_LATENCY = Histogram("ragbot_interaction_flush_seconds",
+                                      "Latency of writing an interaction to Elasticsearch",
+                                      ["interaction_type"], buckets=FAST_BUCKETS)
+TOKENS = Counter("ragbot_llm_tokens", "Completion tokens generated by the LLM",
+                 ["endpoint", "model", "config_version"])
+PROMPT_TOKENS = Counter("ragbot_llm_prompt_tokens", "Prompt tokens sent to the LLM",
+                        ["endpoint", "model", "config_version"])
+CACHED_PROMPT_TOKENS = Counter("ragbot_llm_cached_prompt_tokens", "Prompt tokens served from the provider's prompt cache",
+                               ["endpoint", "model", "config_version"])
+CONTEXT_TOKENS_SAVED = Counter("ragbot_llm_context_tokens_saved",
+                               "Prompt tokens saved by dropping duplicate documents and merging paragraphs",
+                               ["endpoint", "model", "config_version"])
+LLM_RETRIES = Counter("ragbot_llm_retries", "LLM requests retried after a transient failure",
+                      ["model", "reason"])
+LLM_HEDGES = Counter("ragbot_llm_hedges", "Hedged LLM requests, by the request whose response was used",
+                     ["model", "winner"])
+LLM_ROUTED = Counter("ragbot_llm_routed", "LLM calls by backend and outcome",
+                     ["backend", "outcome"])
+DEGRADED_RESPONSES = Counter("ragbot_degraded_responses", "Responses with the retrieved documents but no LLM answer",
+                             ["endpoint", "reason"])
+COALESCED_REQUESTS = Counter("ragbot_coalesced_requests", "Requests answered by an identical request in flight",
+                             ["endpoint"])
+ERRORS = Counter("ragbot_errors", "Requests that failed",
+                 ["endpoint", "model", "config_version"])
+ADMISSION_WAIT = Histogram("ragbot_admission_wait_seconds", "Time requests waited for admission",
+                           ["endpoint"], buckets=FAST_BUCKETS)
+ADMISSION_REJECTIONS = Counter("ragbot_admission_rejections", "Requests rejected by admission control",
+                               ["endpoint", "reason"])
+ADMISSION_QUEUE_DEPTH = Gauge("ragbot_admission_queue_depth", "Requests waiting for admission",
+                              ["endpoint"], multiprocess_mode="livesum")
+CIRCUIT_STATE = Gauge("ragbot_circuit_state", "State of a dependency's circuit: 0 closed, 1 half open, 2 open",
+                      ["dependency"], multiprocess_mode="livemax")
+CIRCUIT_TRANSITIONS = Counter("ragbot_circuit_transitions", "Circuit state changes",
+                              ["dependency", "state"])
+CIRCUIT_REJECTIONS = Counter("ragbot_circuit_rejections", "Calls failed fast by an open circuit",
+                             ["dependency"])
+SERIALIZATION_LATENCY = Histogram("ragbot_serialization_seconds", "Time serializing a response to JSON",
+                                  ["endpoint"], buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05))
+RESPONSE_BYTES = Histogram("ragbot_response_bytes", "Size of a serialized response, before compression",
+                           ["endpoint"], buckets=BYTES_BUCKETS)
+WIRE_BYTES = Histogram("ragbot_response_wire_bytes", "Size of a response as sent, by content encoding",
+                       ["endpoint", "encoding"], buckets=BYTES_BUCKETS)
+INTERACTION_INDEX_MAINTENANCE = Counter("ragbot_interaction_index_maintenance",
+                                        "Weekly conversation indices compacted or deleted", ["action"])
+INTERACTION_QUEUE_DEPTH = Gauge("ragbot_interaction_queue_depth", "Interactions waiting to be written",
+                                ["endpoint"], multiprocess_mode="livesum")
+
+
+def render():
+    """
+    Renders all metrics in the Prometheus text format.
+    Returns:
+        tuple: The payload and its content type.
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,101 @@
+import logging
+import time
+from webiks_hebrew_ragbot.document import document_definition_factory
+import metrics
+from config import RERANKER_BATCH_SIZE, RERANKER_BUDGET_SECS, RERANKER_CANDIDATES, RERANKER_MAX_LENGTH, \
+    RERANKER_MODEL
+from gpt_client import LLM_READY_SUFFIX
+
+definitions = document_definition_factory()
+
+
+def load_reranker_model(model_name: str = RERANKER_MODEL):
+    """
+    Imports sentence-transformers and loads the cross-encoder, on the CPU.
+    Args:
+        model_name (str, optional): A local path or a Hugging Face model name. Default is `RERANKER_MODEL`.
+    Returns:
+        CrossEncoder: The cross-encoder.
+    """
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name, max_length=RERANKER_MAX_LENGTH, device="cpu")
+
+
+class Reranker:
+    """
+       Rescores the retrieved candidates of a question with a cross-encoder, which reads the question and each
+       paragraph together, and keeps the best few for the LLM, so fewer documents reach the prompt for the same
+       quality.
+       The candidates are scored in batches within a time budget per question: if the budget runs out before every
+       candidate is scored, the candidates are kept in their retrieval order.
+       Attributes:
+           model (CrossEncoder): The cross-encoder.
+           candidates (int): The documents retrieved for reranking.
+           budget (float): The time budget of reranking a question, in seconds.
+           batch_size (int): The candidates scored at once; the budget is checked between batches.
+       Methods:
+           rerank(query, documents, top_k): Returns the top k documents by the cross-encoder's score.
+       """
+    def __init__(self, model, candidates: int = RERANKER_CANDIDATES, budget: float = RERANKER_BUDGET_SECS,
+                 batch_size: int = RERANKER_BATCH_SIZE):
+        self.model = model
+        self.candidates = candidates
+        self.budget = budget
+        self.batch_size = batch_size
+
+
+    def text(self, doc: dict) -> str:
+        field = definitions.field_for_llm
+        llm_text = doc.get(field + LLM_READY_SUFFIX)
+        return llm_text if llm_text is not None else doc[field]
+
+
+    def rerank(self, query: str, documents: list[dict], top_k: int) -> tuple[list, float, bool]:
+        """
+        Scores the documents against the query and returns the top k.
+        Args:
+            query (str): The query string.
+            documents (list[dict]): The retrieved candidates, by retrieval rank.
+            top_k (int): The number of documents to return.
+        Returns:
+            tuple: The top k documents, the reranking time, and whether they were reranked - False if the budget
+            ran out or the cross-encoder failed, in which case they are the top k by retrieval rank.
+        """
+        before_rerank = time.perf_counter()
+        deadline = before_rerank + self.budget
+        pairs = [(query, self.text(doc)) for doc in documents]
+        scores = []
+        fallback_reason = None
+        try:
+            for start in range(0, len(pairs), self.batch_size):
+                if time.perf_counter() >= deadline:
+                    fallback_reason = "budget_exceeded"
+                    break
+                scores.extend(self.model.predict(pairs[start:start + self.batch_size], batch_size=self.batch_size,
+                                                 show_progress_bar=False))
+        except Exception as e:
+            logging.error(f"Reranking failed, keeping the retrieval order: {e}")
+            fallback_reason = "error"
+        rerank_time = round(time.perf_counter() - before_rerank, 4)
+        metrics.RERANK_LATENCY.labels("search").observe(rerank_time)
+        if fallback_reason is not None:
+            metrics.RERANK_FALLBACKS.labels(fallback_reason).inc()
+            return documents[:top_k], rerank_time, False
+        ranked = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        return [documents[i] for i in ranked[:top_k]], rerank_time, True
+
+
+reranker = None
+
+
+def factory():
+    """
+    Factory function to create and return the singleton reranker, loading its cross-encoder.
+    Returns:
+        Reranker: The reranker, or None if `RERANKER_MODEL` is not set.
+    """
+    global reranker
+    if reranker is None and RERANKER_MODEL:
+        reranker = Reranker(load_reranker_model())
+    return reranker
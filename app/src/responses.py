@@ -0,0 +1,111 @@
+import logging
+import time
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+import metrics
+from config import COMPRESSION_LEVEL, COMPRESSION_MINIMUM_SIZE
+
+# The fields of a returned document
+DOC_FIELDS = ("id", "title", "link", "content", "score")
+# Responses of other paths, the front-end's static files, are measured together
+API_PATHS = ("/search", "/search/batch", "/retrieve", "/retrieve/batch", "/get_config", "/get_doc")
+# Streamed responses, whose lines must reach the client as they're produced: a compressor would hold them back
+UNCOMPRESSED_PATHS = ("/search/batch",)
+
+
+def select_fields(docs: list[dict], fields) -> list[dict]:
+    """
+    Keeps only the requested fields of the returned documents, e.g. everything but the paragraph `content`.
+    Args:
+        docs (list[dict]): The returned documents.
+        fields (list[str]): The fields to keep, None keeps all of them.
+    Returns:
+        list[dict]: The documents with the requested fields.
+    """
+    if fields is None:
+        return docs
+    return [{field: doc[field] for field in fields if field in doc} for doc in docs]
+
+
+def serialize(endpoint: str, content, status_code: int = 200, headers: dict = None) -> ORJSONResponse:
+    """
+    Serializes a response with orjson, measuring the serialization time and the uncompressed size.
+    Args:
+        endpoint (str): Labels the metrics.
+        content: The response content.
+        status_code (int, optional): The status code. Default is 200.
+        headers (dict, optional): Response headers.
+    Returns:
+        ORJSONResponse: The response.
+    """
+    before_serialize = time.perf_counter()
+    response = ORJSONResponse(content=content, status_code=status_code, headers=headers)
+    metrics.SERIALIZATION_LATENCY.labels(endpoint).observe(time.perf_counter() - before_serialize)
+    metrics.RESPONSE_BYTES.labels(endpoint).observe(len(response.body))
+    return response
+
+
+class WireBytesMiddleware:
+    """
+       Measures the bytes of the API responses as sent, after compression, by content encoding.
+       Attributes:
+           app (ASGIApp): The wrapped app.
+       """
+    def __init__(self, app):
+        self.app = app
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in API_PATHS:
+            await self.app(scope, receive, send)
+            return
+        encoding = "identity"
+        sent = 0
+
+        async def measuring_send(message):
+            nonlocal encoding, sent
+            if message["type"] == "http.response.start":
+                encoding = dict(message.get("headers", [])).get(b"content-encoding", b"identity").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    metrics.WIRE_BYTES.labels(scope["path"], encoding).observe(sent)
+            await send(message)
+
+        await self.app(scope, receive, measuring_send)
+
+
+class CompressionMiddleware:
+    """
+       Compresses responses with brotli for clients that accept it, if brotli-asgi is installed, and with gzip
+       otherwise, except those of `UNCOMPRESSED_PATHS`: the compressors buffer a streamed response until it ends.
+       Attributes:
+           app (ASGIApp): The wrapped app.
+           compressed_app (ASGIApp): The wrapped app behind the compressor.
+       """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, compresslevel: int = COMPRESSION_LEVEL):
+        self.app = app
+        try:
+            from brotli_asgi import BrotliMiddleware
+            self.compressed_app = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        except ImportError:
+            logging.info("brotli-asgi is not installed, responses are compressed with gzip only")
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed_app(scope, receive, send)
+
+
+def add_compression(app):
+    """
+    Compresses responses of at least `COMPRESSION_MINIMUM_SIZE` bytes, except the streamed ones. The bytes sent are
+    measured after compression.
+    Args:
+        app (FastAPI): The app.
+    """
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(WireBytesMiddleware)
@@ -0,0 +1,136 @@
+import logging
+import time
+import numpy as np
+from webiks_hebrew_ragbot.document import document_definition_factory
+from webiks_hebrew_ragbot.elastic_model import EMBEDDING_INDEX
+import circuit_breaker
+
+document_definition = document_definition_factory()
+# Hits fetched per query before the paragraphs of the same document are collapsed, as in the engine's search
+SEARCH_SIZE = 50
+
+
+def vectors_field() -> str:
+    return f"{document_definition.field_to_embed}_{document_definition.model_name}_vectors"
+
+
+def knn_search(query_vector: list[float], size: int = SEARCH_SIZE) -> dict:
+    """
+    Builds the engine's cosine similarity search for a query vector, without returning the paragraphs' vectors.
+    Args:
+        query_vector (list[float]): The embedded query.
+        size (int, optional): The number of hits. Default is `SEARCH_SIZE`.
+    Returns:
+        dict: The search body.
+    """
+    field = vectors_field()
+    return {
+        "size": size,
+        "_source": {"excludes": [field]},
+        "query": {
+            "script_score": {
+                "query": {"exists": {"field": field}},
+                "script": {
+                    "source": f"cosineSimilarity(params.query_vector, '{field}') + 1.0",
+                    "params": {"query_vector": query_vector},
+                },
+            }
+        },
+    }
+
+
+def top_documents(hits: list[dict], top_k: int) -> list[dict]:
+    """
+    Keeps the best scoring paragraph of each document, as the engine does, up to top_k documents.
+    Args:
+        hits (list[dict]): The search hits, best first.
+        top_k (int): The number of documents to return.
+    Returns:
+        list[dict]: The documents, each with its `score`.
+    """
+    documents = []
+    doc_ids = set()
+    for hit in hits:
+        doc_id = hit["_source"][document_definition.identifier]
+        if doc_id in doc_ids:
+            continue
+        documents.append(dict(hit["_source"], score=hit["_score"]))
+        doc_ids.add(doc_id)
+        if len(documents) >= top_k:
+            break
+    return documents
+
+
+def retrieve(engine, queries: list[str], top_k: int) -> tuple[list, dict]:
+    """
+    Runs only the retrieval stage of the engine for many queries: the queries are embedded in one batch and
+    searched in one Elasticsearch msearch, through the Elasticsearch searches circuit. The retrieval cache is
+    bypassed, so the scores and timings are those of the actual retrieval.
+    Args:
+        engine (Engine): The engine, whose retrieval model and Elasticsearch client are used.
+        queries (list[str]): The queries.
+        top_k (int): The number of documents to retrieve per query.
+    Returns:
+        tuple: A result per query, in order, with its `docs` and, if its search failed, its `error`, and the
+        timings of the stages: `embedding_time` and `search_time`.
+    Raises:
+        CircuitOpenError: If the Elasticsearch searches circuit is open.
+    """
+    before_embedding = time.perf_counter()
+    vectors = np.asarray(engine.retrieval_model.encode(queries), dtype=float).reshape(len(queries), -1).tolist()
+    embedding_time = round(time.perf_counter() - before_embedding, 4)
+
+    searches = []
+    for vector in vectors:
+        searches += [{"index": EMBEDDING_INDEX + "*"}, knn_search(vector)]
+    before_search = time.perf_counter()
+    responses = circuit_breaker.factory("es_search").call(
+        engine.elastic_model.es_client.msearch, searches=searches)["responses"]
+    search_time = round(time.perf_counter() - before_search, 4)
+
+    results = []
+    for query, response in zip(queries, responses):
+        if "error" in response:
+            logging.error(f"Retrieval failed for query {query}: {response['error']}")
+            results.append({"docs": [], "error": str(response["error"])})
+        else:
+            results.append({"docs": top_documents(response["hits"]["hits"], top_k)})
+    return results, {"embedding_time": embedding_time, "search_time": search_time}
+
+
+def search_documents(engine, query: str, top_k: int) -> list[dict]:
+    """
+    Retrieves the top k documents of a query with their scores, like the engine's `search_documents`.
+    Args:
+        engine (Engine): The engine.
+        query (str): The query string.
+        top_k (int): The number of documents to retrieve.
+    Returns:
+        list[dict]: The documents, each with its `score`.
+    Raises:
+        RuntimeError: If the search failed.
+    """
+    (result,), _ = retrieve(engine, [query], top_k)
+    if "error" in result:
+        raise RuntimeError(f"The search failed: {result['error']}")
+    return result["docs"]
+
+
+def adaptive_top_k(documents: list[dict], min_k: int, max_k: int, margin: float) -> int:
+    """
+    Chooses how many documents of a question go to the LLM from their scores: the documents scoring within `margin`
+    of the best one, between min_k and max_k. A question with one clearly relevant document gets min_k documents, and
+    one whose documents score alike gets up to max_k.
+    Args:
+        documents (list[dict]): The retrieved documents with their `score`, best first.
+        min_k (int): The fewest documents.
+        max_k (int): The most documents.
+        margin (float): How far below the best score a document may score and still be chosen.
+    Returns:
+        int: The number of documents.
+    """
+    if not documents:
+        return min_k
+    best = documents[0]["score"]
+    close = sum(1 for doc in documents[:max_k] if doc["score"] >= best - margin)
+    return max(min_k, min(max_k, close))
@@ -0,0 +1,262 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from cachetools import TTLCache
+from elasticsearch import NotFoundError
+from webiks_hebrew_ragbot.document import document_definition_factory
+import circuit_breaker
+from config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECS, RETRIEVAL_CACHE_INDEX, RETRIEVAL_CACHE_SYNC_SECS
+
+document_definition = document_definition_factory()
+# The id of the marker document, replaced in RETRIEVAL_CACHE_INDEX whenever a worker changes the corpus
+MARKER_ID = "corpus"
+# The paragraphs' embeddings are stored as <field>_<model>_vectors, the prompt and the response don't use them
+VECTORS_SUFFIX = "_vectors"
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query so that trivially different spellings of the same question share a cache entry.
+    Args:
+        query (str): The raw query string.
+    Returns:
+        str: The query with collapsed whitespace, case-folded.
+    """
+    return ' '.join(query.split()).casefold()
+
+
+def without_vectors(doc: dict) -> dict:
+    """
+    Drops the embedding fields of a retrieved document, which would otherwise take most of the cache's memory.
+    Args:
+        doc (dict): The document's source.
+    Returns:
+        dict: The document without its `_vectors` fields.
+    """
+    return {field: value for field, value in doc.items() if not field.endswith(VECTORS_SUFFIX)}
+
+
+class RetrievalCache:
+    """
+       An in-memory cache of retrieval results, keyed by (normalized query, number of pages, index generation,
+       variant), the variant telling apart the results of different search functions.
+       Every cached result is also indexed by the doc ids it contains, so a change to a document only evicts the
+       results in which that document appears. Rebuilding the whole corpus bumps the index generation instead.
+       Each worker has its own cache, so a worker that changes the corpus also replaces a marker document in
+       Elasticsearch. The other workers read the marker at most every `sync_period` seconds and bump their index
+       generation when it changed, so a change made through another worker is served stale for that long at most.
+       The TTL bounds staleness that invalidation can't see, such as a new document that would now rank into an
+       already cached result.
+       Attributes:
+           cache (TTLCache): The cached results.
+           keys_by_doc_id (dict): Maps a doc id to the cache keys of the results containing it.
+           generation (int): The current index generation.
+           invalidations (int): Number of document invalidations so far.
+           es_client (Elasticsearch): The client the marker is shared through, None until connected.
+           marker (str): The last marker this worker read or wrote.
+           sync_period (float): Seconds between reads of the marker.
+           lock (threading.Lock): Guards the cache and the doc id index.
+       Methods:
+           connect(es_client): Shares invalidations with the other workers through Elasticsearch.
+           sync(): Bumps the index generation if another worker changed the corpus.
+           search_documents(query, top_k, search_function, variant=""): Returns cached documents, retrieving them on a
+               miss.
+           put(key, docs): Caches retrieved documents.
+           invalidate_docs(doc_ids): Evicts every cached result that contains one of the doc ids.
+           invalidate_all(): Bumps the index generation and clears the cache.
+       """
+
+
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE, ttl: int = RETRIEVAL_CACHE_TTL_SECS,
+                 sync_period: float = RETRIEVAL_CACHE_SYNC_SECS):
+        """
+        Initializes the RetrievalCache instance.
+        Args:
+            max_size (int): Maximum number of cached results, 0 disables caching.
+            ttl (int): Time to live of a cached result, in seconds.
+            sync_period (float): Seconds between reads of the marker other workers replace when changing the corpus.
+        """
+        self.cache = TTLCache(maxsize=max_size, ttl=ttl)
+        self.keys_by_doc_id = {}
+        self.generation = 0
+        self.invalidations = 0
+        self.puts_since_prune = 0
+        self.es_client = None
+        self.marker = None
+        self.sync_period = sync_period
+        self.last_sync = 0.0
+        self.lock = threading.Lock()
+
+
+    def connect(self, es_client):
+        """
+        Shares invalidations with the other workers through a marker document in Elasticsearch.
+        Args:
+            es_client (Elasticsearch): The Elasticsearch client instance.
+        """
+        try:
+            self.marker = self.fetch_marker(es_client)
+        except Exception as e:
+            logging.warning(f"Reading the retrieval cache marker failed, it's read again on the next sync: {e}")
+        self.es_client = es_client
+        self.last_sync = time.monotonic()
+
+
+    @staticmethod
+    def fetch_marker(es_client):
+        try:
+            return es_client.get(index=RETRIEVAL_CACHE_INDEX, id=MARKER_ID)["_source"]["marker"]
+        except NotFoundError:
+            return None
+
+
+    def sync(self):
+        """
+        Reads the marker, at most every `sync_period` seconds, and bumps the index generation if another worker
+        replaced it. While Elasticsearch fails the cache goes on serving, bounded by the TTL.
+        """
+        with self.lock:
+            if self.es_client is None or time.monotonic() - self.last_sync < self.sync_period:
+                return
+            self.last_sync = time.monotonic()
+        try:
+            marker = circuit_breaker.factory("es_search").call(self.fetch_marker, self.es_client)
+        except Exception as e:
+            logging.warning(f"Reading the retrieval cache marker failed: {e}")
+            return
+        with self.lock:
+            if marker == self.marker:
+                return
+            self.marker = marker
+            self.clear()
+        logging.info(f"Retrieval cache cleared after a change by another worker, index generation {self.generation}")
+
+
+    def publish(self):
+        """
+        Replaces the marker, so the other workers drop the results this worker just invalidated.
+        """
+        if self.es_client is None:
+            return
+        marker = uuid.uuid4().hex
+        with self.lock:
+            self.marker = marker
+        try:
+            circuit_breaker.factory("es_write").call(
+                self.es_client.index, index=RETRIEVAL_CACHE_INDEX, id=MARKER_ID,
+                document={"marker": marker, "updated_at": datetime.now().isoformat()})
+        except Exception as e:
+            logging.warning(f"Replacing the retrieval cache marker failed, other workers expire their results: {e}")
+
+
+    def make_key(self, query: str, top_k: int, variant: str = "") -> tuple:
+        return normalize_query(query), int(top_k), self.generation, variant
+
+
+    def search_documents(self, query: str, top_k: int, search_function, variant: str = ""):
+        """
+        Returns the cached documents for the query, or retrieves and caches them on a miss.
+        A result is not cached if the corpus changed while it was being retrieved, since it may predate the change.
+        Retrieved documents are returned and cached without their embedding fields.
+        Args:
+            query (str): The query string.
+            top_k (int): The number of documents to retrieve.
+            search_function (callable): Retrieves documents on a miss, called as search_function(query, top_k).
+            variant (str, optional): Tells apart the results of different search functions, e.g. "scored".
+        Returns:
+            list[dict]: The top k documents.
+        """
+        self.sync()
+        with self.lock:
+            key = self.make_key(query, top_k, variant)
+            invalidations = self.invalidations
+            docs = self.cache.get(key)
+        if docs is not None:
+            logging.debug(f"Retrieval cache hit for query: {query}")
+            return list(docs)
+
+        docs = [without_vectors(doc) for doc in search_function(query, top_k)]
+        with self.lock:
+            if self.cache.maxsize and key[2] == self.generation and invalidations == self.invalidations:
+                self.put(key, docs)
+        return docs
+
+
+    def put(self, key: tuple, docs: list[dict]):
+        """
+        Caches retrieved documents and indexes the result by their doc ids. Must be called with the lock held.
+        Args:
+            key (tuple): The cache key.
+            docs (list[dict]): The retrieved documents.
+        """
+        self.cache[key] = list(docs)
+        for doc in docs:
+            self.keys_by_doc_id.setdefault(str(doc[document_definition.identifier]), set()).add(key)
+        self.puts_since_prune += 1
+        if self.puts_since_prune >= self.cache.maxsize:
+            self.prune_doc_index()
+
+
+    def prune_doc_index(self):
+        """
+        Drops doc id index entries that point at results already evicted by the LRU or the TTL.
+        Must be called with the lock held.
+        """
+        live_keys = set(self.cache.keys())
+        self.keys_by_doc_id = {doc_id: keys & live_keys for doc_id, keys in self.keys_by_doc_id.items()
+                               if keys & live_keys}
+        self.puts_since_prune = 0
+
+
+    def invalidate_docs(self, doc_ids):
+        """
+        Evicts every cached result that contains one of the doc ids.
+        Args:
+            doc_ids (iterable): The ids of the documents that were created, updated or deleted.
+        """
+        doc_ids = list(doc_ids)
+        with self.lock:
+            self.invalidations += 1
+            evicted = 0
+            for doc_id in doc_ids:
+                for key in self.keys_by_doc_id.pop(str(doc_id), set()):
+                    if self.cache.pop(key, None) is not None:
+                        evicted += 1
+        self.publish()
+        logging.debug(f"Retrieval cache evicted {evicted} results for docs {doc_ids}")
+
+
+    def invalidate_all(self):
+        """
+        Bumps the index generation and clears the cache, used when the whole corpus is rebuilt.
+        """
+        with self.lock:
+            self.clear()
+        self.publish()
+        logging.info(f"Retrieval cache cleared, index generation {self.generation}")
+
+
+    def clear(self):
+        """
+        Bumps the index generation and clears the cache. Must be called with the lock held.
+        """
+        self.generation += 1
+        self.cache.clear()
+        self.keys_by_doc_id = {}
+
+
+singleton = None
+
+
+def factory():
+    """
+    Factory function to create and return a singleton instance of RetrievalCache.
+    Returns:
+        RetrievalCache: The singleton instance of RetrievalCache.
+    """
+    global singleton
+    if singleton is None:
+        singleton = RetrievalCache()
+    return singleton
@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime, timedelta
+import circuit_breaker
 from config import SAVED_CONFIGURATIONS, CONFIG_CACHE_PERIOD_SECS
 
 
@@ -17,6 +18,14 @@ seed_config = {
     "temperature": "0.5",
     "user_prompt": "ענה על השאלות בהתבסס על המידע שקיבלת.",
     "system_prompt": system_prompt_seed,
+    "max_prompt_tokens": "6000",
+    "max_tokens": "512",
+    "llm_deadline_secs": "20",
+    "adaptive_pages": "false",
+    "min_pages": "1",
+    "max_pages": "5",
+    "adaptive_pages_margin": "0.05",
+    "context_duplicate_threshold": "0.8",
     "version": 1
 }
 
@@ -36,7 +45,7 @@ class Configs:
            create_index(index_name=SAVED_CONFIGURATIONS):
                Creates an index in Elasticsearch if it does not exist.
            get_config():
-               Retrieves the latest configuration from Elasticsearch.
+               Retrieves the latest configuration from Elasticsearch, or the cached one while it fails.
            set_config(config=None):
                Sets a new configuration in Elasticsearch.
            organize_config(config: dict[str, str or int]):
@@ -74,9 +83,20 @@ class Configs:
     def get_config(self):
         """
            Retrieves the latest configuration from Elasticsearch.
+           While Elasticsearch fails, or its circuit is open, the last configuration retrieved is used.
            Returns:
                dict: The latest configuration.
            """
+        try:
+            return circuit_breaker.factory("es_search").call(self.fetch_config)
+        except Exception as e:
+            if not self.current_config:
+                raise
+            logging.warning(f"Using the cached configuration, fetching it failed: {e}")
+            return self.current_config
+
+
+    def fetch_config(self):
         if self.es_client.count(index=SAVED_CONFIGURATIONS)["count"] == 0:
             self.es_client.index(
                 index=SAVED_CONFIGURATIONS,
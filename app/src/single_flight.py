@@ -0,0 +1,40 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution: the first call runs the function, and calls
+    made while it is in flight wait for its result instead of running it again. Once the execution completes, the
+    next call runs it anew. Exceptions are shared like results.
+    A caller that is cancelled doesn't cancel the shared execution, which the other callers may still be awaiting.
+    Attributes:
+        in_flight (dict): Maps a key to the task of its execution in flight.
+    Methods:
+        run(key, function, *args): Runs the function, or joins the execution in flight for the key.
+    """
+    def __init__(self):
+        self.in_flight = {}
+
+
+    async def run(self, key, function, *args):
+        """
+        Runs the function, or joins the execution in flight for the key.
+        Args:
+            key (Hashable): Identifies calls that can share an execution.
+            function (callable): An async function.
+            *args: The function's arguments.
+        Returns:
+            tuple: The result and whether it was shared with an execution already in flight.
+        """
+        task = self.in_flight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(function(*args))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task), shared
+
+
+    def forget(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
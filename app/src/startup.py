@@ -0,0 +1,94 @@
+import importlib
+import logging
+import time
+from config import ES_STARTUP_TIMEOUT_SECS
+from tokenizer import count_tokens
+
+WARM_UP_QUERY = "מה הזכויות שלי?"
+
+startup_timings = {}
+
+
+def timed_phase(phase: str, function, *args):
+    """
+    Runs one startup phase and records how long it took.
+    Args:
+        phase (str): The name of the phase, used in the log and in startup_timings.
+        function (callable): The function to run.
+        *args: Arguments passed to the function.
+    Returns:
+        The function's return value.
+    """
+    before_phase = time.perf_counter()
+    result = function(*args)
+    startup_timings[phase] = round(time.perf_counter() - before_phase, 4)
+    logging.info(f"Startup phase {phase} took {startup_timings[phase]}s")
+    return result
+
+
+def wait_for_es(es_client, timeout: int = ES_STARTUP_TIMEOUT_SECS):
+    """
+    Blocks until Elasticsearch answers a ping, so a worker started before ES is up waits instead of crashing.
+    Args:
+        es_client (Elasticsearch): The Elasticsearch client instance.
+        timeout (int): How long to wait, in seconds.
+    Raises:
+        ConnectionError: If Elasticsearch is still unreachable after the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while True:
+        try:
+            if es_client.ping():
+                return
+        except Exception as e:
+            logging.debug(f"Elasticsearch ping failed: {e}")
+        if time.monotonic() >= deadline:
+            raise ConnectionError(f"Elasticsearch is unreachable after {timeout} seconds")
+        logging.info(f"Waiting for Elasticsearch, retrying in {delay}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 5)
+
+
+def load_retrieval_model():
+    """
+    Imports torch and sentence-transformers and loads the retrieval model.
+    The imports are deferred to here so importing the app stays cheap and the load can run alongside the ES setup.
+    Returns:
+        SentenceTransformer: The retrieval model, in eval mode on the engine's device.
+    """
+    engine_module = importlib.import_module("webiks_hebrew_ragbot.engine")
+    from sentence_transformers import SentenceTransformer
+    from webiks_hebrew_ragbot import config as ragbot_config
+    model_path = ragbot_config.MODEL_LOCATION + "/" + engine_module.definitions.model_name
+    return SentenceTransformer(model_path).to(engine_module.device)
+
+
+def create_engine(llms_client, es_client, retrieval_model):
+    """
+    Creates the engine around an already loaded retrieval model.
+    Args:
+        llms_client (LLMClient): The LLM client instance.
+        es_client (Elasticsearch): The Elasticsearch client instance.
+        retrieval_model (SentenceTransformer): The retrieval model.
+    Returns:
+        Engine: The engine instance.
+    """
+    engine_module = importlib.import_module("webiks_hebrew_ragbot.engine")
+    engine_module.engine = engine_module.Engine(llms_client=llms_client, es_client=es_client,
+                                                retrieval_model=retrieval_model)
+    return engine_module.engine
+
+
+def warm_up(engine):
+    """
+    Runs one encode pass so the first real query doesn't pay for lazy tokenizer and kernel initialisation, and loads
+    the LLM tokenizer the context packer counts tokens with.
+    Args:
+        engine (Engine): The engine instance.
+    """
+    try:
+        timed_phase("warm_up", engine.retrieval_model.encode, WARM_UP_QUERY)
+        timed_phase("warm_up_llm_tokenizer", count_tokens, WARM_UP_QUERY)
+    except Exception as e:
+        logging.error(f"Error during warm up: {e}")
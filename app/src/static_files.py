@@ -0,0 +1,23 @@
+import os
+from starlette.staticfiles import StaticFiles
+from config import STATIC_ASSETS_MAX_AGE
+
+# The directory of the front-end's content-hashed bundle, built by `python app/frontend/build.py`
+ASSETS_DIR = "assets"
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+       Serves the front-end with a cache policy: the content-hashed files under `assets/` change name whenever they
+       change, so browsers keep them for `STATIC_ASSETS_MAX_AGE` seconds without asking again, and everything else -
+       index.html, which points at the current bundle, and the icon - is revalidated with its ETag on every visit,
+       answered with 304 when unchanged.
+       """
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        relative_path = os.path.relpath(full_path, self.directory)
+        if relative_path.split(os.sep)[0] == ASSETS_DIR:
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_ASSETS_MAX_AGE}, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
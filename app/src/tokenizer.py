@@ -0,0 +1,79 @@
+import functools
+import logging
+import math
+from config import LLM_TOKENIZER_MODEL
+
+DEFAULT_ENCODING = "o200k_base"
+APPROXIMATE_CHARS_PER_TOKEN = 3
+# The encoding name of counts estimated from the text length
+APPROXIMATE_ENCODING = "approximate"
+
+
+@functools.cache
+def encoding_for_model(model: str):
+    """
+    Loads the tiktoken encoding of a model, or the default encoding for models tiktoken doesn't know.
+    tiktoken downloads encodings on first use, so where that fails (e.g. offline without TIKTOKEN_CACHE_DIR)
+    the failure is logged once and tokens are estimated.
+    Args:
+        model (str): The model name.
+    Returns:
+        tiktoken.Encoding or None: The encoding, or None if it could not be loaded.
+    """
+    try:
+        import tiktoken  # deferred, loading an encoding is only needed when counting tokens
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logging.warning(f"Could not load the tokenizer of {model}, token counts are estimated: {e}")
+        return None
+
+
+def encoding_name(model: str = LLM_TOKENIZER_MODEL) -> str:
+    """
+    Returns the name of the encoding a model's tokens are counted with, so stored counts can be matched to a model.
+    Args:
+        model (str, optional): The model name. Default is `LLM_TOKENIZER_MODEL`.
+    Returns:
+        str: The encoding name, e.g. o200k_base, or `APPROXIMATE_ENCODING` if the tokenizer is unavailable.
+    """
+    encoding = encoding_for_model(model)
+    return APPROXIMATE_ENCODING if encoding is None else encoding.name
+
+
+def count_tokens(text: str, model: str = LLM_TOKENIZER_MODEL) -> int:
+    """
+    Counts the tokens of a text with the model's tokenizer.
+    Args:
+        text (str): The text.
+        model (str, optional): The model name. Default is `LLM_TOKENIZER_MODEL`.
+    Returns:
+        int: The number of tokens, estimated from the text length if the tokenizer is unavailable.
+    """
+    encoding = encoding_for_model(model)
+    if encoding is None:
+        return math.ceil(len(text) / APPROXIMATE_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = LLM_TOKENIZER_MODEL) -> str:
+    """
+    Truncates a text to its first tokens.
+    Args:
+        text (str): The text.
+        max_tokens (int): The maximal number of tokens to keep.
+        model (str, optional): The model name. Default is `LLM_TOKENIZER_MODEL`.
+    Returns:
+        str: The truncated text, cut by the estimated characters per token if the tokenizer is unavailable.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = encoding_for_model(model)
+    if encoding is None:
+        return text[:max_tokens * APPROXIMATE_CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
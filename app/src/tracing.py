@@ -0,0 +1,88 @@
+import inspect
+import logging
+from functools import wraps
+from opentelemetry import trace
+from config import TRACING_EXPORTER, TRACING_FILE_PATH, TRACING_SAMPLE_RATE, TRACING_SERVICE_NAME
+
+tracer = trace.get_tracer("ragbot")
+
+
+def setup_tracing():
+    """
+    Set up the OpenTelemetry tracer provider based on the `TRACING_EXPORTER` environment variable:
+    "none" (default) keeps the no-op provider, "otlp" exports to a collector configured by the standard
+    OTEL_EXPORTER_OTLP_* variables, "file" appends one JSON span per line to `TRACING_FILE_PATH`, and "console"
+    prints spans to stdout. New traces are sampled at `TRACING_SAMPLE_RATE`.
+    Elasticsearch client calls are traced natively by elasticsearch-py once a provider is set.
+    """
+    if TRACING_EXPORTER == "none":
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        exporter = ConsoleSpanExporter(out=open(TRACING_FILE_PATH, "a", encoding="utf-8"),
+                                       formatter=lambda span: span.to_json(indent=None) + "\n")
+    elif TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        logging.error(f"Unknown tracing exporter {TRACING_EXPORTER}, tracing is disabled")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+                              sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATE)))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logging.info(f"Tracing enabled, exporter: {TRACING_EXPORTER}, sample rate: {TRACING_SAMPLE_RATE}")
+
+
+def current_trace_id():
+    """
+    Returns the id of the current trace, if it is sampled.
+    Returns:
+        str or None: The trace id as 32 hex characters, or None if there is no sampled trace.
+    """
+    span_context = trace.get_current_span().get_span_context()
+    if not span_context.is_valid or not span_context.trace_flags.sampled:
+        return None
+    return format(span_context.trace_id, "032x")
+
+
+def traced(name: str, function=None):
+    """
+    Wraps a function, sync or async, so each call runs in its own span. Without a function it returns a decorator.
+    Args:
+        name (str): The span name.
+        function (callable, optional): The function to wrap.
+    Returns:
+        callable: The wrapped function.
+    """
+    if function is None:
+        return lambda decorated: traced(name, decorated)
+    if inspect.iscoroutinefunction(function):
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with tracer.start_as_current_span(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def instrument_engine(engine):
+    """
+    Traces the stages of the engine's retrieval: embedding the query and the kNN search in Elasticsearch.
+    Args:
+        engine (Engine): The engine instance.
+    """
+    engine.retrieval_model.encode = traced("retrieval.embed", engine.retrieval_model.encode)
+    engine.elastic_model.search = traced("retrieval.knn_search", engine.elastic_model.search)
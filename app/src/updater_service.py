@@ -1,13 +1,15 @@
-from typing import List, Dict
+from typing import List, Dict, TYPE_CHECKING
 import logging
 import os
-from webiks_hebrew_ragbot.engine import Engine
 from elasticsearch import Elasticsearch
 from webiks_hebrew_ragbot.document import document_definition_factory
+from gpt_client import prepare_paragraphs_for_llm
 # Constants
 index_name = os.getenv("UPDATES_INDEX", "updates")
 UPDATES_DOC_ID = "1"  # Unique document ID to store update metadata
 document_definition =document_definition_factory()
+if TYPE_CHECKING:
+    from webiks_hebrew_ragbot.engine import Engine  # importing the engine loads torch
 
 
 class UpdaterService:
@@ -20,7 +22,7 @@ class UpdaterService:
         es_client (Elasticsearch): The Elasticsearch client instance.
         engine (Engine): The engine used to update document data.
     """
-    def __init__(self, es_client: Elasticsearch, engine: Engine):
+    def __init__(self, es_client: Elasticsearch, engine: "Engine"):
         """
         Initializes the UpdaterService.
 
@@ -162,7 +164,7 @@ class UpdaterService:
         documents (List of dicts): contains the documents you are going to insert the elastic
         """
         self.delete_indices(document_definition.identifier)
-        self.engine.create_paragraphs(documents)
+        self.engine.create_paragraphs(prepare_paragraphs_for_llm(documents))
 
 
     def delete_indices(self, indices_name: str):
@@ -221,7 +223,7 @@ def handle_update_exception( e: Exception, doc_id: str) -> dict:
 updater_service = None
 
 
-def updater_factory(es_client: Elasticsearch, engine: Engine) -> UpdaterService:
+def updater_factory(es_client: Elasticsearch, engine: "Engine") -> UpdaterService:
     """
     Factory function to create a singleton instance of UpdaterService.
 
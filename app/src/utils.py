@@ -1,7 +1,7 @@
 from typing import List, Dict
-import pandas as pd
 from http import HTTPStatus
 import logging
+from gpt_client import prepare_paragraphs_for_llm
 
 def convert_kolzchut_paragraphs_corpus_to_json(path: str) -> List[Dict]:
     """
@@ -14,6 +14,7 @@ def convert_kolzchut_paragraphs_corpus_to_json(path: str) -> List[Dict]:
     Returns:
         List[Dict]: List of dictionaries without the 'license' field.
     """
+    import pandas as pd  # deferred, only needed when seeding the corpus
     df = pd.read_json(path)
     if 'license' in df.columns:
         df = df.drop(columns=['license'])
@@ -23,7 +24,7 @@ def convert_kolzchut_paragraphs_corpus_to_json(path: str) -> List[Dict]:
 
 def create_or_update_doc(documents, delete_existing,update_docs_function):
     try:
-        documents_dicts = [doc.model_dump() for doc in documents]
+        documents_dicts = prepare_paragraphs_for_llm([doc.model_dump() for doc in documents])
 
         update_docs_function(documents_dicts, delete_existing)
         return HTTPStatus.CREATED
@@ -0,0 +1,109 @@
+"""
+Microbenchmarks of the Hebrew text-processing helpers on the request path: `clean_text` (single and batch),
+`parse_hebrew_text`, `GPTClient.create_body` and the serialisation of the /search response, over realistic Kol-Zchut
+paragraphs (short, long, HTML-heavy and mixed Hebrew/English).
+
+Runs with pytest-benchmark. Compare against the stored baselines, failing when the fastest run regresses by more
+than 25%:
+    python -m pytest benchmarks/bench_text_processing.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=min:25%
+Store a new baseline after an intended change:
+    python -m pytest benchmarks/bench_text_processing.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-save=text_processing
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import Mock
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app" / "src"
+os.environ.setdefault("IS_MOCK_GPT_CLIENT", "true")
+os.environ.setdefault("DOCUMENT_DEFINITION_CONFIG", str(APP_DIR / "doc-config.json"))
+sys.path.insert(0, str(APP_DIR))
+
+from gpt_client import GPTClient, clean_text, clean_texts, parse_hebrew_text
+from responses import serialize
+
+SHORT = "מי זכאי לדמי אבטלה? עובד שפוטר או התפטר בדין מפוטר, וצבר תקופת אכשרה של 12 חודשים לפחות."
+
+LONG = " ".join([
+    "דמי אבטלה הם תשלום חודשי שמשולם על ידי המוסד לביטוח לאומי למי שהיה עובד ופוטר, או התפטר בנסיבות",
+    "המזכות בדמי אבטלה, ונמצא ללא עבודה. כדי לקבל דמי אבטלה יש להירשם בשירות התעסוקה כמחפש עבודה",
+    "ולהגיש תביעה לביטוח הלאומי. גובה דמי האבטלה נקבע לפי השכר הממוצע ב-3 החודשים שקדמו להפסקת העבודה",
+    "(או ב-6 החודשים, אם הדבר מיטיב עם המובטל), ומספר ימי הזכאות נקבע לפי הגיל ומספר התלויים.",
+]) * 6
+
+HTML_HEAVY = (
+    '<div class="mw-parser-output"><h2><span class="mw-headline" id="מי_זכאי">מי זכאי?</span></h2>'
+    '<ul><li><b>עובדים שכירים</b> שפוטרו מעבודתם.</li><li>עובדים שהתפטרו בנסיבות המזכות '
+    '(<a href="/he/התפטרות_בדין_מפוטר" title="התפטרות בדין מפוטר">התפטרות בדין מפוטר</a>).</li>'
+    '<li>צעירים שסיימו <a href="/he/שירות_צבאי">שירות צבאי</a> או שירות לאומי.</li></ul>'
+    '<table class="wikitable"><tr><th>גיל</th><th>ימי זכאות</th></tr><tr><td>עד 25</td><td>50</td></tr>'
+    '<tr><td>25-28</td><td>67</td></tr><tr><td>28-35</td><td>100</td></tr><tr><td>35-45</td><td>138</td></tr>'
+    '<tr><td>45 ומעלה</td><td>175</td></tr></table><p>&nbsp;למידע נוסף ראו '
+    '<a href="https://www.btl.gov.il">אתר הביטוח הלאומי</a> &raquo;</p></div>'
+) * 3
+
+MIXED = (
+    "להגשת תביעה מקוונת יש להיכנס לאתר Bituach Leumi (www.btl.gov.il) ולבחור ב-\"Online Services\". "
+    "ניתן לצרף מסמכים בפורמט PDF או JPG, עד 5MB לקובץ. בעיות? התקשרו ל-*6050 או כתבו ל-info@btl.gov.il; "
+    "שעות המענה: 08:00-17:00. Note: the English form is available for new immigrants (עולים חדשים) only — "
+    "see Form BL/100 → section 3 ✓. הזכאות נבדקת לפי סעיף 160(א) לחוק. "
+) * 4
+
+PARAGRAPHS = {"short": SHORT, "long": LONG, "html_heavy": HTML_HEAVY, "mixed": MIXED}
+
+
+def make_docs(count=5):
+    kinds = list(PARAGRAPHS)
+    return [
+        {
+            "doc_id": i + 1,
+            "title": f"דמי אבטלה {i + 1}",
+            "link": f"https://www.kolzchut.org.il/he/{i + 1}",
+            "content": PARAGRAPHS[kinds[i % len(kinds)]],
+        } for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("kind", PARAGRAPHS)
+def test_clean_text(benchmark, kind):
+    benchmark.group = "clean_text"
+    benchmark(clean_text, PARAGRAPHS[kind])
+
+
+def test_clean_texts(benchmark):
+    benchmark.group = "clean_text"
+    benchmark(clean_texts, list(PARAGRAPHS.values()) * 5)
+
+
+@pytest.mark.parametrize("kind", PARAGRAPHS)
+def test_parse_hebrew_text(benchmark, kind):
+    benchmark.group = "parse_hebrew_text"
+    benchmark(parse_hebrew_text, clean_text(PARAGRAPHS[kind]))
+
+
+def test_create_body(benchmark):
+    benchmark.group = "create_body"
+    client = GPTClient(Mock())
+    benchmark(client.create_body, SHORT, make_docs())
+
+
+def test_serialize_search_response(benchmark):
+    benchmark.group = "serialize_response"
+    docs = [{"id": doc["doc_id"], "title": doc["title"], "link": doc["link"], "content": doc["content"]}
+            for doc in make_docs()]
+    result = {
+        "conversation_id": str(uuid.uuid4()),
+        "interaction_type": "search",
+        "llm_result": LONG,
+        "docs": docs,
+        "config_version": 3,
+        "code_version": "1.0.0",
+        "question": SHORT,
+        "asked_from": "benchmark",
+        "metadata": {"llm_model": "gpt-4o", "llm_time": 1.2345, "retrieval_time": 0.0456, "tokens": 200},
+    }
+    benchmark(serialize, "search", result)
@@ -0,0 +1,217 @@
+"""
+Offline evaluation of retrieval quality and latency.
+
+Runs labelled (question, expected doc_id) pairs through /retrieve of one or more running services - each a
+configuration, e.g. another embedding model version or index settings - at a configurable concurrency, and reports
+recall@k for every k, MRR and latency percentiles per configuration, with the smallest k that meets --min-recall.
+Every question is retrieved once at the largest k: the top k documents are a prefix of the top max-k, and the search
+fetches the same hits whatever k is, so the latency applies to every k.
+
+The pairs are JSONL: {"query": "...", "doc_id": 1} or {"query": "...", "doc_ids": [1, 2]} ("question" is accepted
+for "query"). With --stand-ins the app is booted against the local stand-ins of the load test instead, with pairs
+made from words of the synthetic corpus' paragraphs if --pairs is omitted, to try the harness without Elasticsearch.
+
+Usage:
+    python benchmarks/evaluate_retrieval.py --pairs labelled.jsonl --target current=http://localhost:5000 \\
+        --target e5=http://localhost:5001 --k 1 3 5 10 --concurrency 32 --min-recall 0.9 --output eval.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from load_test import percentiles  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate retrieval recall, MRR and latency")
+    parser.add_argument("--pairs", help="JSONL file of labelled pairs: query and doc_id or doc_ids")
+    parser.add_argument("--target", action="append", default=[],
+                        help="A configuration to evaluate, name=url or url; repeat to compare configurations")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="The k of recall@k")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent requests")
+    parser.add_argument("--min-recall", type=float, help="Report the smallest k whose recall meets this")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request, seconds")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--stand-ins", action="store_true",
+                        help="Evaluate the app booted against the load test's local stand-ins")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Size of the stand-ins' synthetic corpus")
+    parser.add_argument("--port", type=int, default=5098, help="Port of the app booted with --stand-ins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not args.pairs and not args.stand_ins:
+        parser.error("--pairs is required unless --stand-ins is set")
+    if not args.target and not args.stand_ins:
+        args.target = ["http://localhost:5000"]
+    return args
+
+
+def load_pairs(path):
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            expected = record["doc_ids"] if "doc_ids" in record else [record["doc_id"]]
+            pairs.append((record.get("query") or record["question"], {str(doc_id) for doc_id in expected}))
+    return pairs
+
+
+def parse_target(target):
+    name, separator, url = target.partition("=")
+    return (name, url) if separator else (target, target)
+
+
+def score_ranking(ranked_doc_ids, expected, ks):
+    """
+    Scores one question's ranking.
+    Args:
+        ranked_doc_ids (list[str]): The retrieved doc ids, best first.
+        expected (set[str]): The relevant doc ids.
+        ks (list[int]): The k of recall@k.
+    Returns:
+        tuple: The recall at each k, and the reciprocal rank of the first relevant doc, 0 if none was retrieved.
+    """
+    recalls = {k: len(expected.intersection(ranked_doc_ids[:k])) / len(expected) for k in ks}
+    rank = next((i for i, doc_id in enumerate(ranked_doc_ids, start=1) if doc_id in expected), None)
+    return recalls, 1 / rank if rank else 0.0
+
+
+async def evaluate_target(url, pairs, ks, args):
+    """
+    Retrieves every question from the service at the largest k and scores the rankings.
+    Returns:
+        dict: The configuration's report.
+    """
+    import httpx
+
+    top_k = max(ks)
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    latencies, retrieval_times, embedding_times, search_times = [], [], [], []
+    errors = 0
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while (i := next(counter)) < len(pairs):
+                query, expected = pairs[i]
+                before_request = time.perf_counter()
+                try:
+                    response = await client.post("/retrieve", json={"query": query, "top_k": top_k})
+                    response.raise_for_status()
+                    body = response.json()
+                except Exception as e:
+                    errors += 1
+                    print(f"request failed: {e}", file=sys.stderr)
+                    continue
+                latencies.append(time.perf_counter() - before_request)
+                retrieval_times.append(body["metadata"]["retrieval_time"])
+                embedding_times.append(body["metadata"]["embedding_time"])
+                search_times.append(body["metadata"]["search_time"])
+                question_recalls, reciprocal_rank = score_ranking([str(doc["id"]) for doc in body["docs"]],
+                                                                  expected, ks)
+                for k, recall in question_recalls.items():
+                    recalls[k].append(recall)
+                reciprocal_ranks.append(reciprocal_rank)
+
+        before_run = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        wall_time = time.perf_counter() - before_run
+
+    recall_at_k = {k: round(sum(values) / len(values), 4) if values else 0.0 for k, values in recalls.items()}
+    report = {
+        "url": url,
+        "questions": len(pairs),
+        "errors": errors,
+        "wall_time": round(wall_time, 4),
+        "qps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+        "recall": recall_at_k,
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else 0.0,
+        "latency": {
+            "total": percentiles(latencies),
+            "retrieval": percentiles(retrieval_times),
+            "embedding": percentiles(embedding_times),
+            "search": percentiles(search_times),
+        },
+    }
+    if args.min_recall is not None:
+        report["min_k"] = next((k for k in sorted(ks) if recall_at_k[k] >= args.min_recall), None)
+    return report
+
+
+def print_report(name, report):
+    print(f"== {name} ({report['url']})  questions: {report['questions']}  errors: {report['errors']}  "
+          f"throughput: {report['qps']} q/s")
+    print("  " + "  ".join(f"recall@{k}: {recall}" for k, recall in report["recall"].items())
+          + f"  MRR: {report['mrr']}")
+    if "min_k" in report:
+        print(f"  smallest k meeting the recall target: {report['min_k']}")
+    print(f"  {'stage':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}{'max':>10}")
+    for stage, stats in report["latency"].items():
+        if stats:
+            print(f"  {stage:<10}" + "".join(f"{stats[key]:>10.4f}" for key in ("p50", "p95", "p99", "mean", "max")))
+
+
+def boot_stand_ins(args):
+    """
+    Boots the app against the load test's stand-ins and seeds the synthetic corpus.
+    Returns:
+        tuple: The main module, the uvicorn server, and pairs made from words of the corpus' paragraphs.
+    """
+    import load_test
+
+    load_args = load_test.parse_args(["--port", str(args.port), "--llm-latency", "0", "--llm-tokens", "0",
+                                      "--no-retrieval-cache"])
+    load_test.configure_environment(load_args)
+    from stand_ins import InMemoryElasticsearch
+    from gpt_client import prepare_paragraphs_for_llm
+
+    rng = random.Random(args.seed)
+    questions = load_test.load_questions(load_args.questions)
+    corpus = load_test.synthetic_corpus(args.corpus_size, questions, rng)
+    app_main, server = load_test.boot_app(load_args, InMemoryElasticsearch())
+    app_main.engine.create_paragraphs(prepare_paragraphs_for_llm(corpus))
+    pairs = [(" ".join(rng.sample(paragraph["content"].split(), 8)), {str(paragraph["doc_id"])})
+             for paragraph in rng.sample(corpus, min(200, len(corpus)))]
+    return app_main, server, pairs
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ks = sorted(set(args.k))
+    server = None
+    pairs = load_pairs(args.pairs) if args.pairs else None
+    if args.stand_ins:
+        app_main, server, stand_in_pairs = boot_stand_ins(args)
+        pairs = pairs or stand_in_pairs
+        args.target.append(f"stand-ins=http://127.0.0.1:{args.port}")
+    try:
+        reports = {}
+        for target in args.target:
+            name, url = parse_target(target)
+            reports[name] = asyncio.run(evaluate_target(url, pairs, ks, args))
+            print_report(name, reports[name])
+    finally:
+        if server is not None:
+            server.should_exit = True
+            if app_main.interactions_model is not None:
+                app_main.interactions_model.poll_queue = False
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"k": ks, "min_recall": args.min_recall, "configurations": reports}, f, indent=2)
+    return 1 if any(report["errors"] for report in reports.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
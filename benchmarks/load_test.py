@@ -0,0 +1,272 @@
+"""
+End-to-end load test of the /search endpoint against local stand-ins.
+
+Boots the app with an in-memory Elasticsearch stand-in and the mock LLM client (with configurable latency and token
+rate), seeds a corpus, replays a question set at a configurable concurrency and reports throughput and latency
+percentiles, total and per stage. Pass --baseline to fail when p95 latency or throughput regress.
+
+Usage:
+    python benchmarks/load_test.py --questions benchmarks/questions.jsonl --concurrency 8 --requests 200 \\
+        --llm-latency 0.5 --llm-tokens 200 --llm-tokens-per-sec 150 --output report.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app" / "src"
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+
+FILLER_WORDS = ("זכאות", "קצבה", "ביטוח", "לאומי", "מענק", "הנחה", "ארנונה", "עובדים", "פיצויים", "פיטורים",
+                "חופשה", "מחלה", "לידה", "הורים", "ילדים", "נכות", "אבטלה", "מילואים", "סטודנטים", "דיור",
+                "שכר", "מינימום", "תשלום", "בקשה", "טופס", "זכויות", "מיסים", "החזר", "גמלה", "הבטחת", "הכנסה")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /search against local stand-ins")
+    parser.add_argument("--questions", default=str(BENCHMARKS_DIR / "questions.jsonl"),
+                        help="JSONL file of questions (query / question / title field) or plain text, one per line")
+    parser.add_argument("--requests", type=int, default=200, help="Number of measured requests")
+    parser.add_argument("--warmup", type=int, default=10, help="Number of unmeasured warm-up requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--corpus", help="Paragraphs corpus JSON; a synthetic corpus is generated if omitted")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Size of the synthetic corpus")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fixed latency of the mock LLM, seconds")
+    parser.add_argument("--llm-tokens", type=int, default=200, help="Tokens generated by the mock LLM")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=150.0, help="Token rate of the mock LLM")
+    parser.add_argument("--es-latency", type=float, default=0.0, help="Simulated latency of every ES search")
+    parser.add_argument("--real-model", action="store_true",
+                        help="Use the retrieval model from MODEL_LOCATION instead of the hashing stand-in")
+    parser.add_argument("--no-retrieval-cache", action="store_true", help="Disable the retrieval cache")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative regression of p95 latency and throughput against the baseline")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """
+    Points the app at the stand-ins. Must run before the app's modules are imported, since they read the
+    environment at import time.
+    """
+    os.environ.update({
+        "IS_MOCK_GPT_CLIENT": "true",
+        "MOCK_LLM_LATENCY_SECS": str(args.llm_latency),
+        "MOCK_LLM_TOKENS": str(args.llm_tokens),
+        "MOCK_LLM_TOKENS_PER_SEC": str(args.llm_tokens_per_sec),
+        "DOCUMENT_DEFINITION_CONFIG": str(APP_DIR / "doc-config.json"),
+        "STATIC_DIR": str(APP_DIR / "static"),
+        "ES_EMBEDDING_INDEX": "bench_embeddings",
+        "CONFIG_CACHE_PERIOD_SECS": "600",
+    })
+    if args.no_retrieval_cache:
+        os.environ["RETRIEVAL_CACHE_SIZE"] = "0"
+    sys.path.insert(0, str(APP_DIR))
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+
+
+def load_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                questions.append(line)
+                continue
+            if isinstance(record, dict):
+                questions.append(record.get("query") or record.get("question") or record.get("title"))
+            else:
+                questions.append(str(record))
+    return [question for question in questions if question]
+
+
+def synthetic_corpus(size, questions, rng):
+    """
+    Generates paragraphs from the questions' words and filler words, so questions retrieve related paragraphs.
+    """
+    vocabulary = sorted({word for question in questions for word in question.split()} | set(FILLER_WORDS))
+    return [
+        {
+            "doc_id": doc_id,
+            "title": " ".join(rng.choices(vocabulary, k=4)),
+            "link": f"https://www.kolzchut.org.il/he/{doc_id}",
+            "content": " ".join(rng.choices(vocabulary, k=rng.randint(40, 160))),
+        }
+        for doc_id in range(1, size + 1)
+    ]
+
+
+def boot_app(args, es_client):
+    """
+    Starts the app with uvicorn in a background thread, with the stand-ins injected.
+    Returns:
+        tuple: The main module and the uvicorn server.
+    """
+    import uvicorn
+    import get_es_client
+    import main
+    from stand_ins import HashingEncoder
+
+    get_es_client.singleton_es_client = es_client
+    if not args.real_model:
+        main.load_retrieval_model = HashingEncoder
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The app failed to start")
+        time.sleep(0.05)
+    return main, server
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 4)
+
+    return {"p50": rank(50), "p95": rank(95), "p99": rank(99), "mean": round(sum(ordered) / len(ordered), 4),
+            "max": round(ordered[-1], 4)}
+
+
+async def run_load(args, questions, total, endpoint="/search"):
+    import httpx
+
+    results = []
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout,
+                                 limits=limits) as client:
+        async def worker():
+            while (i := next(counter)) < total:
+                question = questions[i % len(questions)]
+                before_request = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json={"query": question, "asked_from": "load_test"})
+                    body = response.json() if response.status_code == 200 else None
+                except Exception as e:
+                    body = None
+                    print(f"request failed: {e}", file=sys.stderr)
+                results.append((time.perf_counter() - before_request, body))
+
+        before_run = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        wall_time = time.perf_counter() - before_run
+    return results, wall_time
+
+
+def build_report(args, results, wall_time):
+    succeeded = [(latency, body) for latency, body in results if body]
+    total = [latency for latency, _ in succeeded]
+    retrieval = [body["metadata"]["retrieval_time"] for _, body in succeeded]
+    llm = [body["metadata"]["llm_time"] for _, body in succeeded]
+    other = [latency - r - l for (latency, _), r, l in zip(succeeded, retrieval, llm)]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "concurrency": args.concurrency,
+        "wall_time": round(wall_time, 4),
+        "rps": round(len(succeeded) / wall_time, 2) if wall_time else 0.0,
+        "latency": {
+            "total": percentiles(total),
+            "retrieval": percentiles(retrieval),
+            "llm": percentiles(llm),
+            "other": percentiles(other),
+        },
+        "settings": {
+            "llm_latency": args.llm_latency,
+            "llm_tokens": args.llm_tokens,
+            "llm_tokens_per_sec": args.llm_tokens_per_sec,
+            "es_latency": args.es_latency,
+            "real_model": args.real_model,
+            "retrieval_cache": not args.no_retrieval_cache,
+        },
+    }
+
+
+def print_report(report):
+    print(f"requests: {report['requests']}  errors: {report['errors']}  concurrency: {report['concurrency']}  "
+          f"wall time: {report['wall_time']}s  throughput: {report['rps']} req/s")
+    print(f"{'stage':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}{'max':>10}")
+    for stage, stats in report["latency"].items():
+        if stats:
+            print(f"{stage:<10}" + "".join(f"{stats[key]:>10.4f}" for key in ("p50", "p95", "p99", "mean", "max")))
+
+
+def compare_to_baseline(report, baseline, max_regression):
+    """
+    Returns:
+        list[str]: The regressions found, empty if none.
+    """
+    regressions = []
+    current_p95 = report["latency"]["total"].get("p95", float("inf"))
+    baseline_p95 = baseline["latency"]["total"]["p95"]
+    if current_p95 > baseline_p95 * (1 + max_regression):
+        regressions.append(f"p95 latency {current_p95}s vs baseline {baseline_p95}s")
+    if report["rps"] < baseline["rps"] * (1 - max_regression):
+        regressions.append(f"throughput {report['rps']} req/s vs baseline {baseline['rps']} req/s")
+    if report["errors"] > baseline["errors"]:
+        regressions.append(f"{report['errors']} errors vs baseline {baseline['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    from stand_ins import InMemoryElasticsearch
+
+    rng = random.Random(args.seed)
+    questions = load_questions(args.questions)
+    es_client = InMemoryElasticsearch(search_latency=args.es_latency)
+    app_main, server = boot_app(args, es_client)
+    from gpt_client import prepare_paragraphs_for_llm
+    try:
+        if args.corpus:
+            from utils import convert_kolzchut_paragraphs_corpus_to_json
+            corpus = convert_kolzchut_paragraphs_corpus_to_json(args.corpus)
+        else:
+            corpus = synthetic_corpus(args.corpus_size, questions, rng)
+        app_main.engine.create_paragraphs(prepare_paragraphs_for_llm(corpus))
+        rng.shuffle(questions)
+
+        asyncio.run(run_load(args, questions, args.warmup))
+        results, wall_time = asyncio.run(run_load(args, questions, args.requests))
+    finally:
+        server.should_exit = True
+        if app_main.interactions_model is not None:
+            app_main.interactions_model.poll_queue = False
+
+    report = build_report(args, results, wall_time)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Benchmarks the time to first token of the LLM with the prompt-cache-friendly message layout against a layout that
+defeats the provider's prompt cache.
+
+The "stable" layout is the app's: the system prompt and user prompt open every request byte-identically, followed by
+the question and documents. The "unstable" layout prepends a unique nonce to the system prompt, so no prefix is ever
+reused. Requests of the two layouts are interleaved, streamed, and the time to the first content token, the total
+latency and the cached prompt tokens reported in the usage are recorded.
+
+Providers only cache prefixes from a minimal length (1024 tokens for OpenAI), so pass a system prompt of that length
+with --system-prompt-file to see the effect. Needs OAI_API_KEY.
+
+Usage:
+    python benchmarks/prompt_cache_ttft.py --model gpt-4o-2024-08-06 --requests 20 \\
+        --system-prompt-file system_prompt.txt --output ttft.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from load_test import APP_DIR, BENCHMARKS_DIR, load_questions, percentiles, synthetic_corpus
+
+LAYOUTS = ("stable", "unstable")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time to first token with and without a stable prompt prefix")
+    parser.add_argument("--model", help="The model; the seed configuration's model if omitted")
+    parser.add_argument("--questions", default=str(BENCHMARKS_DIR / "questions.jsonl"))
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per layout")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests per layout")
+    parser.add_argument("--docs", type=int, default=3, help="Documents per request")
+    parser.add_argument("--corpus-size", type=int, default=200, help="Size of the synthetic corpus")
+    parser.add_argument("--system-prompt-file", help="The system prompt; the seed configuration's if omitted")
+    parser.add_argument("--max-tokens", type=int, default=32, help="Completion tokens per request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    return parser.parse_args(argv)
+
+
+class StaticConfigs:
+    """
+    Serves a fixed configuration in place of the saved configurations in Elasticsearch.
+    """
+    def __init__(self, config):
+        self.config = config
+
+
+    def get_config(self):
+        return self.config
+
+
+def stream_completion(oai_client, config, messages, max_tokens):
+    """
+    Streams one completion.
+    Returns:
+        dict: The time to the first content token and the total latency, in seconds, and the cached prompt tokens.
+    """
+    from gpt_client import cached_prompt_tokens
+
+    before_request = time.perf_counter()
+    ttft = None
+    usage = None
+    stream = oai_client.chat.completions.create(
+        model=config["model"],
+        messages=messages,
+        temperature=float(config["temperature"]),
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    for chunk in stream:
+        if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+            ttft = time.perf_counter() - before_request
+        if chunk.usage is not None:
+            usage = chunk.usage
+    total = time.perf_counter() - before_request
+    return {
+        "ttft": ttft if ttft is not None else total,
+        "total": total,
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        "cached_tokens": cached_prompt_tokens(usage) if usage else 0,
+    }
+
+
+def layout_messages(layout, config, body):
+    from gpt_client import build_messages
+
+    if layout == "stable":
+        return build_messages(config, body)
+    nonce_config = {**config, "system_prompt": f"[{uuid.uuid4().hex}]\n{config['system_prompt']}"}
+    return build_messages(nonce_config, body)
+
+
+def build_report(args, results):
+    report = {"model": args.model, "requests": args.requests, "layouts": {}}
+    for layout in LAYOUTS:
+        measured = results[layout]
+        report["layouts"][layout] = {
+            "ttft": percentiles([result["ttft"] for result in measured]),
+            "total": percentiles([result["total"] for result in measured]),
+            "mean_prompt_tokens": round(sum(result["prompt_tokens"] for result in measured) / len(measured), 1),
+            "mean_cached_tokens": round(sum(result["cached_tokens"] for result in measured) / len(measured), 1),
+            "cache_hit_rate": round(sum(1 for result in measured if result["cached_tokens"]) / len(measured), 3),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"model: {report['model']}  requests per layout: {report['requests']}")
+    print(f"{'layout':<10}{'ttft p50':>10}{'ttft p95':>10}{'total p50':>11}{'prompt':>9}{'cached':>9}{'hits':>7}")
+    for layout, stats in report["layouts"].items():
+        print(f"{layout:<10}{stats['ttft']['p50']:>10.4f}{stats['ttft']['p95']:>10.4f}{stats['total']['p50']:>11.4f}"
+              f"{stats['mean_prompt_tokens']:>9}{stats['mean_cached_tokens']:>9}{stats['cache_hit_rate']:>7}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DOCUMENT_DEFINITION_CONFIG", str(APP_DIR / "doc-config.json"))
+    sys.path.insert(0, str(APP_DIR))
+    from gpt_client import GPTClient
+    from saved_config import seed_config
+
+    config = dict(seed_config)
+    args.model = args.model or config["model"]
+    config["model"] = args.model
+    if args.system_prompt_file:
+        config["system_prompt"] = Path(args.system_prompt_file).read_text(encoding="utf-8")
+
+    rng = random.Random(args.seed)
+    questions = load_questions(args.questions)
+    corpus = synthetic_corpus(args.corpus_size, questions, rng)
+    client = GPTClient(StaticConfigs(config))
+
+    results = {layout: [] for layout in LAYOUTS}
+    for i in range(args.warmup + args.requests):
+        question = questions[i % len(questions)]
+        body = client.create_body(question, rng.sample(corpus, args.docs))
+        for layout in LAYOUTS:
+            result = stream_completion(client.oai_client, config, layout_messages(layout, config, body),
+                                       args.max_tokens)
+            if i >= args.warmup:
+                results[layout].append(result)
+
+    report = build_report(args, results)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
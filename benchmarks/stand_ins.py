@@ -0,0 +1,207 @@
+import copy
+import fnmatch
+import threading
+import time
+import uuid
+import zlib
+import numpy as np
+
+
+class InMemoryIndices:
+    """
+    The `indices` namespace of InMemoryElasticsearch.
+    """
+    def __init__(self, es):
+        self.es = es
+
+
+    def exists(self, index, **_kwargs):
+        return bool(self.es.matching_indices(index))
+
+
+    def create(self, index, **_kwargs):
+        with self.es.lock:
+            self.es.data.setdefault(index, {})
+        return {"acknowledged": True, "index": index}
+
+
+    def get(self, index, **_kwargs):
+        return {name: {} for name in self.es.matching_indices(index)}
+
+
+    def delete(self, index, **_kwargs):
+        with self.es.lock:
+            for name in self.es.matching_indices(index):
+                del self.es.data[name]
+        return {"acknowledged": True}
+
+
+    def put_index_template(self, name, **_kwargs):
+        return {"acknowledged": True}
+
+
+    def put_settings(self, index, **_kwargs):
+        return {"acknowledged": True}
+
+
+    def forcemerge(self, index, **_kwargs):
+        return {"task": f"stand-in:{uuid.uuid4().hex}"}
+
+
+class InMemoryElasticsearch:
+    """
+       An in-memory stand-in for the subset of the Elasticsearch client the app uses, for load tests and offline
+       evaluation without a cluster. Supports match / term / exists / match_all queries, sorting, and the
+       script_score cosineSimilarity query the engine uses for kNN retrieval, scored with numpy.
+       Attributes:
+           data (dict): Maps an index name to its documents, by id.
+           indices (InMemoryIndices): The indices namespace.
+           lock (threading.Lock): Guards the stored documents.
+           search_latency (float): Simulated latency added to every search, in seconds.
+       """
+    def __init__(self, search_latency: float = 0.0):
+        self.data = {}
+        self.indices = InMemoryIndices(self)
+        self.lock = threading.Lock()
+        self.search_latency = search_latency
+
+
+    def matching_indices(self, pattern):
+        patterns = pattern.split(",") if isinstance(pattern, str) else pattern
+        return [name for name in list(self.data) if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+    def ping(self, **_kwargs):
+        return True
+
+
+    def index(self, index, body=None, id=None, document=None, **_kwargs):
+        doc_id = str(id) if id is not None else uuid.uuid4().hex
+        with self.lock:
+            self.data.setdefault(index, {})[doc_id] = copy.copy(body if body is not None else document)
+        return {"result": "created", "_id": doc_id, "_index": index}
+
+
+    def get(self, index, id, **_kwargs):
+        return {"_index": index, "_id": str(id), "_source": self.data[index][str(id)], "found": True}
+
+
+    def delete(self, index, id, **_kwargs):
+        with self.lock:
+            del self.data[index][str(id)]
+        return {"result": "deleted"}
+
+
+    def update(self, index, id, **_kwargs):
+        # Scripted updates (the updater's queue) are accepted but not applied.
+        return {"result": "noop"}
+
+
+    def count(self, index, body=None, query=None, **_kwargs):
+        query = query or (body or {}).get("query")
+        return {"count": len(self.matching_hits(index, query))}
+
+
+    def search(self, index, body=None, query=None, size=None, sort=None, **_kwargs):
+        if self.search_latency:
+            time.sleep(self.search_latency)
+        body = body or {}
+        query = query or body.get("query")
+        size = size if size is not None else body.get("size", 10)
+        sort = sort or body.get("sort")
+        hits = self.matching_hits(index, query)
+        if sort:
+            for sort_field in reversed(sort):
+                (field, order), = sort_field.items()
+                reverse = (order.get("order", "asc") if isinstance(order, dict) else order) == "desc"
+                hits.sort(key=lambda hit: hit["_source"].get(field, 0), reverse=reverse)
+        else:
+            hits.sort(key=lambda hit: hit["_score"], reverse=True)
+        return {"hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": hits[:size]}}
+
+
+    def msearch(self, searches=None, body=None, **_kwargs):
+        searches = searches if searches is not None else body
+        responses = []
+        for header, search_body in zip(searches[::2], searches[1::2]):
+            responses.append(self.search(index=header.get("index"), body=search_body))
+        return {"responses": responses}
+
+
+    def delete_by_query(self, index, body=None, query=None, **_kwargs):
+        query = query or (body or {}).get("query")
+        hits = self.matching_hits(index, query)
+        with self.lock:
+            for hit in hits:
+                self.data[hit["_index"]].pop(hit["_id"], None)
+        return {"deleted": len(hits)}
+
+
+    def matching_hits(self, index, query):
+        with self.lock:
+            docs = [(name, doc_id, doc) for name in self.matching_indices(index)
+                    for doc_id, doc in self.data[name].items()]
+        hits = []
+        for name, doc_id, doc in docs:
+            score = self.score(query, doc_id, doc)
+            if score is not None:
+                hits.append({"_index": name, "_id": doc_id, "_score": score, "_source": doc})
+        return hits
+
+
+    def score(self, query, doc_id, doc):
+        """
+        Scores a document against a query.
+        Returns:
+            float or None: The score, or None if the document doesn't match.
+        """
+        if not query or "match_all" in query:
+            return 1.0
+        if "match" in query or "term" in query:
+            (field, value), = (query.get("match") or query.get("term")).items()
+            if isinstance(value, dict):
+                value = value.get("value", value.get("query"))
+            actual = doc_id if field == "_id" else doc.get(field)
+            return 1.0 if str(actual) == str(value) else None
+        if "exists" in query:
+            return 1.0 if query["exists"]["field"] in doc else None
+        if "script_score" in query:
+            if self.score(query["script_score"]["query"], doc_id, doc) is None:
+                return None
+            field = query["script_score"]["query"]["exists"]["field"]
+            query_vector = np.asarray(query["script_score"]["script"]["params"]["query_vector"], dtype=np.float32)
+            doc_vector = np.asarray(doc[field], dtype=np.float32)
+            norms = np.linalg.norm(query_vector) * np.linalg.norm(doc_vector)
+            return float(np.dot(query_vector, doc_vector) / norms) + 1.0 if norms else 1.0
+        raise ValueError(f"Unsupported query: {query}")
+
+
+class HashingEncoder:
+    """
+    A deterministic stand-in for the retrieval model: a normalized bag of hashed words.
+    Questions that share words with a paragraph score higher, which is enough to exercise the retrieval path.
+    """
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+
+    def encode(self, texts, **_kwargs):
+        if isinstance(texts, str):
+            return self.encode_one(texts)
+        return np.stack([self.encode_one(text) for text in texts])
+
+
+    def encode_one(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.split():
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+    def eval(self):
+        return self
+
+
+    def to(self, _device):
+        return self
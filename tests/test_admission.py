@@ -0,0 +1,151 @@
+import asyncio
+import sys
+import os
+from http import HTTPStatus
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def controller(**kwargs):
+    settings = {"max_concurrent": 1, "max_queue": 10, "max_queue_per_client": 10, "queue_timeout": 5}
+    return AdmissionController("test", **{**settings, **kwargs})
+
+
+async def hold(admission, client, order, release):
+    async with admission.slot(client):
+        order.append(client)
+        await release.wait()
+
+
+def test_admits_up_to_max_concurrent():
+    """Test that requests beyond the limit wait until a slot is released"""
+    async def run():
+        admission = controller(max_concurrent=2)
+        release = asyncio.Event()
+        order = []
+        tasks = [asyncio.create_task(hold(admission, client, order, release)) for client in "abc"]
+        await asyncio.sleep(0.01)
+        admitted_before_release = list(order)
+        queued_before_release = admission.queued
+        release.set()
+        await asyncio.gather(*tasks)
+        return admitted_before_release, queued_before_release, order, admission
+
+    admitted, queued, order, admission = asyncio.run(run())
+
+    assert admitted == ["a", "b"]
+    assert queued == 1
+    assert order == ["a", "b", "c"]
+    assert admission.active == 0 and admission.queued == 0 and not admission.queues
+
+
+def test_waiting_clients_are_admitted_round_robin():
+    """Test that a client's burst doesn't delay another client's request"""
+    async def run():
+        admission = controller()
+        order = []
+        first_release = asyncio.Event()
+        first = asyncio.create_task(hold(admission, "first", order, first_release))
+        await asyncio.sleep(0)
+        released = asyncio.Event()
+        released.set()
+        waiting = [asyncio.create_task(hold(admission, client, order, released))
+                   for client in ["burst", "burst", "burst", "other"]]
+        await asyncio.sleep(0.01)
+        first_release.set()
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(run()) == ["first", "burst", "other", "burst", "burst"]
+
+
+def test_rejects_client_over_its_queue_share():
+    """Test that a client with too many waiting requests gets 429"""
+    async def run():
+        admission = controller(max_queue_per_client=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, "client", [], release)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    rejected = [result for result in results if isinstance(result, AdmissionRejected)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert rejected[0].retry_after >= 1
+
+
+def test_rejects_when_queue_is_full():
+    """Test that a request finding the queue full gets 503"""
+    async def run():
+        admission = controller(max_queue=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, client, [], release)) for client in "abc"]
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert isinstance(results[2], AdmissionRejected)
+    assert results[2].status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert results[2].reason == "queue_full"
+
+
+def test_rejects_after_queue_timeout():
+    """Test that a request waiting longer than the timeout gets 503 and leaves the queue"""
+    async def run():
+        admission = controller(queue_timeout=0.01)
+        release = asyncio.Event()
+        first = asyncio.create_task(hold(admission, "a", [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await hold(admission, "b", [], release)
+        queued = admission.queued
+        release.set()
+        await first
+        return rejected.value, queued, admission
+
+    rejected, queued, admission = asyncio.run(run())
+
+    assert rejected.reason == "queue_timeout"
+    assert queued == 0
+    assert admission.active == 0
+
+
+def test_cancelled_request_leaves_queue():
+    """Test that a waiting request that is cancelled doesn't hold a place or a slot"""
+    async def run():
+        admission = controller()
+        release = asyncio.Event()
+        order = []
+        first = asyncio.create_task(hold(admission, "a", order, release))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(hold(admission, "b", order, release))
+        third = asyncio.create_task(hold(admission, "c", order, release))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, third)
+        return order, admission
+
+    order, admission = asyncio.run(run())
+
+    assert order == ["a", "c"]
+    assert admission.active == 0 and admission.queued == 0
+
+
+def test_disabled_admits_everything():
+    async def run():
+        admission = controller(max_concurrent=0)
+        release = asyncio.Event()
+        release.set()
+        await asyncio.gather(*[hold(admission, "a", [], release) for _ in range(5)])
+
+    asyncio.run(run())
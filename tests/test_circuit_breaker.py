@@ -0,0 +1,82 @@
+import sys
+import os
+from unittest.mock import Mock
+import pytest
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+
+def test_opens_after_consecutive_failures():
+    """Test that the circuit opens at the failure threshold and then fails fast"""
+    breaker = CircuitBreaker("test_open", failure_threshold=3, reset_timeout=60)
+    dependency = Mock()
+
+    trip(breaker)
+
+    assert breaker.current_state() == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(dependency)
+    dependency.assert_not_called()
+    assert REGISTRY.get_sample_value("ragbot_circuit_state", {"dependency": "test_open"}) == 2
+    assert REGISTRY.get_sample_value("ragbot_circuit_rejections_total", {"dependency": "test_open"}) == 1
+
+
+def test_success_resets_failures():
+    """Test that only consecutive failures count"""
+    breaker = CircuitBreaker("test_reset", failure_threshold=2, reset_timeout=60)
+
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    assert breaker.current_state() == CLOSED
+
+
+def test_half_open_probe_closes_circuit():
+    """Test that after the reset timeout one probe goes through and closes the circuit on success"""
+    breaker = CircuitBreaker("test_probe", failure_threshold=1, reset_timeout=0)
+    trip(breaker)
+
+    assert breaker.current_state() == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.current_state() == CLOSED
+
+
+def test_failed_probe_reopens_circuit():
+    breaker = CircuitBreaker("test_failed_probe", failure_threshold=1, reset_timeout=60)
+    trip(breaker)
+    breaker.opened_at -= 60
+
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    assert breaker.state == OPEN
+
+
+def test_single_probe_while_half_open():
+    """Test that other calls fail fast while the probe runs"""
+    breaker = CircuitBreaker("test_single_probe", failure_threshold=1, reset_timeout=0)
+    trip(breaker)
+
+    def probe():
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "concurrent")
+        return "probe"
+
+    assert breaker.call(probe) == "probe"
+    assert breaker.current_state() == CLOSED
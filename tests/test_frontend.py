@@ -0,0 +1,99 @@
+import json
+import re
+import shutil
+import subprocess
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/frontend')))
+
+import build
+
+# Runs the built bundle once in Node, with a root that keeps the rendered element in place of the DOM and hooks
+# answering with the given states, and prints the element's text
+RENDER_SCRIPT = """
+const fs = require('fs');
+const vm = require('vm');
+const [bundle, states] = process.argv.slice(1);
+const context = { console };
+context.self = context;
+let rendered = null;
+const root = { createRoot: () => ({ render: (element) => { rendered = element; } }) };
+Object.defineProperty(context, 'ReactDOM', { get: () => root, set: () => {} });
+context.document = { getElementById: () => ({}), addEventListener() {}, removeEventListener() {} };
+vm.createContext(context);
+vm.runInContext(fs.readFileSync(bundle, 'utf8'), context);
+const overrides = JSON.parse(states);
+let call = 0;
+context.React.__SECRET_INTERNALS_DO_NOT_USE_OR_YOU_WILL_BE_FIRED.ReactCurrentDispatcher.current = {
+    useState: (initial) => [String(call) in overrides ? overrides[call++] : (call++, initial), () => {}],
+    useEffect: () => {},
+    useRef: (initial) => ({ current: initial }),
+};
+const texts = [];
+const walk = (node) => {
+    if (Array.isArray(node)) return node.forEach(walk);
+    if (node === null || node === undefined || typeof node === 'boolean') return;
+    if (typeof node !== 'object') return texts.push(String(node));
+    walk(node.props.children);
+};
+walk(rendered.type());
+console.log(JSON.stringify(texts));
+"""
+
+
+def test_build_references_hashed_bundles(tmp_path):
+    """Test that the built index.html loads one script and one stylesheet, named after their content"""
+    assets = build.build(tmp_path)
+
+    page = (tmp_path / "index.html").read_text(encoding="utf-8")
+    assert re.findall(r'<script defer src="/assets/([^"]+)"', page) == [assets["app.js"]]
+    assert re.findall(r'<link rel="stylesheet" href="/assets/([^"]+)"', page) == [assets["app.css"]]
+    for name, hashed in assets.items():
+        content = (tmp_path / "assets" / hashed).read_bytes()
+        assert build.hashed_name(name, content) == hashed
+    assert "{{" not in page
+
+
+def test_bundle_is_minified():
+    """Test that the app's script and styles are minified into the bundles, after the vendored React builds"""
+    script = build.bundle("app.js").decode("utf-8")
+    app = (build.FRONTEND_DIR / "src" / "app.js").read_text(encoding="utf-8")
+
+    assert script.index("react.production.min.js") < script.index("react-dom.production.min.js") < \
+        script.index("ReactDOM.createRoot")
+    assert script.endswith(build.minify(app, "src/app.js") + "\n")
+    assert len(build.minify(app, "src/app.js")) < len(app) * 0.8
+    assert len(build.bundle("app.css")) < len((build.FRONTEND_DIR / "src" / "index.css").read_bytes()) * 0.9
+
+
+def test_committed_build_is_current(tmp_path):
+    """Test that the front-end the app serves was built from the current sources"""
+    build.build(tmp_path)
+
+    assert (build.STATIC_DIR / "index.html").read_text(encoding="utf-8") == \
+        (tmp_path / "index.html").read_text(encoding="utf-8")
+    assert sorted(path.name for path in (build.STATIC_DIR / "assets").iterdir()) == \
+        sorted(path.name for path in (tmp_path / "assets").iterdir())
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="Node.js is not installed")
+@pytest.mark.parametrize("states, expected", [
+    ({}, ["ברוכים הבאים לצ׳אטבוט של ווביקס!", "הרץ שאלה לדוגמה"]),
+    ({"1": "מה מגיע לי?",
+      "3": {"llm_result": "תשובה", "docs": [{"id": 1, "title": "דמי אבטלה", "link": "#"}],
+            "metadata": {"retrieval_time": 0.1, "llm_time": 1.2}},
+      "4": False},
+     ["מה מגיע לי?", "דמי אבטלה", "1.20s"]),
+])
+def test_app_renders(states, expected):
+    """Test that the built bundle renders the app's intro and its results"""
+    bundle = build.STATIC_DIR / "assets" / build.hashed_name("app.js", build.bundle("app.js"))
+
+    output = subprocess.run(["node", "-e", RENDER_SCRIPT, str(bundle), json.dumps(states)],
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+
+    texts = json.loads(output)
+    for text in expected:
+        assert text in texts
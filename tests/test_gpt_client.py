@@ -9,6 +9,9 @@ import builtins
 import importlib
 from unittest.mock import patch
 from pathlib import Path
+import re
+from bs4 import BeautifulSoup
+from hypothesis import given, settings, strategies as st
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
 
@@ -28,11 +31,17 @@ class GPTClientSetup:
                 importlib.import_module("webiks_hebrew_ragbot.llm_client").LLMClient,
                 gpt_client_module.GPTClient,
                 gpt_client_module.get_mock_answer,
-                gpt_client_module.llms_client_factory
+                gpt_client_module.llms_client_factory,
+                gpt_client_module.clean_text,
+                gpt_client_module.clean_texts,
+                gpt_client_module.parse_hebrew_text,
+                gpt_client_module.prepare_paragraphs_for_llm
             )
 
 
-Configs, LLMClient, GPTClient, get_mock_answer, llms_client_factory = GPTClientSetup.setup()
+(Configs, LLMClient, GPTClient, get_mock_answer, llms_client_factory,
+ clean_text, clean_texts, parse_hebrew_text, prepare_paragraphs_for_llm) = GPTClientSetup.setup()
+LLMTransport = importlib.import_module("llm_transport").LLMTransport
 
 
 def create_mock_chat_completion(content: str = "Test response") -> ChatCompletion:
@@ -99,6 +108,7 @@ def gpt_client(mock_openai_client, config_class):
         mock_getenv.return_value = "test_api_key"
         client = GPTClient(config_class)
         client.oai_client = mock_openai_client
+        client.transport = LLMTransport(mock_openai_client.chat.completions.create)
         client.field_for_answer = "content"
         return client
 
@@ -126,6 +136,34 @@ def test_create_body(gpt_client):
     assert "מסמך 2: Document 2 content" in body
 
 
+def test_create_body_uses_llm_ready_field(gpt_client):
+    """Test that create_body uses the text trimmed or merged for the prompt, and the raw field for the others"""
+    top_k_docs = [
+        {"content": "<p>Raw 1</p>", "content_llm_ready": "Prepared 1"},
+        {"content": "Raw 2"}
+    ]
+
+    body = gpt_client.create_body("שאלה", top_k_docs)
+
+    assert body == "שאלה: שאלה\nמסמך 1: Prepared 1\nמסמך 2: Raw 2"
+
+
+def test_prepare_paragraphs_for_llm(gpt_client):
+    """Test that ingest stores the token count of the field for the LLM, which goes into the prompt unchanged"""
+    content = "הקצבה היא ₪1,500 לחודש – ראו [סעיף 3] • שעות: 08:00–17:00\nשורה חדשה"
+    paragraphs = [{"doc_id": 1, "content": content}, {"doc_id": 2, "title": "ללא תוכן"}]
+
+    with patch('gpt_client.count_tokens', side_effect=lambda text: len(text.split())), \
+            patch('gpt_client.encoding_name', return_value="o200k_base"):
+        result = prepare_paragraphs_for_llm(paragraphs)
+
+    assert result is paragraphs
+    assert paragraphs[0] == {"doc_id": 1, "content": content, "content_llm_tokens": 13,
+                             "content_llm_tokens_encoding": "o200k_base"}
+    assert paragraphs[1] == {"doc_id": 2, "title": "ללא תוכן"}
+    assert gpt_client.create_body("שאלה", paragraphs[:1]) == f"שאלה: שאלה\nמסמך 1: {content}"
+
+
 def test_answer_normal_mode(gpt_client):
     """Test answer method in normal (non-mock) mode"""
     query = "test question"
@@ -149,7 +187,9 @@ def test_answer_mock_mode():
 
         mock_getenv.side_effect = mock_getenv_func
 
-        client = GPTClient(Mock(spec=Configs))
+        configs = Mock(spec=Configs)
+        configs.get_config.return_value = {"model": "gpt-4o", "system_prompt": "", "user_prompt": ""}
+        client = GPTClient(configs)
         query = "test question"
         top_k_docs = [{"content": "test document"}]
 
@@ -160,6 +200,161 @@ def test_answer_mock_mode():
         assert tokens == 0
 
 
+def test_answer_with_usage_reports_prompt_tokens(gpt_client):
+    """Test that the prompt tokens reported by the API and the packed documents are returned"""
+    answer, elapsed, usage = gpt_client.answer_with_usage("test question", [{"content": "test document"}])
+
+    assert answer == "Test response"
+    assert usage == {"model": "gpt-3.5-turbo", "tokens": 10, "prompt_tokens": 20, "cached_tokens": 0,
+                     "context_docs": 1, "context_tokens_saved": 0}
+
+
+def test_messages_share_a_static_prefix(gpt_client, config_class):
+    """Test that requests open with the same system message and user prompt, and only the body varies"""
+    gpt_client.answer("first question", [{"content": "first document"}])
+    gpt_client.answer("second question", [{"content": "second document"}])
+
+    first, second = [call.kwargs["messages"] for call in gpt_client.oai_client.chat.completions.create.call_args_list]
+    assert first[0] is second[0]
+    assert first[0]["content"][0]["text"] == "You are a helpful assistant"
+    assert first[1]["content"][0] is second[1]["content"][0]
+    assert first[1]["content"][0]["text"] == "Please answer the following question\n"
+    assert first[1]["content"][1]["text"] == "שאלה: first question\nמסמך 1: first document"
+
+
+def test_answer_with_usage_reports_cached_tokens(gpt_client):
+    """Test that the cached prompt tokens reported by the API are returned"""
+    response = create_mock_chat_completion()
+    response.usage = CompletionUsage.model_validate({"completion_tokens": 10, "prompt_tokens": 2000,
+                                                     "total_tokens": 2010,
+                                                     "prompt_tokens_details": {"cached_tokens": 1536}})
+    gpt_client.oai_client.chat.completions.create.return_value = response
+
+    answer, elapsed, usage = gpt_client.answer_with_usage("test question", [{"content": "test document"}])
+
+    assert usage["prompt_tokens"] == 2000
+    assert usage["cached_tokens"] == 1536
+
+
+def test_answer_uses_configured_max_tokens(gpt_client, config_class):
+    """Test that the completion token limit comes from the configuration, and the seed's when unset"""
+    gpt_client.answer("test question", [{"content": "test document"}])
+    config_class.get_config.return_value = {**config_class.get_config.return_value, "max_tokens": "128"}
+    gpt_client.answer("test question", [{"content": "test document"}])
+
+    calls = gpt_client.oai_client.chat.completions.create.call_args_list
+    assert [call.kwargs["max_tokens"] for call in calls] == [512, 128]
+    assert all(call.kwargs["timeout"] > 0 for call in calls)
+
+
+def test_answer_with_model_override(gpt_client):
+    """Test that a model passed by the router replaces the configuration's model"""
+    answer, elapsed, usage = gpt_client.answer_with_usage("test question", [{"content": "test document"}],
+                                                          model="gpt-4o-mini", deadline=5)
+
+    call = gpt_client.oai_client.chat.completions.create.call_args
+    assert call.kwargs["model"] == "gpt-4o-mini"
+    assert call.kwargs["timeout"] <= 5
+    assert usage["model"] == "gpt-4o-mini"
+
+
+ENCODINGS = {"gpt-4o": "o200k_base", "gpt-3.5-turbo-0125": "cl100k_base"}
+
+
+def pack(gpt_client, top_k_docs, max_prompt_tokens, model="gpt-4o"):
+    config = {"model": model, "system_prompt": "system", "user_prompt": "user",
+              "max_prompt_tokens": str(max_prompt_tokens)}
+    # A token per word, with the chat formatting of the static prompt counted as 10 tokens
+    with patch('gpt_client.count_tokens', side_effect=lambda text, model: len(text.split())), \
+            patch('gpt_client.encoding_name', side_effect=ENCODINGS.get), \
+            patch('gpt_client.static_prompt_tokens', return_value=10), \
+            patch('gpt_client.truncate_to_tokens', side_effect=lambda text, n, model: ' '.join(text.split()[:n])):
+        return gpt_client.pack_context("שאלה אחת", top_k_docs, config)
+
+
+def test_pack_context_fits_all_documents(gpt_client):
+    """Test that documents within the budget are packed as they are"""
+    top_k_docs = [{"content": "a b c"},
+                  {"content": "d e f g", "content_llm_tokens": 2, "content_llm_tokens_encoding": "o200k_base"}]
+
+    packed_docs, prompt_tokens = pack(gpt_client, top_k_docs, 1000)
+
+    # 10 static + 3 question + (2 prefix + 3) + (2 prefix + 2 counted at ingest)
+    assert packed_docs == top_k_docs
+    assert prompt_tokens == 22
+
+
+def test_pack_context_recounts_for_another_encoding(gpt_client):
+    """Test that a count stored at ingest with another encoding than the model's isn't used"""
+    top_k_docs = [{"content": "d e f g", "content_llm_tokens": 2, "content_llm_tokens_encoding": "o200k_base"},
+                  {"content": "h i j", "content_llm_tokens": 1}]
+
+    _, prompt_tokens = pack(gpt_client, top_k_docs, 1000, model="gpt-3.5-turbo-0125")
+
+    # 10 static + 3 question + (2 prefix + 4) + (2 prefix + 3), both recounted
+    assert prompt_tokens == 24
+
+
+def test_pack_context_trims_and_drops_lowest_ranked(gpt_client):
+    """Test that the document that overflows the budget is trimmed and lower-ranked documents are dropped"""
+    top_k_docs = [{"content": "a b c"}, {"content": " ".join(["word"] * 200)}, {"content": "x y"}]
+
+    packed_docs, prompt_tokens = pack(gpt_client, top_k_docs, 100)
+
+    assert len(packed_docs) == 2
+    assert packed_docs[0] is top_k_docs[0]
+    assert packed_docs[1]["content_llm_ready"] == " ".join(["word"] * 80)
+    assert prompt_tokens == 100
+
+
+def test_pack_context_drops_short_remainder(gpt_client):
+    """Test that a document is dropped rather than trimmed to a few tokens"""
+    top_k_docs = [{"content": " ".join(["word"] * 60)}, {"content": " ".join(["word"] * 60)}]
+
+    packed_docs, prompt_tokens = pack(gpt_client, top_k_docs, 100)
+
+    assert packed_docs == top_k_docs[:1]
+    assert prompt_tokens == 75
+
+
+def consolidate(gpt_client, top_k_docs, threshold="0.8"):
+    config = {"model": "gpt-4o", "context_duplicate_threshold": threshold}
+    return gpt_client.consolidate_context(top_k_docs, config)
+
+
+def test_consolidate_context_drops_near_duplicates(gpt_client):
+    """Test that a document repeating a higher-ranked one's text is dropped and its tokens are counted as saved"""
+    top_k_docs = [
+        {"doc_id": 1, "content": "דמי אבטלה משולמים למי שפוטר מעבודתו ועבד לפחות שנה"},
+        {"doc_id": 2, "content": "מענק לימודים לסטודנטים"},
+        {"doc_id": 3, "content": "דמי אבטלה משולמים למי שפוטר מעבודתו"},
+    ]
+
+    docs, saved_tokens = consolidate(gpt_client, top_k_docs)
+
+    assert [doc["doc_id"] for doc in docs] == [1, 2]
+    assert saved_tokens > 0
+    assert consolidate(gpt_client, top_k_docs, threshold="0") == (top_k_docs, 0)
+
+
+def test_consolidate_context_merges_paragraphs_of_a_document(gpt_client):
+    """Test that the paragraphs of a document become one entry at the rank of its first paragraph"""
+    top_k_docs = [
+        {"doc_id": 1, "content": "פסקה ראשונה של המסמך", "content_llm_tokens": 4,
+         "content_llm_tokens_encoding": "o200k_base"},
+        {"doc_id": 2, "content": "מסמך אחר לגמרי"},
+        {"doc_id": 1, "content": "פסקה שנייה של אותו מסמך"},
+    ]
+
+    docs, saved_tokens = consolidate(gpt_client, top_k_docs)
+
+    assert [doc["doc_id"] for doc in docs] == [1, 2]
+    assert docs[0]["content_llm_ready"] == "פסקה ראשונה של המסמך\nפסקה שנייה של אותו מסמך"
+    assert "content_llm_tokens" not in docs[0] and "content_llm_tokens_encoding" not in docs[0]
+    assert saved_tokens > 0
+    assert gpt_client.create_body("שאלה", docs).count("מסמך 1:") == 1
+
+
 def test_get_mock_answer():
     """Test get_mock_answer function"""
     top_k_docs = [{"content": "test document"}]
@@ -171,6 +366,19 @@ def test_get_mock_answer():
     assert tokens == 0
 
 
+def test_get_mock_answer_simulates_latency():
+    """Test that the mock answer simulates the configured latency and token rate"""
+    with patch('gpt_client.MOCK_LLM_LATENCY_SECS', 0.5), \
+            patch('gpt_client.MOCK_LLM_TOKENS', 100), \
+            patch('gpt_client.MOCK_LLM_TOKENS_PER_SEC', 50.0), \
+            patch('time.sleep') as mock_sleep:
+        answer, elapsed, tokens = get_mock_answer([{"content": "test document"}])
+
+    mock_sleep.assert_called_once_with(2.5)
+    assert elapsed == 2.5
+    assert tokens == 100
+
+
 def test_llms_client_factory_singleton(config_class):
     """Test that llms_client_factory maintains singleton pattern"""
     with patch('os.getenv') as mock_getenv:
@@ -197,3 +405,68 @@ def test_create_body_with_different_docs(gpt_client, top_k_docs, expected_contai
     if expected_contains:
         assert expected_contains in body
     assert "שאלה: test" in body
+
+
+def reference_parse_hebrew_text(characters):
+    """The original per-character implementation of parse_hebrew_text"""
+    parsed_text = []
+    temp_word = []
+    for char in characters:
+        if char.isalpha() or char == ' ':
+            temp_word.append(char)
+        else:
+            if temp_word:
+                parsed_text.append(''.join(temp_word).strip())
+                temp_word = []
+            if char.strip():
+                parsed_text.append(char)
+    if temp_word:
+        parsed_text.append(''.join(temp_word).strip())
+    return ''.join(parsed_text).split(', ')
+
+
+def reference_clean_text(input_text):
+    """The original implementation of clean_text, parsing every input as HTML"""
+    text = BeautifulSoup(input_text, 'html.parser').get_text(separator='\n')
+    cleaned_text = re.sub(r'[^\u0590-\u05FFa-zA-Z0-9\s.,!?"\'():;״׳;@:\-()_=+%/\n]+', '', ' '.join(text.split()))
+    return re.sub(r'\s+', ' ', cleaned_text).strip()
+
+
+texts = st.one_of(
+    st.text(),
+    st.text(alphabet=st.sampled_from(list("אבגדהוזחטיכלמנסעפצקרשת ְִַָּabcXYZ019 \t\n\r\xa0\u2003,.;:-'\"?!()%/_׳״½²٣✓—<>&#/=")),
+            max_size=200),
+    st.lists(st.sampled_from(["<p>", "</p>", "<b>", "</b>", "<br/>", "<a href=\"/he/דף\">", "</a>", "&nbsp;",
+                              "&amp;", "&lt;", "&#1488;", "&quot;", "<!-- הערה -->", "<script>x</script>",
+                              "דמי אבטלה", " , ", "\n", "Kol Zchut", "12.5%", " "]),
+             max_size=30).map(''.join),
+)
+
+
+@settings(max_examples=500)
+@given(texts)
+def test_parse_hebrew_text_matches_reference(text):
+    """Test that parse_hebrew_text is identical to the per-character implementation"""
+    assert parse_hebrew_text(text) == reference_parse_hebrew_text(text)
+
+
+@settings(max_examples=500)
+@given(texts)
+def test_clean_text_matches_reference(text):
+    """Test that clean_text, with or without markup, is identical to parsing every input as HTML"""
+    assert clean_text(text) == reference_clean_text(text)
+
+
+def test_clean_text_strips_markup_and_symbols():
+    """Test cleaning an HTML paragraph"""
+    html = "<p>דמי <b>אבטלה</b> &amp; מענק ✓</p>\n<p>Kol  Zchut</p>"
+
+    assert clean_text(html) == "דמי אבטלה מענק Kol Zchut"
+    assert clean_texts([html, "  שלום  עולם ✓ "]) == ["דמי אבטלה מענק Kol Zchut", "שלום עולם"]
+
+
+def test_mock_answer_honours_deadline():
+    """Test that the mock gives up like the real client when its latency exceeds the deadline"""
+    with patch('gpt_client.MOCK_LLM_LATENCY_SECS', 0.05), \
+            pytest.raises(importlib.import_module("llm_transport").DeadlineExceeded):
+        get_mock_answer([], deadline=0.01)
@@ -1,9 +1,10 @@
 import pytest
 from unittest.mock import Mock, patch
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
 import sys
 import importlib
+from prometheus_client import REGISTRY
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
 
@@ -20,6 +21,7 @@ class IMSetup:
 
 
 InteractionsModel, factory, get_current_index_name = IMSetup.setup()
+interactions_model_module = importlib.import_module("interactions_model")
 
 
 @pytest.fixture
@@ -168,3 +170,144 @@ class TestSaveInteraction:
             interactions_model.save_interaction(test_interaction)
 
             mock_thread.assert_not_called()
+
+
+    def test_queue_depth_by_endpoint(self, interactions_model):
+        """Test that the queue depth is measured per endpoint, until the interaction is written"""
+        labels = {'endpoint': 'search_batch'}
+        interactions_model.queue.clear()
+        interactions_model.queued_endpoints.clear()
+        interactions_model.poll_queue = True
+        before = REGISTRY.get_sample_value('ragbot_interaction_queue_depth', labels) or 0
+
+        interactions_model.save_interaction({'interaction_type': 'search'}, "search_batch")
+        assert REGISTRY.get_sample_value('ragbot_interaction_queue_depth', labels) == before + 1
+
+        def stop_after_one_sleep(*args):
+            interactions_model.poll_queue = False
+
+        interactions_model.next_maintenance = float("inf")
+        with patch('time.sleep', side_effect=stop_after_one_sleep):
+            interactions_model.handle_queue()
+
+        assert REGISTRY.get_sample_value('ragbot_interaction_queue_depth', labels) == before
+        assert interactions_model.queued_endpoints == {}
+
+
+class TestHandleQueueFailures:
+    def test_failed_save_stays_queued(self, interactions_model):
+        """Test that an interaction that fails to save is retried rather than lost"""
+        circuit_breaker = importlib.import_module("circuit_breaker")
+        circuit_breaker.breakers.clear()
+        test_interaction = {'interaction_type': 'question', 'content': 'test question'}
+        interactions_model.queue.clear()
+        interactions_model.queue.append(test_interaction)
+        interactions_model.poll_queue = True
+        interactions_model.es_client.index.side_effect = [ConnectionError("down"), None]
+        sleeps = []
+
+        def stop_after_retry(*args):
+            sleeps.append(args)
+            if len(sleeps) == 2:
+                interactions_model.poll_queue = False
+
+        with patch('time.sleep', side_effect=stop_after_retry):
+            interactions_model.handle_queue()
+
+        assert interactions_model.es_client.index.call_count == 2
+        assert len(interactions_model.queue) == 0
+
+    def test_open_circuit_keeps_interaction_queued(self, interactions_model):
+        """Test that interactions wait while the Elasticsearch writes circuit is open"""
+        circuit_breaker = importlib.import_module("circuit_breaker")
+        circuit_breaker.breakers.clear()
+        circuit_breaker.factory("es_write").transition(circuit_breaker.OPEN)
+        interactions_model.queue.clear()
+        interactions_model.queue.append({'interaction_type': 'question', 'content': 'test question'})
+        interactions_model.poll_queue = True
+
+        def stop_after_one_sleep(*args):
+            interactions_model.poll_queue = False
+
+        with patch('time.sleep', side_effect=stop_after_one_sleep):
+            interactions_model.handle_queue()
+
+        interactions_model.es_client.index.assert_not_called()
+        assert len(interactions_model.queue) == 1
+        interactions_model.queue.clear()
+        circuit_breaker.breakers.clear()
+
+
+class TestIndexRollover:
+    def test_index_name_has_iso_year_and_week(self):
+        """Test that the same week number of different years gets different indices"""
+        assert get_current_index_name(datetime(2024, 3, 20)) == "conversations_2024_12"
+        assert get_current_index_name(datetime(2025, 3, 19)) == "conversations_2025_12"
+        assert get_current_index_name(datetime(2021, 1, 2)) == "conversations_2020_53"
+
+    def test_save_makes_no_metadata_calls(self, interactions_model):
+        """Test that saving within the week doesn't check the index exists, and rolling over creates it once"""
+        interactions_model.do_save_interaction({'type': 'test'})
+        interactions_model.do_save_interaction({'type': 'test'})
+
+        interactions_model.es_client.indices.exists.assert_not_called()
+        assert interactions_model.es_client.index.call_args[1]['index'] == get_current_index_name()
+
+        interactions_model.current_index = "conversations_2020_53"
+        interactions_model.es_client.indices.exists.return_value = False
+        interactions_model.do_save_interaction({'type': 'test'})
+        interactions_model.do_save_interaction({'type': 'test'})
+
+        interactions_model.es_client.indices.create.assert_called_once_with(index=get_current_index_name())
+        assert interactions_model.current_index == get_current_index_name()
+
+    def test_maintain_indices(self, interactions_model):
+        """Test that ended weeks are compacted once, expired ones deleted, and the current and legacy ones kept"""
+        es_client = interactions_model.es_client
+        es_client.indices.get.return_value = {
+            "conversations_2024_12": {},
+            "conversations_2024_11": {},
+            "conversations_2024_10": {"settings": {"index": {"blocks": {"write": "true"}}}},
+            "conversations_2024_08": {},
+            "conversations_11": {},
+        }
+
+        with patch.object(interactions_model_module, "CONVERSATIONS_RETENTION_WEEKS", 2):
+            interactions_model.maintain_indices(datetime(2024, 3, 20, tzinfo=timezone.utc))
+
+        es_client.indices.delete.assert_called_once_with(index="conversations_2024_08")
+        es_client.indices.put_settings.assert_called_once_with(index="conversations_2024_11",
+                                                               settings={"index.blocks.write": True})
+        es_client.indices.forcemerge.assert_called_once_with(index="conversations_2024_11", max_num_segments=1,
+                                                             wait_for_completion=False)
+
+    def test_maintain_indices_continues_after_a_failure(self, interactions_model):
+        """Test that an index that fails to be maintained, or has an invalid week, doesn't stop the others"""
+        es_client = interactions_model.es_client
+        es_client.indices.get.return_value = {"conversations_2024_00": {}, "conversations_2024_08": {},
+                                              "conversations_2024_09": {}}
+        es_client.indices.delete.side_effect = [RuntimeError("index_not_found_exception"), None]
+
+        with patch.object(interactions_model_module, "CONVERSATIONS_RETENTION_WEEKS", 1):
+            interactions_model.maintain_indices(datetime(2024, 3, 20, tzinfo=timezone.utc))
+
+        assert [call.kwargs["index"] for call in es_client.indices.delete.call_args_list] == \
+            ["conversations_2024_08", "conversations_2024_09"]
+
+    def test_rating_looks_up_recent_weeks(self, interactions_model):
+        """Test that a rated conversation is looked up in this week's and last week's indices only"""
+        interactions_model.queue.clear()
+        interactions_model.queue.append({'interaction_type': 'rating', 'conversation_id': 'abc'})
+        interactions_model.poll_queue = True
+        interactions_model.next_maintenance = float("inf")
+
+        def stop_after_one_sleep(*args):
+            interactions_model.poll_queue = False
+
+        with patch('time.sleep', side_effect=stop_after_one_sleep):
+            interactions_model.handle_queue()
+
+        now = datetime.now(timezone.utc)
+        assert interactions_model.es_client.count.call_args.kwargs["index"] == \
+            f"{get_current_index_name(now)},{get_current_index_name(now - timedelta(weeks=1))}"
+        interactions_model.es_client.index.assert_called_once()
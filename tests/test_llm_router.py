@@ -0,0 +1,163 @@
+import pytest
+from unittest.mock import Mock, patch
+import sys
+import os
+import builtins
+import importlib
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+project_root = Path(__file__).parent.parent
+fake_config_path = project_root / "example-conf.json"
+
+
+class LLMRouterSetup:
+    @staticmethod
+    def setup():
+        with patch.dict(os.environ, {"DOCUMENT_DEFINITION_CONFIG": str(fake_config_path)}), \
+                patch.object(builtins, "open", create=True) as mock_open:
+            mock_open.return_value.__enter__.return_value.read.return_value = "{\"identifier_field\": \"doc_id\", \"saved_fields\": {\"title\": \"text\", \"doc_id\": \"integer\", \"link\": \"text\", \"content\": \"text\"}, \"field_for_llm\": \"content\", \"model_name\": \"Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1.0\", \"field_to_embed\": \"content\"}"
+            llm_router_module = importlib.import_module("llm_router")
+            return (
+                llm_router_module.LLMBackend,
+                llm_router_module.LLMRouter,
+                llm_router_module.create_backends,
+                importlib.import_module("llm_transport").DeadlineExceeded
+            )
+
+
+LLMBackend, LLMRouter, create_backends, DeadlineExceeded = LLMRouterSetup.setup()
+
+DOCS = [{"content": "מסמך"}]
+
+
+def fake_client(model, error=None):
+    client = Mock()
+    if error is not None:
+        client.answer_with_usage.side_effect = error
+    else:
+        client.answer_with_usage.return_value = (f"answer of {model}", 0.1, {"model": model, "tokens": 5})
+    return client
+
+
+def backend(name, latency=None, error=None, fallback=False):
+    llm_backend = LLMBackend(name, fake_client(name, error), model=name, fallback=fallback)
+    if latency is not None:
+        llm_backend.record(True, latency)
+    return llm_backend
+
+
+def test_routes_to_fastest_backend():
+    """Test that the backend with the lowest moving average latency answers"""
+    router = LLMRouter([backend("slow", latency=2.0), backend("fast", latency=0.5)], explore_rate=0)
+
+    answer, elapsed, usage = router.answer_with_usage("שאלה", DOCS)
+
+    assert answer == "answer of fast"
+    assert usage["model"] == "fast"
+    router.backends[1].client.answer_with_usage.assert_called_once()
+    assert router.backends[1].client.answer_with_usage.call_args.kwargs["model"] == "fast"
+    router.backends[0].client.answer_with_usage.assert_not_called()
+
+
+def test_untried_backend_is_measured_first():
+    """Test that a backend without latency samples is tried before measured ones"""
+    router = LLMRouter([backend("measured", latency=0.5), backend("new")], explore_rate=0)
+
+    assert [llm_backend.name for llm_backend in router.ranked()] == ["new", "measured"]
+
+
+def test_backend_without_successes_ranks_after_measured():
+    """Test that a backend whose few calls all failed isn't ranked ahead of a working one as if it had no latency"""
+    failing = backend("failing")
+    failing.record(False, 0.0)
+    router = LLMRouter([failing, backend("measured", latency=0.5), backend("new")], explore_rate=0)
+
+    assert [llm_backend.name for llm_backend in router.ranked()] == ["new", "measured", "failing"]
+
+
+def test_falls_back_when_backend_fails():
+    """Test that a failing backend is recorded and the next one answers"""
+    failing = backend("failing", latency=0.1, error=RuntimeError("down"))
+    router = LLMRouter([failing, backend("healthy", latency=1.0)], explore_rate=0)
+
+    answer, elapsed, usage = router.answer_with_usage("שאלה", DOCS)
+
+    assert usage["model"] == "healthy"
+    assert list(failing.outcomes) == [True, False]
+
+
+def test_unhealthy_backend_ranks_after_fallback_until_cooldown():
+    """Test that a backend with a high error rate is tried last until its cooldown passes"""
+    flaky = backend("flaky", latency=0.1)
+    for _ in range(3):
+        flaky.record(False, 0.1)
+    router = LLMRouter([flaky, backend("mock", fallback=True), backend("slow", latency=3.0)],
+                       cooldown=60, explore_rate=0)
+
+    assert [llm_backend.name for llm_backend in router.ranked()] == ["slow", "mock", "flaky"]
+
+    router.cooldown = 0
+    assert [llm_backend.name for llm_backend in router.ranked()] == ["flaky", "slow", "mock"]
+
+
+def test_raises_last_error_when_all_backends_fail():
+    """Test that the last backend's failure is raised when no backend answers"""
+    router = LLMRouter([backend("a", error=RuntimeError("a down")), backend("b", error=ValueError("b down"))],
+                       explore_rate=0)
+
+    with pytest.raises(ValueError):
+        router.answer_with_usage("שאלה", DOCS)
+
+
+def test_deadline_is_shared_by_attempts():
+    """Test that each backend gets the time left before the router's deadline"""
+    router = LLMRouter([backend("a", error=RuntimeError("down")), backend("b")], deadline=5, explore_rate=0)
+
+    router.answer_with_usage("שאלה", DOCS)
+
+    first, second = [llm_backend.client.answer_with_usage.call_args.kwargs["deadline"]
+                     for llm_backend in router.backends]
+    assert 0 < second <= first <= 5
+
+
+def test_no_attempt_after_deadline():
+    """Test that DeadlineExceeded is raised if the deadline passed before any backend was tried"""
+    router = LLMRouter([backend("a")], deadline=0)
+
+    with pytest.raises(DeadlineExceeded):
+        router.answer_with_usage("שאלה", DOCS)
+
+
+def test_answer_returns_tokens():
+    """Test the LLMClient interface used by the engine"""
+    router = LLMRouter([backend("a")])
+
+    answer, elapsed, tokens = router.answer("שאלה", DOCS)
+
+    assert answer == "answer of a"
+    assert tokens == 5
+
+
+def test_create_backends():
+    """Test that backends of a provider share a client and the mock is the fallback"""
+    with patch('llm_router.GPTClient') as mock_gpt_client, patch.dict(os.environ, {"IS_MOCK_GPT_CLIENT": "true"}):
+        backends = create_backends(Mock(), ["openai", "openai:gpt-4o-mini", "mock"])
+
+    assert [(b.name, b.model, b.fallback) for b in backends] == [
+        ("openai", None, False), ("openai:gpt-4o-mini", "gpt-4o-mini", False), ("mock", "mock", True)]
+    assert backends[0].client is backends[1].client
+    assert mock_gpt_client.call_args_list[1].kwargs == {"is_mock_client": True}
+
+
+def test_create_backends_rejects_mock_outside_tests():
+    """Test that the mock backend, which answers with a dump of the documents, needs IS_MOCK_GPT_CLIENT"""
+    with patch('llm_router.GPTClient'), patch.dict(os.environ, {"IS_MOCK_GPT_CLIENT": "false"}), \
+            pytest.raises(ValueError, match="IS_MOCK_GPT_CLIENT"):
+        create_backends(Mock(), ["openai", "mock"])
+
+
+def test_create_backends_rejects_unknown_provider():
+    with pytest.raises(ValueError):
+        create_backends(Mock(), ["anthropic:some-model"])
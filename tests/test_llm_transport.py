@@ -0,0 +1,137 @@
+import time
+import sys
+import os
+from unittest.mock import Mock
+import httpx
+import openai
+import pytest
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+from llm_transport import DeadlineExceeded, LatencyWindow, LLMTransport, create_http_client
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def server_error(headers=None):
+    return openai.InternalServerError("server error", response=httpx.Response(500, request=REQUEST, headers=headers),
+                                      body=None)
+
+
+def bad_request():
+    return openai.BadRequestError("bad request", response=httpx.Response(400, request=REQUEST), body=None)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_create_http_client_sizes_pool():
+    """Test that the pool holds a connection per concurrent call, two when hedging"""
+    assert create_http_client(pool_size=4, hedging=False)._transport._pool._max_connections == 4
+    assert create_http_client(pool_size=4, hedging=True)._transport._pool._max_connections == 8
+
+
+def test_complete_passes_deadline_as_timeout():
+    """Test that the request gets the time left before the deadline as its timeout"""
+    create = Mock(return_value="response")
+    transport = LLMTransport(create, deadline=10, max_retries=0)
+
+    assert transport.complete(model="some-model", max_tokens=128) == "response"
+    assert 0 < create.call_args.kwargs["timeout"] <= 10
+    assert create.call_args.kwargs["max_tokens"] == 128
+
+
+def test_complete_retries_transient_failures():
+    """Test that server errors are retried and counted"""
+    create = Mock(side_effect=[server_error(), server_error(), "response"])
+    transport = LLMTransport(create, deadline=10, max_retries=2, backoff=0.001)
+    before = sample("ragbot_llm_retries_total", model="retry-model", reason="InternalServerError")
+
+    assert transport.complete(model="retry-model") == "response"
+    assert create.call_count == 3
+    assert sample("ragbot_llm_retries_total", model="retry-model", reason="InternalServerError") - before == 2
+
+
+def test_complete_gives_up_after_max_retries():
+    """Test that the last failure is raised once the retries run out"""
+    create = Mock(side_effect=server_error())
+    transport = LLMTransport(create, deadline=10, max_retries=1, backoff=0.001)
+
+    with pytest.raises(openai.InternalServerError):
+        transport.complete(model="some-model")
+    assert create.call_count == 2
+
+
+def test_complete_does_not_retry_client_errors():
+    """Test that a bad request fails immediately"""
+    create = Mock(side_effect=bad_request())
+    transport = LLMTransport(create, deadline=10, max_retries=2, backoff=0.001)
+
+    with pytest.raises(openai.BadRequestError):
+        transport.complete(model="some-model")
+    assert create.call_count == 1
+
+
+def test_complete_does_not_retry_past_deadline():
+    """Test that a Retry-After beyond the deadline isn't waited for"""
+    create = Mock(side_effect=server_error(headers={"retry-after": "30"}))
+    transport = LLMTransport(create, deadline=1, max_retries=2, backoff=0.001)
+
+    before_call = time.perf_counter()
+    with pytest.raises(openai.InternalServerError):
+        transport.complete(model="some-model")
+    assert create.call_count == 1
+    assert time.perf_counter() - before_call < 1
+
+
+def test_complete_raises_deadline_exceeded_on_timeout():
+    """Test that a timeout with no time left for a retry raises DeadlineExceeded"""
+    create = Mock(side_effect=openai.APITimeoutError(request=REQUEST))
+    transport = LLMTransport(create, deadline=10, max_retries=0)
+
+    with pytest.raises(DeadlineExceeded):
+        transport.complete(model="some-model")
+
+
+def test_latency_window_percentile():
+    """Test the percentile of recent latencies, None until enough samples"""
+    window = LatencyWindow(size=100)
+    for latency in range(1, 101):
+        window.add(latency / 100)
+
+    assert window.percentile(90, min_samples=100) == 0.91
+    assert window.percentile(90, min_samples=101) is None
+
+
+def test_slow_request_is_hedged():
+    """Test that a request slower than the latency percentile is raced against a hedged request"""
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        time.sleep(1 if len(calls) == 1 else 0.01)
+        return f"response {len(calls)}"
+
+    transport = LLMTransport(create, deadline=10, max_retries=0, hedge_percentile=95, pool_size=2)
+    for _ in range(20):
+        transport.latencies.add(0.05)
+    before = sample("ragbot_llm_hedges_total", model="hedge-model", winner="hedge")
+
+    before_call = time.perf_counter()
+    assert transport.complete(model="hedge-model") == "response 2"
+    assert time.perf_counter() - before_call < 0.5
+    assert len(calls) == 2
+    assert sample("ragbot_llm_hedges_total", model="hedge-model", winner="hedge") - before == 1
+
+
+def test_fast_request_is_not_hedged():
+    """Test that a request faster than the latency percentile is sent once"""
+    create = Mock(return_value="response")
+    transport = LLMTransport(create, deadline=10, max_retries=0, hedge_percentile=95, pool_size=2)
+    for _ in range(20):
+        transport.latencies.add(1.0)
+
+    assert transport.complete(model="some-model") == "response"
+    assert create.call_count == 1
@@ -8,6 +8,9 @@ from fastapi.testclient import TestClient
 import sys
 import json
 from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+import time
+from prometheus_client import REGISTRY
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
 
@@ -40,13 +43,10 @@ class MainSetup:
             mock_llm_client = mocker.patch('webiks_hebrew_ragbot.llm_client.LLMClient')
             mock_llm_client_instance = mock_llm_client.return_value
             mock_es_model_instance = mock_es_client()
-            with patch('get_es_client.factory', return_value=mock_es_client()), \
-                    patch('saved_config.Configs.get_config', return_value=mock_saved_configurations), \
-                    patch('webiks_hebrew_ragbot.engine.engine_factory', return_value=MagicMock()):
-                main_module = importlib.import_module("main")
-                app = main_module.app
-                engine = MagicMock()
-                return app, engine, mock_es_model_instance, mock_llm_client_instance
+            main_module = importlib.import_module("main")
+            app = main_module.app
+            engine = MagicMock()
+            return app, engine, mock_es_model_instance, mock_llm_client_instance
 
 
 def mock_es_client():
@@ -62,10 +62,28 @@ def mock_es_client():
 @pytest.fixture(scope="function")
 def mock_dependencies(mocker):
     app, engine, mock_es_model_instance, mock_llm_client_instance = MainSetup.setup(mocker)
+    importlib.import_module("circuit_breaker").breakers.clear()
 
-    client = TestClient(app)
+    with patch('get_es_client.factory', return_value=mock_es_model_instance), \
+            patch('saved_config.Configs.get_config', return_value=mock_saved_configurations), \
+            patch('main.load_retrieval_model', return_value=MagicMock()), \
+            patch('main.create_engine', return_value=engine), \
+            TestClient(app) as client:
+        yield client, engine, mock_es_model_instance, mock_llm_client_instance
 
-    return client, engine, mock_es_model_instance, mock_llm_client_instance
+
+def test_startup_creates_dependencies(mock_dependencies):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+    main_module = importlib.import_module("main")
+    startup_module = importlib.import_module("startup")
+
+    assert main_module.engine is engine
+    assert main_module.configs is not None
+    assert main_module.gpt_client is not None
+    assert main_module.updater_service is not None
+    assert main_module.interactions_model is not None
+    for phase in ["wait_for_es", "configs", "llm_client", "interactions_model", "retrieval_model", "engine"]:
+        assert phase in startup_module.startup_timings
 
 
 def test_healthcheck(mock_dependencies):
@@ -84,6 +102,7 @@ def test_healthcheck(mock_dependencies):
     response = client.get("/health")
 
     assert response.status_code == HTTPStatus.OK
+    assert response.json()["circuits"] == {"es_search": "closed", "es_write": "closed", "llm": "closed"}
 
 
 def test_get_conf(mock_dependencies):
@@ -131,8 +150,7 @@ def test_search(mock_dependencies, mocker):
         "asked_from": "test"
     }
 
-    mock_engine_answer = (
-        [
+    mock_top_k_documents = [
             {
                 'last_update': '2025-02-11T17:15:55.092530',
                 'doc_id': 1,
@@ -160,18 +178,14 @@ def test_search(mock_dependencies, mocker):
                 'content_Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1.0_vectors': [0.021454483, -0.016907433],
                 '_len_': 6
             },
-        ],
-        "שאלה לדוגמא",
-        {
-            'llm_model': 'gpt-4o-2024-08-06',
-            'llm_time': 11.0133,
-            'retrieval_time': 2.2592,
-            'tokens': 381,
-            '_len_': 4
-        }
-    )
+        ]
 
-    mock_answer_query = mocker.patch('main.engine.answer_query', return_value=mock_engine_answer)
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_search_documents = mocker.patch('main.engine.search_documents', return_value=mock_top_k_documents)
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "שאלה לדוגמא", 11.0133,
+        {"model": "some-model", "tokens": 381, "prompt_tokens": 1200, "cached_tokens": 1024, "context_docs": 3,
+         "context_tokens_saved": 42}))
 
     mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
 
@@ -179,6 +193,7 @@ def test_search(mock_dependencies, mocker):
         "conversation_id": "some-uuid-generated-by-uuid4",
         "interaction_type": "search",
         "llm_result": "שאלה לדוגמא",
+        "degraded": False,
         "docs": [
             {
                 "id": 1,
@@ -204,10 +219,15 @@ def test_search(mock_dependencies, mocker):
         "question": "שאלה לדוגמא",
         "asked_from": "test",
         "metadata": {
-            "llm_model": "gpt-4o-2024-08-06",
+            "llm_model": "some-model",
             "llm_time": 11.0133,
-            "retrieval_time": 2.2592,
-            "tokens": 381
+            "retrieval_time": ANY,
+            "tokens": 381,
+            "prompt_tokens": 1200,
+            "cached_tokens": 1024,
+            "context_docs": 3,
+            "context_tokens_saved": 42,
+            "coalesced": False
         }
     }
 
@@ -216,14 +236,71 @@ def test_search(mock_dependencies, mocker):
 
     json_response = response.json()
     assert json_response == expected_result
+    assert isinstance(json_response["metadata"]["retrieval_time"], float)
 
     mock_get_config.assert_called_once()
-    mock_answer_query.assert_called_once_with(
+    mock_search_documents.assert_called_once_with(
         "שאלה לדוגמא",
-        3,
-        "some-model"
+        3
     )
-    mock_save_interaction.assert_called_once_with(expected_result)
+    mock_llm_answer.assert_called_once_with("שאלה לדוגמא", [
+        {field: value for field, value in doc.items() if not field.endswith("_vectors")}
+        for doc in mock_top_k_documents
+    ], deadline=20.0)
+    mock_save_interaction.assert_called_once_with(expected_result, "search")
+
+
+def test_search_uses_retrieval_cache(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.1,
+        {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0, "context_docs": 1}))
+    mock_search_documents = mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+
+    client.post("/search", json={"query": "שאלה  לדוגמא", "asked_from": "test"})
+    client.post("/search", json={"query": "שאלה לדוגמא ", "asked_from": "test"})
+    assert mock_search_documents.call_count == 1
+
+    mocker.patch('main.updater_service.remove_nth_doc', return_value=True)
+    response = client.delete("/delete_doc", params={"doc_id": "1", "obj_id": "1"})
+    assert response.status_code == HTTPStatus.OK
+
+    client.post("/search", json={"query": "שאלה לדוגמא", "asked_from": "test"})
+    assert mock_search_documents.call_count == 2
+
+
+def test_metrics(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 7, "num_of_pages": 1, "model": "metrics-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.5,
+        {"model": "metrics-model", "tokens": 42, "prompt_tokens": 420, "cached_tokens": 0, "context_docs": 1}))
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+
+    client.post("/search", json={"query": "שאלה למדדים", "asked_from": "test"})
+    response = client.get("/metrics")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'ragbot_request_seconds_count{endpoint="search"}' in response.text
+    assert 'ragbot_interaction_queue_depth' in response.text
+    assert REGISTRY.get_sample_value("ragbot_llm_seconds_count",
+                                     {"endpoint": "search", "model": "metrics-model"}) >= 1
+    assert REGISTRY.get_sample_value("ragbot_llm_tokens_total",
+                                     {"endpoint": "search", "model": "metrics-model", "config_version": "7"}) == 42
+    assert REGISTRY.get_sample_value("ragbot_llm_prompt_tokens_total",
+                                     {"endpoint": "search", "model": "metrics-model", "config_version": "7"}) == 420
 
 
 def test_operate_docs(mock_dependencies, mocker):
@@ -321,3 +398,264 @@ def test_operate_docs_error(mock_dependencies, mocker):
 
     response = client.post("/operate_docs", json=request)
     assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def test_search_coalesces_identical_questions(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+
+    def slow_answer(query, top_k_docs, deadline):
+        time.sleep(0.5)
+        return "תשובה", 0.5, {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0,
+                             "context_docs": 1}
+
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage', side_effect=slow_answer)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        responses = list(executor.map(
+            lambda query: client.post("/search", json={"query": query, "asked_from": "test"}),
+            ["שאלה לדוגמא", "שאלה  לדוגמא "]))
+
+    bodies = [response.json() for response in responses]
+    assert mock_llm_answer.call_count == 1
+    assert sorted(body["metadata"]["coalesced"] for body in bodies) == [False, True]
+    assert bodies[0]["conversation_id"] != bodies[1]["conversation_id"]
+    assert [body["llm_result"] for body in bodies] == ["תשובה", "תשובה"]
+    assert mock_save_interaction.call_count == 2
+
+
+def test_search_rejected_when_saturated(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+    admission = importlib.import_module("admission")
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    saturated = admission.AdmissionController("search", max_concurrent=1, max_queue=0, max_queue_per_client=1)
+    saturated.active = 1
+    mocker.patch('main.search_admission', saturated)
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+
+    response = client.post("/search", json={"query": "שאלה נדחית", "asked_from": "test"})
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert int(response.headers["Retry-After"]) >= 1
+    mock_save_interaction.assert_not_called()
+
+
+@pytest.mark.parametrize("error, reason", [(TimeoutError("too slow"), "llm_deadline"), (RuntimeError("down"), "llm_error")])
+def test_search_degrades_to_documents_when_llm_fails(mock_dependencies, mocker, error, reason):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model",
+                                                          "llm_deadline_secs": "2.5"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage', side_effect=error)
+
+    response = client.post("/search", json={"query": "שאלה בלי תשובה", "asked_from": "test"})
+
+    assert response.status_code == HTTPStatus.OK
+    body = response.json()
+    assert body["degraded"] is True
+    assert body["llm_result"] is None
+    assert body["docs"] == [{"id": 1, "title": "כותרת", "link": "https://example.com/sample", "content": "תוכן"}]
+    assert body["metadata"]["degraded_reason"] == reason
+    assert mock_llm_answer.call_args.kwargs["deadline"] == 2.5
+    mock_save_interaction.assert_called_once_with(body, "search")
+
+
+def test_search_degrades_when_llm_circuit_is_open(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+    circuit_breaker = importlib.import_module("circuit_breaker")
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage')
+    circuit_breaker.factory("llm").transition(circuit_breaker.OPEN)
+
+    response = client.post("/search", json={"query": "שאלה במעגל פתוח", "asked_from": "test"})
+
+    assert response.json()["metadata"]["degraded_reason"] == "llm_circuit_open"
+    mock_llm_answer.assert_not_called()
+    assert client.get("/health").json()["circuits"]["llm"] == "open"
+
+
+def test_retrieve(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 2, "model": "some-model"})
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage')
+    mock_retrieve = mocker.patch('main.retrieval.retrieve', return_value=(
+        [{"docs": [{'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן',
+                    'score': 1.8}]}],
+        {"embedding_time": 0.01, "search_time": 0.02}))
+
+    response = client.post("/retrieve", json={"query": "שאלה לדוגמא"})
+
+    assert response.status_code == HTTPStatus.OK
+    body = response.json()
+    assert body["docs"] == [{"id": 1, "title": "כותרת", "link": "https://example.com/sample", "content": "תוכן",
+                             "score": 1.8}]
+    assert body["metadata"]["top_k"] == 2
+    assert body["metadata"]["embedding_time"] == 0.01 and body["metadata"]["search_time"] == 0.02
+    mock_retrieve.assert_called_once_with(engine, ["שאלה לדוגמא"], 2)
+    mock_llm_answer.assert_not_called()
+    mock_save_interaction.assert_not_called()
+
+
+def test_retrieve_batch(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mock_retrieve = mocker.patch('main.retrieval.retrieve', return_value=(
+        [{"docs": []}, {"docs": [], "error": "search failed"}], {"embedding_time": 0.01, "search_time": 0.02}))
+
+    response = client.post("/retrieve/batch", json={"queries": ["ראשונה", "שנייה"], "top_k": 5})
+
+    body = response.json()
+    assert [result["question"] for result in body["results"]] == ["ראשונה", "שנייה"]
+    assert body["results"][1]["error"] == "search failed"
+    mock_retrieve.assert_called_once_with(engine, ["ראשונה", "שנייה"], 5)
+    assert client.post("/retrieve/batch", json={"queries": []}).status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_retrieve_unavailable_when_search_circuit_is_open(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+    circuit_breaker = importlib.import_module("circuit_breaker")
+
+    circuit_breaker.factory("es_search").transition(circuit_breaker.OPEN)
+
+    response = client.post("/retrieve", json={"query": "שאלה", "top_k": 1})
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    engine.elastic_model.es_client.msearch.assert_not_called()
+
+
+def test_search_batch(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן'}
+    ])
+    mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.1, {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0,
+                      "context_docs": 1}))
+    questions = "\n".join([
+        json.dumps({"query": "שאלה ראשונה", "id": "q1"}),
+        "",
+        json.dumps({"query": "שאלה שנייה", "asked_from": "regression"}),
+        "not json",
+    ])
+
+    response = client.post("/search/batch?concurrency=2&save_interactions=false", content=questions.encode("utf-8"),
+                           headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {result["line"]: result for result in map(json.loads, response.text.splitlines())}
+    assert set(results) == {1, 3, 4}
+    assert results[1]["id"] == "q1" and results[1]["llm_result"] == "תשובה"
+    assert results[3]["asked_from"] == "regression" and results[3]["docs"][0]["id"] == 1
+    assert "Invalid question" in results[4]["error"]
+    mock_save_interaction.assert_not_called()
+
+    client.post("/search/batch", content=json.dumps({"query": "שאלה שלישית"}).encode("utf-8"))
+    mock_save_interaction.assert_called_once()
+    assert client.post("/search/batch?concurrency=0", content=b"").status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_search_reranks_candidates(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+    reranker = importlib.import_module("reranker")
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mocker.patch('main.interactions_model.save_interaction')
+    candidates = [
+        {'doc_id': doc_id, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': content}
+        for doc_id, content in [(1, 'קצר'), (2, 'ארוך יותר')]
+    ]
+    mock_search_documents = mocker.patch('main.engine.search_documents', return_value=candidates)
+    model = Mock(predict=Mock(side_effect=lambda pairs, **_kwargs: [len(text) for _, text in pairs]))
+    mocker.patch('main.document_reranker', reranker.Reranker(model, candidates=2, budget=5))
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.1, {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0,
+                      "context_docs": 1}))
+
+    body = client.post("/search", json={"query": "שאלה לדירוג", "asked_from": "test"}).json()
+
+    mock_search_documents.assert_called_once_with("שאלה לדירוג", 2)
+    assert mock_llm_answer.call_args.args[1] == [candidates[1]]
+    assert [doc["id"] for doc in body["docs"]] == [2]
+    assert body["metadata"]["reranked"] is True
+    assert isinstance(body["metadata"]["rerank_time"], float)
+
+
+def test_search_adaptive_pages(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 3, "model": "some-model",
+                                                          "adaptive_pages": "true", "min_pages": "1",
+                                                          "max_pages": "4", "adaptive_pages_margin": "0.1"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    scored_docs = [
+        {'doc_id': doc_id, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן', 'score': score}
+        for doc_id, score in [(1, 1.9), (2, 1.85), (3, 1.5), (4, 1.4)]
+    ]
+    mock_search_documents = mocker.patch('main.retrieval.search_documents', return_value=scored_docs)
+    mock_llm_answer = mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.1, {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0,
+                      "context_docs": 2}))
+
+    body = client.post("/search", json={"query": "שאלה קלה", "asked_from": "test"}).json()
+
+    mock_search_documents.assert_called_once_with(engine, "שאלה קלה", 4)
+    assert mock_llm_answer.call_args.args[1] == scored_docs[:2]
+    assert [doc["id"] for doc in body["docs"]] == [1, 2]
+    assert body["metadata"]["num_of_pages"] == 2
+    assert mock_save_interaction.call_args.args[0]["metadata"]["num_of_pages"] == 2
+
+
+def test_search_returns_requested_fields(mock_dependencies, mocker):
+    client, engine, mock_es_model_instance, mock_llm_client_instance = mock_dependencies
+
+    mocker.patch('main.configs.get_config', return_value={"version": 1, "num_of_pages": 1, "model": "some-model"})
+    mocker.patch('main.retrieval_cache', importlib.import_module("retrieval_cache").RetrievalCache())
+    mock_save_interaction = mocker.patch('main.interactions_model.save_interaction')
+    mocker.patch('main.engine.search_documents', return_value=[
+        {'doc_id': 1, 'title': 'כותרת', 'link': 'https://example.com/sample', 'content': 'תוכן ארוך ' * 200}
+    ])
+    mocker.patch('main.gpt_client.answer_with_usage', return_value=(
+        "תשובה", 0.1, {"model": "some-model", "tokens": 10, "prompt_tokens": 100, "cached_tokens": 0,
+                      "context_docs": 1}))
+
+    response = client.post("/search", json={"query": "שאלה", "asked_from": "test", "fields": ["id", "title"]},
+                           headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["docs"] == [{"id": 1, "title": "כותרת"}]
+    assert "content" in mock_save_interaction.call_args.args[0]["docs"][0]
+    assert client.post("/search", json={"query": "שאלה", "asked_from": "test", "fields": ["vectors"]}).status_code \
+        == HTTPStatus.UNPROCESSABLE_ENTITY
+
+    response = client.post("/search", json={"query": "שאלה", "asked_from": "test"},
+                           headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["docs"][0]["content"].startswith("תוכן ארוך")
@@ -0,0 +1,73 @@
+import time
+from unittest.mock import Mock, patch
+import sys
+import os
+import builtins
+import importlib
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+project_root = Path(__file__).parent.parent
+fake_config_path = project_root / "example-conf.json"
+
+
+class RerankerSetup:
+    @staticmethod
+    def setup():
+        with patch.dict(os.environ, {"DOCUMENT_DEFINITION_CONFIG": str(fake_config_path)}), \
+                patch.object(builtins, "open", create=True) as mock_open:
+            mock_open.return_value.__enter__.return_value.read.return_value = "{\"identifier_field\": \"doc_id\", \"saved_fields\": {\"title\": \"text\", \"doc_id\": \"integer\", \"link\": \"text\", \"content\": \"text\"}, \"field_for_llm\": \"content\", \"model_name\": \"Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1.0\", \"field_to_embed\": \"content\"}"
+            return importlib.import_module("reranker").Reranker
+
+
+Reranker = RerankerSetup.setup()
+
+DOCUMENTS = [
+    {"doc_id": 1, "content": "לא רלוונטי"},
+    {"doc_id": 2, "content": "רלוונטי מאוד", "content_llm_ready": "רלוונטי מאוד, נקי"},
+    {"doc_id": 3, "content": "רלוונטי"},
+]
+
+
+def keyword_model(delay=0.0):
+    def predict(pairs, **_kwargs):
+        time.sleep(delay)
+        return [text.count("רלוונטי") - text.count("לא") + len(text) / 1000 for _, text in pairs]
+    return Mock(predict=Mock(side_effect=predict))
+
+
+def test_rerank_orders_by_score():
+    """Test that the documents are ordered by the cross-encoder's score and cut to top k"""
+    model = keyword_model()
+    reranker = Reranker(model, candidates=3, budget=5, batch_size=2)
+
+    documents, rerank_time, reranked = reranker.rerank("שאלה", DOCUMENTS, top_k=2)
+
+    assert reranked is True
+    assert [doc["doc_id"] for doc in documents] == [2, 3]
+    assert isinstance(rerank_time, float)
+    assert model.predict.call_count == 2
+    assert model.predict.call_args_list[0].args[0][1] == ("שאלה", "רלוונטי מאוד, נקי")
+
+
+def test_rerank_keeps_retrieval_order_when_budget_runs_out():
+    """Test that the retrieval order is kept when the budget runs out before every candidate is scored"""
+    model = keyword_model(delay=0.05)
+    reranker = Reranker(model, candidates=3, budget=0.01, batch_size=1)
+
+    documents, _, reranked = reranker.rerank("שאלה", DOCUMENTS, top_k=2)
+
+    assert reranked is False
+    assert [doc["doc_id"] for doc in documents] == [1, 2]
+    assert model.predict.call_count == 1
+
+
+def test_rerank_keeps_retrieval_order_when_model_fails():
+    """Test that a failing cross-encoder doesn't fail the question"""
+    reranker = Reranker(Mock(predict=Mock(side_effect=RuntimeError("boom"))), budget=5)
+
+    documents, _, reranked = reranker.rerank("שאלה", DOCUMENTS, top_k=1)
+
+    assert reranked is False
+    assert [doc["doc_id"] for doc in documents] == [1]
@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import os
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+import metrics
+import responses
+
+
+def test_select_fields():
+    """Test that only the requested fields are kept, and all of them without a selection"""
+    docs = [{"id": 1, "title": "כותרת", "content": "תוכן"}, {"id": 2, "title": "אחרת"}]
+
+    assert responses.select_fields(docs, None) is docs
+    assert responses.select_fields(docs, ["id", "content"]) == [{"id": 1, "content": "תוכן"}, {"id": 2}]
+
+
+def test_compression_measures_wire_bytes():
+    """Test that large API responses are compressed and their sent bytes are measured by encoding"""
+    app = FastAPI()
+
+    @app.get("/get_doc")
+    def get_doc():
+        return responses.serialize("get_doc", {"content": "תוכן " * 1000})
+
+    responses.add_compression(app)
+    client = TestClient(app)
+
+    def observed(encoding):
+        return metrics.WIRE_BYTES.labels("/get_doc", encoding)._sum.get()
+
+    identity_before, gzip_before = observed("identity"), observed("gzip")
+    response = client.get("/get_doc", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["content"].startswith("תוכן")
+    gzip_sent = observed("gzip") - gzip_before
+
+    client.get("/get_doc", headers={"Accept-Encoding": "identity"})
+    identity_sent = observed("identity") - identity_before
+
+    assert 0 < gzip_sent < identity_sent
+
+
+def test_streamed_batch_is_not_buffered():
+    """Test that each line of the batch stream is sent as it's produced, even when the client accepts gzip"""
+    app = FastAPI()
+    lines = [b'{"line": %d, "llm_result": "%s"}\n' % (i, ("תשובה " * 100).encode()) for i in range(3)]
+
+    @app.post("/search/batch")
+    def search_batch():
+        return StreamingResponse(iter(lines), media_type="application/x-ndjson")
+
+    responses.add_compression(app)
+    messages = []
+
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/search/batch", "raw_path": b"/search/batch",
+             "query_string": b"", "root_path": "", "scheme": "http", "server": ("testserver", 80),
+             "headers": [(b"accept-encoding", b"gzip, br")], "http_version": "1.1"}
+    asyncio.run(app(scope, receive, send))
+
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    assert b"content-encoding" not in dict(start["headers"])
+    chunks = [message["body"] for message in messages if message["type"] == "http.response.body" and message["body"]]
+    assert chunks == lines
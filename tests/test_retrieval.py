@@ -0,0 +1,112 @@
+import pytest
+from unittest.mock import Mock, patch
+import sys
+import os
+import builtins
+import importlib
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+project_root = Path(__file__).parent.parent
+fake_config_path = project_root / "example-conf.json"
+
+
+class RetrievalSetup:
+    @staticmethod
+    def setup():
+        with patch.dict(os.environ, {"DOCUMENT_DEFINITION_CONFIG": str(fake_config_path)}), \
+                patch.object(builtins, "open", create=True) as mock_open:
+            mock_open.return_value.__enter__.return_value.read.return_value = "{\"identifier_field\": \"doc_id\", \"saved_fields\": {\"title\": \"text\", \"doc_id\": \"integer\", \"link\": \"text\", \"content\": \"text\"}, \"field_for_llm\": \"content\", \"model_name\": \"Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1.0\", \"field_to_embed\": \"content\"}"
+            return importlib.import_module("retrieval")
+
+
+retrieval = RetrievalSetup.setup()
+stand_ins = importlib.import_module("stand_ins")
+
+PARAGRAPHS = [
+    (1, "דמי אבטלה למי שפוטר"),
+    (1, "דמי אבטלה אחרי התפטרות"),
+    (2, "מענק לימודים לסטודנטים"),
+    (3, "קצבת זקנה מגיל פרישה"),
+]
+
+
+@pytest.fixture
+def engine():
+    importlib.import_module("circuit_breaker").breakers.clear()
+    es = stand_ins.InMemoryElasticsearch()
+    encoder = stand_ins.HashingEncoder()
+    for doc_id, content in PARAGRAPHS:
+        es.index(index="embeddings_0", body={
+            "doc_id": doc_id, "title": f"title {doc_id}", "link": f"https://example.com/{doc_id}",
+            "content": content, retrieval.vectors_field(): encoder.encode(content).tolist()
+        })
+    encoder.encode = Mock(wraps=encoder.encode)
+    es.msearch = Mock(wraps=es.msearch)
+    return Mock(retrieval_model=encoder, elastic_model=Mock(es_client=es))
+
+
+def test_retrieve_batches_embedding_and_search(engine):
+    """Test that all the queries are embedded in one call and searched in one msearch, in order"""
+    results, timings = retrieval.retrieve(engine, ["דמי אבטלה", "מענק לימודים"], top_k=2)
+
+    engine.retrieval_model.encode.assert_called_once_with(["דמי אבטלה", "מענק לימודים"])
+    engine.elastic_model.es_client.msearch.assert_called_once()
+    assert len(engine.elastic_model.es_client.msearch.call_args.kwargs["searches"]) == 4
+    assert [result["docs"][0]["doc_id"] for result in results] == [1, 2]
+    assert set(timings) == {"embedding_time", "search_time"}
+
+
+def test_retrieve_collapses_paragraphs_of_a_document(engine):
+    """Test that only the best scoring paragraph of a document is kept, with its score"""
+    (result,), _ = retrieval.retrieve(engine, ["דמי אבטלה"], top_k=3)
+
+    doc_ids = [doc["doc_id"] for doc in result["docs"]]
+    assert doc_ids[0] == 1
+    assert len(doc_ids) == len(set(doc_ids)) == 3
+    scores = [doc["score"] for doc in result["docs"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_retrieve_reports_failed_searches(engine):
+    """Test that a query whose search failed gets an error and no docs, without failing the others"""
+    engine.elastic_model.es_client.msearch = Mock(return_value={"responses": [
+        {"error": {"type": "search_phase_execution_exception"}, "status": 400},
+        {"hits": {"hits": [{"_score": 1.5, "_source": {"doc_id": 7, "content": "x"}}]}},
+    ]})
+
+    results, _ = retrieval.retrieve(engine, ["first", "second"], top_k=3)
+
+    assert results[0]["docs"] == [] and "search_phase_execution_exception" in results[0]["error"]
+    assert results[1] == {"docs": [{"doc_id": 7, "content": "x", "score": 1.5}]}
+
+
+def test_knn_search_excludes_vectors():
+    """Test that the search doesn't return the paragraphs' vectors"""
+    body = retrieval.knn_search([0.1, 0.2], size=5)
+
+    assert body["size"] == 5
+    assert body["_source"] == {"excludes": [retrieval.vectors_field()]}
+
+
+@pytest.mark.parametrize("scores, expected", [
+    ([1.9, 1.6, 1.55], 1),
+    ([1.9, 1.88, 1.86, 1.5], 3),
+    ([1.9, 1.9, 1.9, 1.9, 1.9, 1.9], 4),
+    ([], 1),
+])
+def test_adaptive_top_k(scores, expected):
+    """Test that k covers the documents scoring close to the best, within the bounds"""
+    documents = [{"doc_id": i, "score": score} for i, score in enumerate(scores)]
+
+    assert retrieval.adaptive_top_k(documents, min_k=1, max_k=4, margin=0.05) == expected
+
+
+def test_search_documents_raises_on_failed_search(engine):
+    """Test that a failed search raises instead of returning no documents"""
+    engine.elastic_model.es_client.msearch = Mock(return_value={"responses": [{"error": "boom", "status": 500}]})
+
+    with pytest.raises(RuntimeError):
+        retrieval.search_documents(engine, "שאלה", 3)
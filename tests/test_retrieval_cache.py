@@ -0,0 +1,211 @@
+import pytest
+from unittest.mock import Mock, patch
+import sys
+import os
+import builtins
+import importlib
+from pathlib import Path
+from elasticsearch import NotFoundError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+project_root = Path(__file__).parent.parent
+fake_config_path = project_root / "example-conf.json"
+
+
+class RetrievalCacheSetup:
+    @staticmethod
+    def setup():
+        with patch.dict(os.environ, {"DOCUMENT_DEFINITION_CONFIG": str(fake_config_path)}), \
+                patch.object(builtins, "open", create=True) as mock_open:
+            mock_open.return_value.__enter__.return_value.read.return_value = "{\"identifier_field\": \"doc_id\", \"saved_fields\": {\"title\": \"text\", \"doc_id\": \"integer\", \"link\": \"text\", \"content\": \"text\"}, \"field_for_llm\": \"content\", \"model_name\": \"Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1.0\", \"field_to_embed\": \"content\"}"
+            retrieval_cache_module = importlib.import_module("retrieval_cache")
+            return (
+                retrieval_cache_module.RetrievalCache,
+                retrieval_cache_module.normalize_query,
+                retrieval_cache_module.factory
+            )
+
+
+RetrievalCache, normalize_query, factory = RetrievalCacheSetup.setup()
+
+
+class SharedMarker:
+    """Stands in for the Elasticsearch index the workers share the marker through"""
+    def __init__(self):
+        self.documents = {}
+
+    def get(self, index, id):
+        if (index, id) not in self.documents:
+            raise NotFoundError("not found", Mock(status=404), {})
+        return {"_source": self.documents[(index, id)]}
+
+    def index(self, index, id, document):
+        self.documents[(index, id)] = document
+
+
+def make_docs(*doc_ids):
+    return [{"doc_id": doc_id, "content": f"paragraph of doc {doc_id}"} for doc_id in doc_ids]
+
+
+@pytest.fixture
+def cache():
+    return RetrievalCache(max_size=16, ttl=60)
+
+
+@pytest.fixture
+def search_function():
+    return Mock(side_effect=lambda query, top_k: make_docs(*range(1, top_k + 1)))
+
+
+def test_normalize_query():
+    """Test that whitespace and case differences are normalized away"""
+    assert normalize_query("  מה   הזכויות שלי?\n") == "מה הזכויות שלי?"
+    assert normalize_query("Hello World") == normalize_query("hello world")
+
+
+def test_search_documents_caches_result(cache, search_function):
+    """Test that a repeated query is served from the cache"""
+    first = cache.search_documents("שאלה", 2, search_function)
+    second = cache.search_documents(" שאלה ", 2, search_function)
+
+    assert first == second
+    search_function.assert_called_once_with("שאלה", 2)
+
+
+def test_search_documents_keys_by_top_k(cache, search_function):
+    """Test that a different number of pages is a different cache entry"""
+    cache.search_documents("שאלה", 2, search_function)
+    cache.search_documents("שאלה", 3, search_function)
+
+    assert search_function.call_count == 2
+
+
+def test_search_documents_drops_vectors(cache):
+    """Test that the documents' embeddings are neither cached nor returned"""
+    docs = [dict(doc, content_Webiks_Hebrew_RAGbot_KolZchut_QA_Embedder_v1_0_vectors=[0.1] * 768)
+            for doc in make_docs(1, 2)]
+
+    first = cache.search_documents("שאלה", 2, Mock(return_value=docs))
+    second = cache.search_documents("שאלה", 2, Mock())
+
+    assert first == second == make_docs(1, 2)
+    assert list(cache.cache.values()) == [make_docs(1, 2)]
+
+
+def test_invalidate_docs_evicts_only_affected_results(cache):
+    """Test that invalidating a doc evicts only the results that contain it"""
+    cache.search_documents("first", 2, Mock(return_value=make_docs(1, 2)))
+    cache.search_documents("second", 2, Mock(return_value=make_docs(3, 4)))
+
+    cache.invalidate_docs(["2"])
+
+    first_search = Mock(return_value=make_docs(1, 5))
+    second_search = Mock(return_value=make_docs(3, 4))
+    assert cache.search_documents("first", 2, first_search) == make_docs(1, 5)
+    assert cache.search_documents("second", 2, second_search) == make_docs(3, 4)
+    first_search.assert_called_once()
+    second_search.assert_not_called()
+
+
+def test_invalidate_all_bumps_generation(cache, search_function):
+    """Test that invalidate_all clears every result and moves to a new generation"""
+    cache.search_documents("שאלה", 2, search_function)
+    generation = cache.generation
+
+    cache.invalidate_all()
+    cache.search_documents("שאלה", 2, search_function)
+
+    assert cache.generation == generation + 1
+    assert search_function.call_count == 2
+
+
+def test_result_not_cached_when_invalidated_during_search(cache):
+    """Test that a result retrieved while the corpus changed is not cached"""
+    def search_while_updating(query, top_k):
+        cache.invalidate_docs(["7"])
+        return make_docs(1)
+
+    cache.search_documents("שאלה", 1, search_while_updating)
+    search_function = Mock(return_value=make_docs(1))
+    cache.search_documents("שאלה", 1, search_function)
+
+    search_function.assert_called_once()
+
+
+def test_prune_doc_index_drops_evicted_keys():
+    """Test that doc index entries of evicted results are pruned"""
+    cache = RetrievalCache(max_size=2, ttl=60)
+    for i in range(4):
+        cache.search_documents(f"query {i}", 1, Mock(return_value=make_docs(i)))
+
+    assert set(cache.keys_by_doc_id.keys()) <= {"2", "3"}
+
+
+def connected_workers(sync_period):
+    importlib.import_module("circuit_breaker").breakers.clear()
+    es_client = SharedMarker()
+    workers = RetrievalCache(max_size=16, ttl=60, sync_period=sync_period), \
+        RetrievalCache(max_size=16, ttl=60, sync_period=sync_period)
+    for worker in workers:
+        worker.connect(es_client)
+    return workers
+
+
+@pytest.fixture
+def workers():
+    return connected_workers(sync_period=0)
+
+
+def test_invalidation_reaches_other_workers(workers, search_function):
+    """Test that a document changed through one worker evicts the results cached by the others"""
+    first, second = workers
+    second.search_documents("שאלה", 2, search_function)
+
+    first.invalidate_docs(["1"])
+    second.search_documents("שאלה", 2, search_function)
+
+    assert search_function.call_count == 2
+
+
+def test_own_invalidation_keeps_unaffected_results(workers):
+    """Test that a worker's own invalidation doesn't clear its unaffected results on the next sync"""
+    first, _ = workers
+    first.search_documents("second", 2, Mock(return_value=make_docs(3, 4)))
+
+    first.invalidate_docs(["1"])
+    search_function = Mock(return_value=make_docs(3, 4))
+    first.search_documents("second", 2, search_function)
+
+    search_function.assert_not_called()
+
+
+def test_marker_is_read_at_most_every_sync_period(search_function):
+    """Test that the marker is read once per sync period, not on every lookup"""
+    first, second = connected_workers(sync_period=60)
+    second.search_documents("שאלה", 2, search_function)
+
+    first.invalidate_all()
+    second.search_documents("שאלה", 2, search_function)
+    second.last_sync -= 60
+    second.search_documents("שאלה", 2, search_function)
+
+    assert search_function.call_count == 2
+
+
+def test_cache_serves_while_marker_unreadable(cache, search_function):
+    """Test that failing to read the marker keeps serving cached results"""
+    importlib.import_module("circuit_breaker").breakers.clear()
+    es_client = Mock()
+    es_client.get.side_effect = ConnectionError("es down")
+    cache.connect(es_client)
+    cache.sync_period = 0
+    cache.search_documents("שאלה", 2, search_function)
+    cache.search_documents("שאלה", 2, search_function)
+
+    search_function.assert_called_once()
+
+
+def test_factory_returns_singleton():
+    """Test that factory returns the same instance"""
+    assert factory() is factory()
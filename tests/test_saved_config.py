@@ -128,6 +128,21 @@ def test_get_config_refreshes_cache_after_period(es_client):
     assert es_client.call_count > initial_call_count
 
 
+def test_get_config_uses_cached_config_when_es_fails(es_client):
+    """Test that the last retrieved config is used while Elasticsearch fails"""
+    importlib.import_module("circuit_breaker").breakers.clear()
+    configs = Configs(es_client)
+    configs.set_config({"model": "cached-model"})
+
+    def fail(index):
+        raise ConnectionError("down")
+
+    es_client.count = fail
+
+    assert configs.get_config()["model"] == "cached-model"
+    importlib.import_module("circuit_breaker").breakers.clear()
+
+
 def test_set_config_updates_elasticsearch(es_client):
     """Test that set_config properly updates Elasticsearch"""
     configs = Configs(es_client)
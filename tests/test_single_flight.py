@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    """Test that concurrent calls with the same key run the function once"""
+    flights = SingleFlight()
+    calls = []
+
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep(0.01)
+        return f"answer to {question}"
+
+    async def ask():
+        return await asyncio.gather(*[flights.run("key", answer, "question") for _ in range(3)])
+
+    results = asyncio.run(ask())
+
+    assert calls == ["question"]
+    assert [result for result, _ in results] == ["answer to question"] * 3
+    assert [shared for _, shared in results] == [False, True, True]
+    assert flights.in_flight == {}
+
+
+def test_different_keys_run_separately():
+    """Test that calls with different keys don't share an execution"""
+    flights = SingleFlight()
+    calls = []
+
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep(0.01)
+        return question
+
+    async def ask():
+        return await asyncio.gather(flights.run("a", answer, "a"), flights.run("b", answer, "b"))
+
+    assert asyncio.run(ask()) == [("a", False), ("b", False)]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_exception_is_shared_and_key_cleared():
+    """Test that every waiting caller gets the exception, and the next call runs anew"""
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def ask():
+        return await asyncio.gather(flights.run("key", fail), flights.run("key", fail), return_exceptions=True)
+
+    results = asyncio.run(ask())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.in_flight == {}
+
+
+def test_cancelled_caller_does_not_cancel_shared_execution():
+    """Test that cancelling one caller leaves the execution running for the others"""
+    flights = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def ask():
+        first = asyncio.ensure_future(flights.run("key", answer))
+        second = asyncio.ensure_future(flights.run("key", answer))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(ask()) == ("answer", True)
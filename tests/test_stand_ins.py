@@ -0,0 +1,99 @@
+import sys
+import os
+import importlib
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+
+class StandInsSetup:
+    @staticmethod
+    def setup():
+        stand_ins_module = importlib.import_module("stand_ins")
+        return stand_ins_module.InMemoryElasticsearch, stand_ins_module.HashingEncoder
+
+
+InMemoryElasticsearch, HashingEncoder = StandInsSetup.setup()
+
+VECTOR_FIELD = "content_model_vectors"
+
+
+def knn_query(vector):
+    return {
+        "script_score": {
+            "query": {"exists": {"field": VECTOR_FIELD}},
+            "script": {
+                "source": f"cosineSimilarity(params.query_vector, '{VECTOR_FIELD}') + 1.0",
+                "params": {"query_vector": vector}
+            }
+        }
+    }
+
+
+def test_indices_lifecycle():
+    """Test creating, matching by pattern and deleting indices"""
+    es = InMemoryElasticsearch()
+    es.indices.create(index="docs_0")
+    es.index(index="docs_1", body={"doc_id": 1})
+
+    assert es.indices.exists(index="docs_0")
+    assert set(es.indices.get(index="docs*")) == {"docs_0", "docs_1"}
+
+    es.indices.delete(index="docs_0")
+    assert not es.indices.exists(index="docs_0")
+
+
+def test_search_sort_and_count():
+    """Test the config lookup: count and the latest version first"""
+    es = InMemoryElasticsearch()
+    for version in [1, 3, 2]:
+        es.index(index="saved_configurations", body={"version": version})
+
+    assert es.count(index="saved_configurations")["count"] == 3
+    hits = es.search(index="saved_configurations", sort=[{"version": {"order": "desc"}}])["hits"]["hits"]
+    assert hits[0]["_source"]["version"] == 3
+
+
+def test_match_and_delete_by_query():
+    """Test match queries and deleting by query"""
+    es = InMemoryElasticsearch()
+    es.index(index="docs_0", body={"doc_id": 1})
+    es.index(index="docs_0", body={"doc_id": 2})
+
+    assert len(es.search(index="docs*", body={"query": {"match": {"doc_id": "1"}}})["hits"]["hits"]) == 1
+    assert es.delete_by_query(index="docs*", body={"query": {"match": {"doc_id": 1}}})["deleted"] == 1
+    assert es.count(index="docs*")["count"] == 1
+
+
+def test_knn_search_ranks_by_cosine_similarity():
+    """Test that the script_score kNN query ranks by cosine similarity"""
+    es = InMemoryElasticsearch()
+    es.index(index="docs_0", body={"doc_id": 1, VECTOR_FIELD: np.array([1.0, 0.0])})
+    es.index(index="docs_0", body={"doc_id": 2, VECTOR_FIELD: np.array([0.6, 0.8])})
+    es.index(index="docs_0", body={"doc_id": 3})
+
+    hits = es.search(index="docs*", body={"size": 5, "query": knn_query([0.0, 1.0])})["hits"]["hits"]
+
+    assert [hit["_source"]["doc_id"] for hit in hits] == [2, 1]
+    assert abs(hits[0]["_score"] - 1.8) < 1e-6
+
+
+def test_msearch():
+    """Test that msearch runs every search in the request"""
+    es = InMemoryElasticsearch()
+    es.index(index="docs_0", body={"doc_id": 1})
+
+    responses = es.msearch(searches=[{"index": "docs*"}, {"query": {"match": {"doc_id": 1}}},
+                                     {"index": "docs*"}, {"query": {"match": {"doc_id": 2}}}])["responses"]
+
+    assert [len(response["hits"]["hits"]) for response in responses] == [1, 0]
+
+
+def test_hashing_encoder_similarity():
+    """Test that texts sharing words are closer than unrelated texts"""
+    encoder = HashingEncoder()
+    question = encoder.encode("דמי אבטלה")
+    related, unrelated = encoder.encode(["מי זכאי לדמי אבטלה", "חופשת לידה"])
+
+    assert np.dot(question, related) > np.dot(question, unrelated)
+    assert abs(np.linalg.norm(question) - 1.0) < 1e-6
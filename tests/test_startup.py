@@ -0,0 +1,70 @@
+import pytest
+from unittest.mock import Mock, patch
+import sys
+import os
+import importlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+
+class StartupSetup:
+    @staticmethod
+    def setup():
+        startup_module = importlib.import_module("startup")
+        return (
+            startup_module.timed_phase,
+            startup_module.wait_for_es,
+            startup_module.warm_up,
+            startup_module.startup_timings
+        )
+
+
+timed_phase, wait_for_es, warm_up, startup_timings = StartupSetup.setup()
+
+
+def test_timed_phase_records_timing():
+    """Test that timed_phase returns the result and records the phase duration"""
+    result = timed_phase("test_phase", lambda a, b: a + b, 1, 2)
+
+    assert result == 3
+    assert isinstance(startup_timings["test_phase"], float)
+
+
+@patch('time.sleep')
+def test_wait_for_es_retries_until_ping(mock_sleep):
+    """Test that wait_for_es retries until Elasticsearch answers"""
+    es_client = Mock()
+    es_client.ping.side_effect = [False, Exception("connection refused"), True]
+
+    wait_for_es(es_client, timeout=60)
+
+    assert es_client.ping.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch('time.sleep')
+def test_wait_for_es_raises_after_timeout(mock_sleep):
+    """Test that wait_for_es gives up after the timeout"""
+    es_client = Mock()
+    es_client.ping.return_value = False
+
+    with pytest.raises(ConnectionError):
+        wait_for_es(es_client, timeout=0)
+
+
+def test_warm_up_encodes_once():
+    """Test that warm_up runs a single encode pass"""
+    engine = Mock()
+
+    warm_up(engine)
+
+    engine.retrieval_model.encode.assert_called_once()
+    assert "warm_up" in startup_timings
+
+
+def test_warm_up_swallows_errors():
+    """Test that a failed warm up doesn't fail startup"""
+    engine = Mock()
+    engine.retrieval_model.encode.side_effect = RuntimeError("out of memory")
+
+    warm_up(engine)
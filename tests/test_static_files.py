@@ -0,0 +1,40 @@
+import sys
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+from static_files import CachedStaticFiles
+
+
+def static_client(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-A1B2C3D4.js").write_text("console.log('bundle')")
+    (tmp_path / "index.html").write_text('<script src="/assets/index-A1B2C3D4.js"></script>')
+    app = FastAPI()
+    app.mount("/", CachedStaticFiles(directory=str(tmp_path), html=True), name="static")
+    return TestClient(app)
+
+
+def test_hashed_assets_are_cached(tmp_path):
+    """Test that the content-hashed bundle is cached for long and index.html is always revalidated"""
+    client = static_client(tmp_path)
+
+    asset = client.get("/assets/index-A1B2C3D4.js")
+    page = client.get("/")
+
+    assert asset.headers["cache-control"].startswith("public, max-age=") and "immutable" in asset.headers["cache-control"]
+    assert page.headers["cache-control"] == "no-cache"
+    assert page.headers["etag"]
+
+
+def test_unchanged_page_is_not_modified(tmp_path):
+    """Test that revalidating an unchanged index.html is answered with 304, keeping the cache policy"""
+    client = static_client(tmp_path)
+    etag = client.get("/").headers["etag"]
+
+    response = client.get("/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["cache-control"] == "no-cache"
@@ -0,0 +1,61 @@
+from unittest.mock import Mock, patch
+import sys
+import os
+import importlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+
+class TokenizerSetup:
+    @staticmethod
+    def setup():
+        tokenizer_module = importlib.import_module("tokenizer")
+        return tokenizer_module.count_tokens, tokenizer_module.encoding_for_model
+
+
+count_tokens, encoding_for_model = TokenizerSetup.setup()
+
+
+def test_count_tokens_with_encoding():
+    """Test that tokens are counted with the model's encoding"""
+    encoding = Mock()
+    encoding.encode.return_value = [1, 2, 3, 4]
+
+    with patch('tokenizer.encoding_for_model', return_value=encoding) as mock_encoding_for_model:
+        assert count_tokens("דמי אבטלה", model="gpt-4o") == 4
+
+    mock_encoding_for_model.assert_called_once_with("gpt-4o")
+    encoding.encode.assert_called_once_with("דמי אבטלה", disallowed_special=())
+
+
+def test_count_tokens_estimates_without_encoding():
+    """Test that tokens are estimated from the length when the tokenizer is unavailable"""
+    with patch('tokenizer.encoding_for_model', return_value=None):
+        assert count_tokens("1234567") == 3
+        assert count_tokens("") == 0
+
+
+def test_encoding_for_model_falls_back():
+    """Test the default encoding for unknown models, and None when the encoding can't be loaded"""
+    tiktoken = Mock()
+    tiktoken.encoding_for_model.side_effect = KeyError("unknown-model")
+    encoding_for_model.cache_clear()
+    with patch.dict(sys.modules, {"tiktoken": tiktoken}):
+        assert encoding_for_model("unknown-model") is tiktoken.get_encoding.return_value
+        tiktoken.get_encoding.assert_called_once_with("o200k_base")
+
+        tiktoken.get_encoding.side_effect = ConnectionError("offline")
+        assert encoding_for_model("another-unknown-model") is None
+    encoding_for_model.cache_clear()
+
+
+def test_encoding_name():
+    """Test that counts are named after the model's encoding, or as approximate without a tokenizer"""
+    encoding = Mock()
+    encoding.name = "cl100k_base"
+    tokenizer = importlib.import_module("tokenizer")
+
+    with patch('tokenizer.encoding_for_model', return_value=encoding):
+        assert tokenizer.encoding_name("gpt-3.5-turbo-0125") == "cl100k_base"
+    with patch('tokenizer.encoding_for_model', return_value=None):
+        assert tokenizer.encoding_name("gpt-4o") == tokenizer.APPROXIMATE_ENCODING
@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, patch
+import sys
+import os
+import importlib
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../app/src')))
+
+
+class TracingSetup:
+    @staticmethod
+    def setup():
+        tracing_module = importlib.import_module("tracing")
+        return (
+            tracing_module.traced,
+            tracing_module.current_trace_id,
+            tracing_module.instrument_engine
+        )
+
+
+traced, current_trace_id, instrument_engine = TracingSetup.setup()
+
+
+def make_tracer(sample_rate=1.0):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(sample_rate)))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer("test"), exporter
+
+
+@pytest.fixture
+def tracer_and_exporter():
+    tracer, exporter = make_tracer()
+    with patch('tracing.tracer', tracer):
+        yield tracer, exporter
+
+
+def test_traced_sync_function(tracer_and_exporter):
+    """Test that traced wraps a sync function in a span"""
+    tracer, exporter = tracer_and_exporter
+
+    result = traced("add", lambda a, b: a + b)(1, 2)
+
+    assert result == 3
+    assert [span.name for span in exporter.get_finished_spans()] == ["add"]
+
+
+def test_traced_async_decorator(tracer_and_exporter):
+    """Test that traced works as a decorator of an async function"""
+    tracer, exporter = tracer_and_exporter
+
+    @traced("endpoint")
+    async def endpoint(value):
+        return value * 2
+
+    assert asyncio.run(endpoint(4)) == 8
+    assert [span.name for span in exporter.get_finished_spans()] == ["endpoint"]
+
+
+def test_current_trace_id_inside_span(tracer_and_exporter):
+    """Test that the trace id is available inside a sampled span only"""
+    tracer, exporter = tracer_and_exporter
+
+    assert current_trace_id() is None
+    with tracer.start_as_current_span("request") as span:
+        trace_id = current_trace_id()
+
+    assert trace_id == format(span.get_span_context().trace_id, "032x")
+    assert len(trace_id) == 32
+
+
+def test_current_trace_id_not_sampled():
+    """Test that traces dropped by the sampler have no trace id"""
+    tracer, exporter = make_tracer(sample_rate=0.0)
+
+    with tracer.start_as_current_span("request"):
+        assert current_trace_id() is None
+    assert exporter.get_finished_spans() == ()
+
+
+def test_instrument_engine(tracer_and_exporter):
+    """Test that the engine's embedding and kNN search are traced"""
+    tracer, exporter = tracer_and_exporter
+    engine = Mock()
+    engine.retrieval_model.encode.return_value = [0.1, 0.2]
+    engine.elastic_model.search.return_value = []
+
+    instrument_engine(engine)
+    engine.retrieval_model.encode("שאלה")
+    engine.elastic_model.search([0.1, 0.2])
+
+    assert [span.name for span in exporter.get_finished_spans()] == ["retrieval.embed", "retrieval.knn_search"]